@@ -0,0 +1,219 @@
+"""
+Memory and event rate of the bot receiving all gateway data (Intents.ALL with default caches) versus only the data
+derived from its registered commands.
+
+A synthetic stream of raw gateway payloads is fed to hikari, payloads of intents the bot didn't request are dropped
+first, the same way as discord doesn't send them. Nothing is sent over the network.
+
+Run from the repository root:
+    python -m benchmarks.gateway_profile
+    python -m benchmarks.gateway_profile --guilds 500 --members 200 --events 200000
+"""
+import argparse
+import asyncio
+import gc
+import os
+import random
+import time
+import tracemalloc
+
+import hikari
+import hikari.impl
+
+from common.command_registry import registered_commands
+from common.gateway_profile import GatewayProfile
+
+# share of gateway events by their type in the stream, roughly as received by a bot in big guilds
+EVENT_WEIGHTS = {
+    "PRESENCE_UPDATE": 40,
+    "MESSAGE_CREATE": 25,
+    "TYPING_START": 20,
+    "MESSAGE_REACTION_ADD": 8,
+    "GUILD_MEMBER_UPDATE": 5,
+    "VOICE_STATE_UPDATE": 2,
+}
+
+# events are sent by discord only to bots with the intent
+EVENT_INTENTS = {
+    "GUILD_CREATE": hikari.Intents.GUILDS,
+    "PRESENCE_UPDATE": hikari.Intents.GUILD_PRESENCES,
+    "MESSAGE_CREATE": hikari.Intents.GUILD_MESSAGES,
+    "TYPING_START": hikari.Intents.GUILD_MESSAGE_TYPING,
+    "MESSAGE_REACTION_ADD": hikari.Intents.GUILD_MESSAGE_REACTIONS,
+    "GUILD_MEMBER_UPDATE": hikari.Intents.GUILD_MEMBERS,
+    "VOICE_STATE_UPDATE": hikari.Intents.GUILD_VOICE_STATES,
+}
+
+BOT_USER_ID = 1 << 40
+
+MESSAGES = ["!rpg ping!", "!rpg stats", "gg wp", "who has the key for dungeon 3", "brb"]
+
+
+class BenchmarkShard:
+    """
+    Shard which received the payloads, hikari reads only its id and the id of the bot user from it.
+    """
+
+    id = 0
+    shard_count = 1
+
+    def get_user_id(self) -> hikari.Snowflake:
+        return hikari.Snowflake(BOT_USER_ID)
+
+
+def _user(user_id: int) -> dict:
+    return {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0", "global_name": None, "avatar": None}
+
+
+def _member(user_id: int, guild_id: int, role_ids: list[int]) -> dict:
+    return {
+        "user": _user(user_id), "nick": None, "roles": [str(role_id) for role_id in role_ids], "joined_at": "2023-01-01T00:00:00+00:00",
+        "deaf": False, "mute": False, "flags": 0, "pending": False, "guild_id": str(guild_id),
+    }
+
+
+def _presence(user_id: int, guild_id: int) -> dict:
+    return {
+        "user": {"id": str(user_id)}, "guild_id": str(guild_id), "status": "online", "client_status": {"desktop": "online"},
+        "activities": [{"name": "RPG", "type": 0, "created_at": 1700000000000}],
+    }
+
+
+def _guild_create(guild_id: int, members_count: int) -> dict:
+    role_ids = [guild_id + role_i for role_i in range(10)]
+    channel_ids = [guild_id + 100 + channel_i for channel_i in range(20)]
+    member_ids = [guild_id + 1000 + member_i for member_i in range(members_count)]
+    return {
+        "id": str(guild_id), "name": f"guild {guild_id}", "icon": None, "splash": None, "discovery_splash": None, "owner_id": str(member_ids[0]),
+        "afk_channel_id": None, "afk_timeout": 300, "verification_level": 0, "default_message_notifications": 0, "explicit_content_filter": 0,
+        "roles": [{"id": str(role_id), "name": f"role {role_id}", "color": 0, "hoist": False, "position": 0, "permissions": "0", "managed": False, "mentionable": False} for role_id in role_ids],
+        "emojis": [], "stickers": [], "features": [], "mfa_level": 0, "application_id": None, "system_channel_id": None, "system_channel_flags": 0,
+        "rules_channel_id": None, "vanity_url_code": None, "description": None, "banner": None, "premium_tier": 0, "preferred_locale": "en-US",
+        "public_updates_channel_id": None, "nsfw_level": 0, "premium_progress_bar_enabled": False, "joined_at": "2023-01-01T00:00:00+00:00",
+        "large": members_count > 250, "member_count": members_count, "unavailable": False,
+        "channels": [{"id": str(channel_id), "type": 0, "name": f"channel {channel_id}", "position": 0, "permission_overwrites": [], "nsfw": False, "parent_id": None, "topic": None, "last_message_id": None, "rate_limit_per_user": 0, "guild_id": str(guild_id)} for channel_id in channel_ids],
+        "threads": [],
+        "members": [_member(member_id, guild_id, role_ids[:2]) for member_id in member_ids],
+        "presences": [_presence(member_id, guild_id) for member_id in member_ids],
+        "voice_states": [],
+        "stage_instances": [], "guild_scheduled_events": [],
+    }
+
+
+def _event_payload(event_name: str, guild_id: int, members_count: int, event_i: int, rng: random.Random) -> dict:
+    user_id = guild_id + 1000 + rng.randrange(members_count)
+    channel_id = guild_id + 100 + rng.randrange(20)
+
+    if event_name == "PRESENCE_UPDATE":
+        return _presence(user_id, guild_id)
+    if event_name == "MESSAGE_CREATE":
+        return {
+            "id": str(guild_id + event_i), "channel_id": str(channel_id), "guild_id": str(guild_id), "author": _user(user_id),
+            "member": {key: value for key, value in _member(user_id, guild_id, []).items() if key != "user"},
+            "content": rng.choice(MESSAGES), "timestamp": "2023-01-01T00:00:00+00:00", "edited_timestamp": None, "tts": False,
+            "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [], "embeds": [], "pinned": False, "type": 0, "flags": 0,
+        }
+    if event_name == "TYPING_START":
+        return {"channel_id": str(channel_id), "guild_id": str(guild_id), "user_id": str(user_id), "timestamp": 1700000000, "member": _member(user_id, guild_id, [])}
+    if event_name == "MESSAGE_REACTION_ADD":
+        return {"user_id": str(user_id), "channel_id": str(channel_id), "message_id": str(guild_id + event_i), "guild_id": str(guild_id), "emoji": {"id": None, "name": "👍"}, "burst": False, "type": 0}
+    if event_name == "GUILD_MEMBER_UPDATE":
+        return _member(user_id, guild_id, [guild_id + rng.randrange(10)])
+    if event_name == "VOICE_STATE_UPDATE":
+        return {
+            "guild_id": str(guild_id), "channel_id": str(channel_id), "user_id": str(user_id), "member": _member(user_id, guild_id, []), "session_id": "session",
+            "deaf": False, "mute": False, "self_deaf": False, "self_mute": False, "self_video": False, "suppress": False, "request_to_speak_timestamp": None,
+        }
+    raise ValueError(event_name)
+
+
+def make_event_stream(guilds_count: int, members_count: int, events_count: int, seed: int) -> tuple[list[tuple[str, dict]], list[tuple[str, dict]]]:
+    """
+    :return: GUILD_CREATE payloads received when the bot connects and the stream of events received afterwards
+    """
+
+    rng = random.Random(seed)
+    guild_ids = [(guild_i + 1) << 22 for guild_i in range(guilds_count)]
+    guild_creates = [("GUILD_CREATE", _guild_create(guild_id, members_count)) for guild_id in guild_ids]
+
+    event_names = rng.choices(list(EVENT_WEIGHTS), weights=list(EVENT_WEIGHTS.values()), k=events_count)
+    events = [(event_name, _event_payload(event_name, rng.choice(guild_ids), members_count, event_i, rng)) for event_i, event_name in enumerate(event_names)]
+    return guild_creates, events
+
+
+async def run_profile(intents: hikari.Intents, cache_settings: hikari.impl.CacheSettings, guild_creates: list[tuple[str, dict]], events: list[tuple[str, dict]], trace_memory: bool) -> dict[str, float]:
+    bot = hikari.GatewayBot("MTIzNDU2Nzg5.benchmark.token", intents=intents, cache_settings=cache_settings, banner=None)
+    bot.cache.set_me(bot.entity_factory.deserialize_my_user(_user(BOT_USER_ID) | {"bot": True, "mfa_enabled": False, "verified": True, "flags": 0, "locale": "en-US", "premium_type": 0}))
+
+    handled_messages = 0
+
+    @bot.listen(hikari.GuildMessageCreateEvent)
+    async def on_message(_: hikari.GuildMessageCreateEvent):
+        nonlocal handled_messages
+        handled_messages += 1
+
+    shard = BenchmarkShard()
+    received_guild_creates = [(event_name, payload) for event_name, payload in guild_creates if EVENT_INTENTS[event_name] & intents]
+    received_events = [(event_name, payload) for event_name, payload in events if EVENT_INTENTS[event_name] & intents]
+
+    gc.collect()
+    if trace_memory:
+        tracemalloc.start()
+    start_memory = tracemalloc.get_traced_memory()[0] if trace_memory else 0
+
+    start = time.perf_counter()
+    for event_i, (event_name, payload) in enumerate(received_guild_creates + received_events):
+        bot.event_manager.consume_raw_event(event_name, shard, payload)
+        # lets dispatched listeners run, the real gateway yields on every received payload as well
+        if event_i % 64 == 0:
+            await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+
+    cache_memory = 0.0
+    if trace_memory:
+        gc.collect()
+        cache_memory = (tracemalloc.get_traced_memory()[0] - start_memory) / 2 ** 20
+        tracemalloc.stop()
+
+    return {
+        "received": len(received_guild_creates) + len(received_events),
+        "messages": handled_messages,
+        "seconds": elapsed,
+        "cache_mib": cache_memory,
+        "members_cached": sum(len(members) for members in bot.cache.get_members_view().values()),
+        "presences_cached": sum(len(presences) for presences in bot.cache.get_presences_view().values()),
+    }
+
+
+def main(argv: list[str] | None = None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--guilds", type=int, default=200, help="guilds the bot is in")
+    arg_parser.add_argument("--members", type=int, default=100, help="members of every guild")
+    arg_parser.add_argument("--events", type=int, default=100000, help="gateway events after the guilds were received")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args(argv)
+
+    os.environ.setdefault("RPGbot", "MTIzNDU2Nzg5.benchmark.token")
+    derived_profile = GatewayProfile.from_commands(registered_commands())
+    profiles = {
+        "ALL": (hikari.Intents.ALL, hikari.impl.CacheSettings()),
+        "derived": (derived_profile.intents(), derived_profile.cache_settings()),
+    }
+
+    guild_creates, events = make_event_stream(args.guilds, args.members, args.events, args.seed)
+
+    print(f"{args.guilds} guilds x {args.members} members, {args.events} events, derived gateway data: {derived_profile.gateway_data()}")
+    print(f"{'profile':<10}{'received':>10}{'seconds':>10}{'events/s':>12}{'cache MiB':>12}{'members':>10}{'presences':>11}{'messages':>10}")
+    for name, (intents, cache_settings) in profiles.items():
+        # rate is measured without tracing allocations, which slows everything down
+        rate_result = asyncio.run(run_profile(intents, cache_settings, guild_creates, events, trace_memory=False))
+        memory_result = asyncio.run(run_profile(intents, cache_settings, guild_creates, events, trace_memory=True))
+        print(
+            f"{name:<10}{rate_result['received']:>10}{rate_result['seconds']:>10.2f}{rate_result['received'] / rate_result['seconds']:>12.0f}{memory_result['cache_mib']:>12.1f}"
+            f"{rate_result['members_cached']:>10}{rate_result['presences_cached']:>11}{rate_result['messages']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Memory taken by loaded prefixes and aliases of guilds (guild overlays) and time of resolving messages using them,
+with up to 50k guilds. The memory is compared with building a parser for every guild instead.
+
+Every guild with a configuration has its own prefixes and aliases, the other guilds share the empty overlay.
+
+Run from the repository root:
+    python -m benchmarks.guild_overlays
+    python -m benchmarks.guild_overlays --guilds 1000 10000 50000 100000 --configured 0.5 --messages 50000
+"""
+import argparse
+import asyncio
+import gc
+import random
+import time
+import tracemalloc
+
+from common.command_registry import create_command_parser_builder
+from common.fake_gateway import FakeGuildMessageEvent
+from common.models.message_command_parsing import GuildConfiguration, LazyCommand, ParseOutcomeKind
+from common.state_store import StateStore
+
+
+def make_configurations(guilds_count: int, configured_share: float, seed: int) -> dict[int, GuildConfiguration]:
+    rng = random.Random(seed)
+    configurations = {}
+    for guild_index in range(guilds_count):
+        if rng.random() >= configured_share:
+            continue
+        configurations[_guild_id(guild_index)] = GuildConfiguration(
+            {f"?{guild_index % 97}": "!rpg", f"rpg{guild_index % 13}": "!rpg"},
+            {"!rpg": {"p": "ping!", "inv": "profile", "hp": "buy potion", f"hit{guild_index % 7}": "attack", "lb": "leaderboard"}},
+        )
+    return configurations
+
+
+def make_messages(configurations: dict[int, GuildConfiguration], guilds_count: int, messages_count: int, seed: int) -> list[tuple[FakeGuildMessageEvent, str]]:
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(messages_count):
+        guild_id = _guild_id(rng.randrange(guilds_count))
+        configuration = configurations.get(guild_id)
+        if configuration is None:
+            content = "!rpg ping!"
+        else:
+            # custom prefix with an alias, the worst case of the resolution
+            content = f"{next(iter(configuration.prefixes))} p"
+        messages.append((FakeGuildMessageEvent(guild_id, guild_id + 1, rng.randrange(1, 1000), content), content))
+    return messages
+
+
+async def run_guilds(guilds_count: int, configured_share: float, messages_count: int, seed: int) -> dict[str, float]:
+    configurations = make_configurations(guilds_count, configured_share, seed)
+
+    async def load_configuration(guild_id):
+        return configurations.get(guild_id)
+
+    async def discard_reply(execution_context, content):
+        pass
+
+    # messages invoke only commands which don't use states, the store is never opened
+    parser = (create_command_parser_builder()
+        .with_dependency("state", StateStore(":memory:"))
+        .with_responder(discard_reply)
+        .with_guild_overlays(load_configuration, max_overlays=guilds_count)
+        .build())
+    for command in parser.registered_commands():
+        if isinstance(command, LazyCommand):
+            parser.find_command(command.prefix(), command.name())
+    guild_overlays = parser.guild_overlays()
+    # as the bot does once the state store is open
+    guild_overlays.set_configured_guilds(configurations)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for guild_index in range(guilds_count):
+        await guild_overlays.get(_guild_id(guild_index))
+    gc.collect()
+    overlays_bytes = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    messages = make_messages(configurations, guilds_count, messages_count, seed)
+    failures = 0
+    start = time.perf_counter()
+    for event, content in messages:
+        if not parser.could_match(content, event.guild_id):
+            failures += 1
+            continue
+        outcome = await parser.parse_outcome(content, event)
+        if outcome.kind is not ParseOutcomeKind.SUCCESS:
+            failures += 1
+    elapsed = time.perf_counter() - start
+
+    return {
+        "configured": len(configurations),
+        "overlays_bytes": overlays_bytes,
+        "overlays": guild_overlays.overlays_count(),
+        "message_us": elapsed / messages_count * 1e6,
+        "failures": failures,
+    }
+
+
+def measure_parser_bytes() -> int:
+    """
+    :return: memory taken by a parser with all commands of the bot, the cost of a parser per guild
+    """
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    parser = create_command_parser_builder().with_dependency("state", StateStore(":memory:")).build()
+    for command in parser.registered_commands():
+        if isinstance(command, LazyCommand):
+            parser.find_command(command.prefix(), command.name())
+    gc.collect()
+    parser_bytes = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return parser_bytes
+
+
+def _guild_id(guild_index: int) -> int:
+    return (guild_index + 1) << 22
+
+
+def main(argv: list[str] | None = None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--guilds", type=int, nargs="+", default=[1000, 10000, 50000], help="counts of guilds with loaded overlays")
+    arg_parser.add_argument("--configured", type=float, default=0.3, help="share of guilds with prefixes and aliases of their own")
+    arg_parser.add_argument("--messages", type=int, default=20000, help="messages resolved at every count of guilds")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args(argv)
+
+    # the first parser imports command modules, which shouldn't be counted
+    measure_parser_bytes()
+    parser_bytes = measure_parser_bytes()
+
+    print(f"{args.configured:.0%} of guilds configured prefixes and aliases, parser with all commands takes {parser_bytes / 1024:.0f} KiB")
+    print(f"{'guilds':>8}{'configured':>12}{'overlays MiB':>14}{'B/guild':>9}{'parser per guild MiB':>22}{'us/message':>12}{'failures':>10}")
+    for guilds_count in args.guilds:
+        result = asyncio.run(run_guilds(guilds_count, args.configured, args.messages, args.seed))
+        print(f"{guilds_count:>8}{result['configured']:>12}{result['overlays_bytes'] / 2 ** 20:>14.2f}{result['overlays_bytes'] / guilds_count:>9.0f}"
+              f"{parser_bytes * guilds_count / 2 ** 20:>22.0f}{result['message_us']:>12.1f}{result['failures']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+End-to-end load of the message listener of the bot (bot.parse_message_command), without discord token or network.
+
+Fake guild message events are fed into the listener at a fixed rate, every event in its own task the same way as
+hikari dispatches them, with a configurable mix of commands, chat, typos and heavy commands. Replies go through
+the outbound messenger of the bot (with its rate limits) into a fake transport, states are kept in memory.
+
+Every interval the harness prints end-to-end latency of the listener, event loop lag, tasks on the loop, queued
+replies and memory. Latency is measured from the moment the event was due, so events fed late because the loop
+was busy count as slow too.
+
+Every event loop runs in a fresh process, so caches, cooldowns and states of one run don't affect the other one.
+uvloop is optional, its run is skipped if it isn't installed.
+
+Run from the repository root:
+    python -m benchmarks.listener_load
+    python -m benchmarks.listener_load --rate 5000 --duration 30 --mix command=40,chat=40,typo=10,heavy=10
+    python -m benchmarks.listener_load --loops uvloop --rest-latency 0.05
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable
+
+from common.fake_gateway import FakeGuildMessageEvent
+
+MESSAGE_MIX = {
+    "command": ["!rpg ping!", "!rpg profile", "!rpg item sword", "!rpg buy potion", "!rpg use potion", "!rpg attack", "!rpg daily"],
+    "chat": ["hey anyone up for a raid tonight?", "gg wp", "brb need to grab food", "who has the key for dungeon 3", "lol", "!!!"],
+    "typo": ["!rpg pnig!", "!rpg atack", "!rpg buy potoin", "!rpg stats [summary", "!rpg profile now please"],
+    "heavy": ["!rpg leaderboard", "!rpg buy potion; use potion; attack; profile", "!rpg buy sword; attack; attack; attack; profile"],
+}
+
+DEFAULT_MIX = "command=50,chat=35,typo=10,heavy=5"
+
+LOOPS = ("asyncio", "uvloop")
+
+
+class _Window:
+    """
+    Measurements of a single report interval.
+    """
+
+    __slots__ = ("fed_count", "handled_count", "latencies", "lags")
+
+    fed_count: int
+    handled_count: int
+    latencies: list[float]
+    lags: list[float]
+
+    def __init__(self):
+        self.fed_count = 0
+        self.handled_count = 0
+        self.latencies = []
+        self.lags = []
+
+
+class LoadRun:
+    """
+    Feeds events into the listener and collects measurements of a single run.
+    """
+
+    _listener: Callable[[Any], Any]
+    _rate: float
+    _duration: float
+    _mix: list[tuple[str, int]]
+    _guilds_count: int
+    _users_count: int
+    _rng: random.Random
+
+    _window: _Window
+    _in_flight: set[asyncio.Task]
+    _failed_count: int
+
+    # whole run, for the summary
+    _latencies: list[float]
+    _lags: list[float]
+    _fed_count: int
+    _max_tasks_count: int
+    _max_memory_mib: float
+
+    def __init__(self, listener: Callable[[Any], Any], rate: float, duration: float, mix: list[tuple[str, int]], guilds_count: int, users_count: int, seed: int):
+        self._listener = listener
+        self._rate = rate
+        self._duration = duration
+        self._mix = mix
+        self._guilds_count = guilds_count
+        self._users_count = users_count
+        self._rng = random.Random(seed)
+
+        self._window = _Window()
+        self._in_flight = set()
+        self._failed_count = 0
+
+        self._latencies = []
+        self._lags = []
+        self._fed_count = 0
+        self._max_tasks_count = 0
+        self._max_memory_mib = 0.0
+
+    def make_event(self) -> FakeGuildMessageEvent:
+        kinds, weights = zip(*self._mix)
+        content = self._rng.choice(MESSAGE_MIX[self._rng.choices(kinds, weights)[0]])
+        guild_id = (self._rng.randrange(self._guilds_count) + 1) << 22
+        return FakeGuildMessageEvent(guild_id, guild_id + self._rng.randrange(5), self._rng.randrange(1, self._users_count + 1), content)
+
+    async def feed(self):
+        """
+        Feeds events at the rate for the duration, events which are already due are fed at once when the loop
+        gets to the feeder late.
+        """
+
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        total_count = int(self._rate * self._duration)
+
+        while self._fed_count < total_count:
+            now = time.perf_counter()
+            due_count = min(total_count, int((now - start) * self._rate) + 1)
+
+            while self._fed_count < due_count:
+                due = start + self._fed_count / self._rate
+                task = loop.create_task(self._handle(self.make_event(), due))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+                self._fed_count += 1
+                self._window.fed_count += 1
+
+            await asyncio.sleep(max(0.0, start + self._fed_count / self._rate - time.perf_counter()))
+
+    async def drain(self, timeout: float) -> int:
+        """
+        :return: count of events still being handled after the timeout
+        """
+
+        if not self._in_flight:
+            return 0
+        _, pending = await asyncio.wait(list(self._in_flight), timeout=timeout)
+        return len(pending)
+
+    async def _handle(self, event: FakeGuildMessageEvent, due: float):
+        try:
+            await self._listener(event)
+        except Exception:
+            self._failed_count += 1
+
+        self._window.handled_count += 1
+        self._window.latencies.append(time.perf_counter() - due)
+
+    async def monitor_lag(self, interval: float):
+        # the loop is late waking this task up by as long as callbacks before it ran
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            self._window.lags.append(time.perf_counter() - start - interval)
+
+    async def report(self, interval: float, outbound):
+        start = time.perf_counter()
+        print(f"{'t':>5}{'fed/s':>8}{'done/s':>8}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'lag p99':>9}{'lag max':>9}{'tasks':>7}{'in flight':>10}{'queued':>8}{'MiB':>7}", flush=True)
+        while True:
+            await asyncio.sleep(interval)
+            window, self._window = self._window, _Window()
+
+            tasks_count = len(asyncio.all_tasks())
+            memory_mib = resident_memory_mib()
+            self._latencies.extend(window.latencies)
+            self._lags.extend(window.lags)
+            self._max_tasks_count = max(self._max_tasks_count, tasks_count)
+            self._max_memory_mib = max(self._max_memory_mib, memory_mib)
+
+            latencies = sorted(window.latencies)
+            lags = sorted(window.lags)
+            print(
+                f"{time.perf_counter() - start:>5.0f}{window.fed_count / interval:>8.0f}{window.handled_count / interval:>8.0f}"
+                f"{_quantile(latencies, 0.5) * 1000:>9.1f}{_quantile(latencies, 0.99) * 1000:>9.1f}{_quantile(latencies, 1.0) * 1000:>9.1f}"
+                f"{_quantile(lags, 0.99) * 1000:>9.1f}{_quantile(lags, 1.0) * 1000:>9.1f}{tasks_count:>7}{len(self._in_flight):>10}"
+                f"{outbound.pending_count():>8}{memory_mib:>7.0f}",
+                flush=True,
+            )
+
+    def summary(self) -> dict[str, float]:
+        self._latencies.extend(self._window.latencies)
+        self._lags.extend(self._window.lags)
+        latencies = sorted(self._latencies)
+        lags = sorted(self._lags)
+        return {
+            "fed": self._fed_count,
+            "handled": len(latencies),
+            "failed": self._failed_count,
+            "p50_ms": _quantile(latencies, 0.5) * 1000,
+            "p99_ms": _quantile(latencies, 0.99) * 1000,
+            "max_ms": _quantile(latencies, 1.0) * 1000,
+            "lag_p99_ms": _quantile(lags, 0.99) * 1000,
+            "lag_max_ms": _quantile(lags, 1.0) * 1000,
+            "max_tasks": self._max_tasks_count,
+            "max_mib": self._max_memory_mib,
+        }
+
+
+def resident_memory_mib() -> float:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        # /proc exists only on linux, elsewhere the peak is the cheapest thing to get
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def _quantile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def _run_load(args: argparse.Namespace) -> dict[str, float]:
+    import bot
+
+    await bot.STATE_STORE.open()
+
+    load_run = LoadRun(bot.parse_message_command, args.rate, args.duration, parse_mix(args.mix), args.guilds, args.users, args.seed)
+    background = [
+        asyncio.get_running_loop().create_task(load_run.monitor_lag(args.lag_interval)),
+        asyncio.get_running_loop().create_task(load_run.report(args.interval, bot.OUTBOUND)),
+    ]
+
+    await load_run.feed()
+    unfinished_count = await load_run.drain(timeout=args.drain_timeout)
+
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+
+    summary = load_run.summary()
+    summary["unfinished"] = unfinished_count
+    summary["replies_sent"] = bot.OUTBOUND.sent_count()
+    summary["replies_dropped"] = bot.OUTBOUND.dropped_count()
+
+    await bot.OUTBOUND.close(timeout=1.0)
+    await bot.STATE_STORE.close()
+    await asyncio.to_thread(bot.EXECUTION_POOLS.shutdown)
+    return summary
+
+
+def run_load(loop_name: str, args: argparse.Namespace) -> dict[str, float] | None:
+    """
+    Runs in a fresh process, the bot module is imported with clients which don't need discord.
+
+    :return: summary of the run, None if the event loop isn't installed
+    """
+
+    loop_factory = None
+    if loop_name == "uvloop":
+        try:
+            import uvloop
+        except ImportError:
+            return None
+        loop_factory = uvloop.new_event_loop
+
+    os.environ.setdefault("RPGbot", "MTIzNDU2Nzg5.benchmark.token")
+
+    # gateways are constructed lazily, so setting them first replaces the ones which would talk to discord or disk
+    import common.gateways
+    from common.outbound import FakeTransport, OutboundMessenger
+    from common.state_store import StateStore
+    common.gateways.OUTBOUND = OutboundMessenger(FakeTransport(latency=args.rest_latency))
+    common.gateways.STATE_STORE = StateStore(":memory:")
+
+    print(f"--- {loop_name} ---", flush=True)
+    with asyncio.Runner(loop_factory=loop_factory) as runner:
+        return runner.run(_run_load(args))
+
+
+def parse_mix(mix: str) -> list[tuple[str, int]]:
+    """
+    :raises ValueError: if the mix names unknown kinds of messages or has no positive weight
+    """
+
+    weights = []
+    for part in mix.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in MESSAGE_MIX:
+            raise ValueError(f"Unknown kind of messages \"{kind}\", known kinds are: {', '.join(MESSAGE_MIX)}")
+        weights.append((kind, int(weight)))
+
+    if sum(weight for _, weight in weights) <= 0:
+        raise ValueError("Mix of messages has to have a positive weight")
+    return weights
+
+
+def main(argv: list[str] | None = None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--rate", type=float, default=2000, help="events fed per second")
+    arg_parser.add_argument("--duration", type=float, default=10.0, help="seconds events are fed")
+    arg_parser.add_argument("--mix", default=DEFAULT_MIX, help=f"weights of kinds of messages ({', '.join(MESSAGE_MIX)})")
+    arg_parser.add_argument("--guilds", type=int, default=50)
+    arg_parser.add_argument("--users", type=int, default=2000, help="authors of messages in every guild")
+    arg_parser.add_argument("--rest-latency", type=float, default=0.0, help="seconds every sent reply takes")
+    arg_parser.add_argument("--loops", nargs="+", choices=LOOPS, default=list(LOOPS), help="event loops to compare")
+    arg_parser.add_argument("--interval", type=float, default=1.0, help="seconds between printed measurements")
+    arg_parser.add_argument("--lag-interval", type=float, default=0.01, help="seconds between loop lag probes")
+    arg_parser.add_argument("--drain-timeout", type=float, default=10.0, help="seconds to wait for events still being handled")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args(argv)
+    parse_mix(args.mix)
+
+    print(f"{args.rate:.0f} events/s for {args.duration:.0f}s, mix {args.mix}, {args.guilds} guilds")
+
+    summaries = {}
+    for loop_name in args.loops:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            summaries[loop_name] = executor.submit(run_load, loop_name, args).result()
+
+    print()
+    print(f"{'loop':<9}{'fed':>8}{'handled':>9}{'failed':>8}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'lag p99':>9}{'lag max':>9}{'tasks':>7}{'MiB':>7}{'sent':>7}{'dropped':>9}")
+    for loop_name, summary in summaries.items():
+        if summary is None:
+            print(f"{loop_name:<9}not installed, skipped")
+            continue
+        print(
+            f"{loop_name:<9}{summary['fed']:>8}{summary['handled']:>9}{summary['failed']:>8}{summary['p50_ms']:>9.1f}{summary['p99_ms']:>9.1f}"
+            f"{summary['max_ms']:>9.1f}{summary['lag_p99_ms']:>9.1f}{summary['lag_max_ms']:>9.1f}{summary['max_tasks']:>7}{summary['max_mib']:>7.0f}"
+            f"{summary['replies_sent']:>7}{summary['replies_dropped']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
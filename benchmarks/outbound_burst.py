@@ -0,0 +1,72 @@
+"""
+Delivery of reply bursts with one REST request per reply versus the coalescing outbound messenger.
+
+Rate limits are emulated by a fake transport with the time scaled down (5 messages per 0.5s instead of 5s).
+Direct sending waits for the bucket of the channel before every request, the same way as the REST client does
+once it knows the bucket, so the difference comes from coalescing replies into fewer requests.
+
+Run from the repository root:
+    python -m benchmarks.outbound_burst
+"""
+import argparse
+import asyncio
+import time
+
+from common.outbound import FakeTransport, OutboundMessenger, OutboundRateLimitedError, RouteBucket
+
+SCALED_CHANNEL_RATE = (5, 0.5)
+SCALED_GLOBAL_RATE = (50, 0.1)
+
+
+async def send_directly(transport: FakeTransport, bucket: RouteBucket, channel_id: int, content: str):
+    while True:
+        while (delay := bucket.delay()) > 0:
+            await asyncio.sleep(delay)
+        bucket.take()
+        try:
+            return await transport.send(channel_id, content)
+        except OutboundRateLimitedError as e:
+            bucket.block_for(e.retry_after)
+
+
+async def run_direct(channels: int, replies: int, latency: float) -> dict[str, float]:
+    transport = FakeTransport(latency=latency, rate=SCALED_CHANNEL_RATE)
+    buckets = [RouteBucket(*SCALED_CHANNEL_RATE) for _ in range(channels)]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        send_directly(transport, buckets[channel_id], channel_id, f"reply {reply_i} of a burst")
+        for channel_id in range(channels) for reply_i in range(replies)
+    ))
+
+    return {"seconds": time.perf_counter() - start, "requests": len(transport.sent) + transport.rejected_count, "rejected": transport.rejected_count}
+
+
+async def run_outbound(channels: int, replies: int, latency: float) -> dict[str, float]:
+    transport = FakeTransport(latency=latency, rate=SCALED_CHANNEL_RATE)
+    messenger = OutboundMessenger(transport, max_pending_per_channel=replies, channel_rate=SCALED_CHANNEL_RATE, global_rate=SCALED_GLOBAL_RATE)
+
+    start = time.perf_counter()
+    for channel_id in range(channels):
+        for reply_i in range(replies):
+            messenger.send(channel_id, f"reply {reply_i} of a burst")
+    await messenger.close()
+
+    return {"seconds": time.perf_counter() - start, "requests": len(transport.sent) + transport.rejected_count, "rejected": transport.rejected_count}
+
+
+def main(argv: list[str] | None = None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--channels", type=int, default=4, help="channels receiving a burst at the same time")
+    arg_parser.add_argument("--replies", type=int, default=40, help="replies of a burst in every channel")
+    arg_parser.add_argument("--latency", type=float, default=0.02, help="latency of a single REST request in seconds")
+    args = arg_parser.parse_args(argv)
+
+    print(f"{'sender':<10}{'seconds':>10}{'requests':>10}{'429s':>8}")
+    for name, run in (("direct", run_direct), ("outbound", run_outbound)):
+        stats = asyncio.run(run(args.channels, args.replies, args.latency))
+        print(f"{name:<10}{stats['seconds']:>10.2f}{stats['requests']:>10}{stats['rejected']:>8}")
+
+
+if __name__ == "__main__":
+    main()
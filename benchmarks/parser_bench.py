@@ -0,0 +1,301 @@
+"""
+Parser micro-benchmarks with synthetic command registries and message corpora, runs offline without discord token.
+
+Run from the repository root:
+    python -m benchmarks.parser_bench
+    python -m benchmarks.parser_bench --sizes 10 1000 --save-baseline baseline.json
+    python -m benchmarks.parser_bench --sizes 10 1000 --compare baseline.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from benchmarks.prefix_filter import make_chat_corpus
+from common.models.message_command_parsing import Command, CommandParser, CommandParserBuilder
+
+PREFIX = "!rpg"
+
+NAME_WORDS = [
+    "inventory", "show", "shop", "buy", "sell", "fight", "quest", "list", "accept", "guild", "join", "leave",
+    "trade", "offer", "craft", "item", "map", "travel", "rest", "duel", "party", "invite", "skill", "learn",
+]
+
+ITEMS = ["sword", "shield", "potion", "bow", "arrow", "helmet", "ring", "amulet", "scroll", "gem"]
+
+# parse stages in the order they are run
+STAGES = ["could_match", "tokenize", "keywords", "lookup", "bind", "invoke"]
+
+
+class FakeMessage:
+    async def respond(self, content):
+        ...
+
+
+class FakeContext:
+    """
+    Stands in for hikari.GuildMessageCreateEvent, only attributes used by the parser are provided.
+    """
+
+    def __init__(self, guild_id: int = 1, author_id: int = 1, channel_id: int = 1):
+        self.message = FakeMessage()
+        self.guild_id = guild_id
+        self.author_id = author_id
+        self.channel_id = channel_id
+
+
+def make_command_names(commands_count: int, seed: int = 3) -> list[str]:
+    rng = random.Random(seed)
+    names: set[str] = set()
+    while len(names) < commands_count:
+        words = rng.sample(NAME_WORDS, rng.randint(1, 3))
+        # numbered suffix keeps names unique in big registries, the same way as real names differ in a word
+        if len(names) >= len(NAME_WORDS):
+            words.append(f"v{rng.randint(0, commands_count)}")
+        names.add(" ".join(words))
+    return sorted(names)
+
+
+def make_commands(commands_count: int) -> list[Command]:
+    """
+    Creates commands with one of a few typical signatures, the signature depends on the command index.
+    """
+
+    commands = []
+    for command_i, name in enumerate(make_command_names(commands_count)):
+        signature = command_i % 3
+        if signature == 0:
+            async def command(ctx, count: int = 1, target: str = "self"):
+                ...
+        elif signature == 1:
+            async def command(ctx, items: list[str], amount: int = 1):
+                ...
+        else:
+            async def command(ctx, matrix: list[list[int]], label: str = "none"):
+                ...
+        commands.append(Command(PREFIX, name)(command))
+    return commands
+
+
+def make_corpus(command_names: list[str], messages_count: int, seed: int = 4) -> dict[str, list[str]]:
+    """
+    :return: messages of every kind, kinds are kept apart so they can be measured separately
+    """
+
+    rng = random.Random(seed)
+    simple_names = command_names[0::3]
+    list_names = command_names[1::3]
+    nested_names = command_names[2::3]
+
+    def typo(name: str) -> str:
+        i = rng.randrange(len(name))
+        return name[:i] + rng.choice("qxzjk") + name[i + 1:]
+
+    corpus: dict[str, list[str]] = {
+        "chat": make_chat_corpus(messages_count),
+        "valid": [],
+        "keyword": [],
+        "nested": [],
+        "typo": [],
+        "syntax": [],
+    }
+
+    for _ in range(messages_count):
+        corpus["valid"].append(f"{PREFIX} {rng.choice(simple_names)} {rng.randint(1, 99)}")
+        corpus["keyword"].append(f"{PREFIX} {rng.choice(list_names)} amount: {rng.randint(1, 9)} items: {', '.join(rng.sample(ITEMS, 4))}")
+        matrix = ", ".join("[" + ", ".join(str(rng.randint(0, 9)) for _ in range(4)) + "]" for _ in range(4))
+        corpus["nested"].append(f"{PREFIX} {rng.choice(nested_names or simple_names)} [{matrix}] label: grid")
+        corpus["typo"].append(f"{PREFIX} {typo(rng.choice(command_names))}")
+        corpus["syntax"].append(f"{PREFIX} {rng.choice(list_names or simple_names)} [{', '.join(rng.sample(ITEMS, 3))}")
+
+    return corpus
+
+
+async def run_stages(parser: CommandParser, message: str, ctx, stage_times: dict[str, list[int]]):
+    """
+    Runs the parse pipeline stage by stage (the same way as CommandParser.parse does) and records time of each stage.
+    """
+
+    clock = time.perf_counter_ns
+
+    start = clock()
+    could_match = parser.could_match(message)
+    stage_times["could_match"].append(clock() - start)
+    if not could_match:
+        return
+
+    start = clock()
+    tokens = parser.get_command_tokens(message)
+    stage_times["tokenize"].append(clock() - start)
+    prefix_index = parser._command_index.get(tokens[0])
+    if prefix_index is None:
+        return
+
+    start = clock()
+    keyword_arguments, other_tokens = parser.get_command_keyword_args_tokens(tokens[1:])
+    stage_times["keywords"].append(clock() - start)
+
+    start = clock()
+    command, positional_arguments = parser.get_command_from_tokens(other_tokens, prefix_index)
+    if command is None:
+        parser.get_best_matching_command(tokens[0], " ".join(other_tokens))
+        stage_times["lookup"].append(clock() - start)
+        return
+    stage_times["lookup"].append(clock() - start)
+
+    start = clock()
+    command_args = parser._binding_plans[command].bind(parser.format_positional_args(positional_arguments), keyword_arguments)
+    stage_times["bind"].append(clock() - start)
+
+    start = clock()
+    command_args[command.context_arg_name()] = ctx
+    await command.invoke_async(**command_args)
+    stage_times["invoke"].append(clock() - start)
+
+
+def percentile(samples: list[int], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return float(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))])
+
+
+async def measure_parse(parser: CommandParser, messages: list[str], ctx) -> dict[str, float]:
+    latencies: list[int] = []
+    clock = time.perf_counter_ns
+
+    total_start = clock()
+    for message in messages:
+        start = clock()
+        if parser.could_match(message):
+            await parser.parse_outcome(message, ctx)
+        latencies.append(clock() - start)
+    total = clock() - total_start
+
+    return {
+        "throughput": len(messages) / (total / 1e9),
+        "p50_ns": percentile(latencies, 0.5),
+        "p99_ns": percentile(latencies, 0.99),
+    }
+
+
+async def measure_allocations(parser: CommandParser, messages: list[str], ctx) -> dict[str, float]:
+    """
+    :return: average amount of traced memory blocks and peak bytes allocated by a single parse
+    """
+
+    tracemalloc.start()
+    try:
+        blocks_total = 0
+        peak_total = 0
+        for message in messages:
+            before = tracemalloc.take_snapshot().statistics("filename")
+            blocks_before = sum(stat.count for stat in before)
+            tracemalloc.reset_peak()
+            current_before, _ = tracemalloc.get_traced_memory()
+
+            if parser.could_match(message):
+                await parser.parse_outcome(message, ctx)
+
+            _, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot().statistics("filename")
+            blocks_total += max(0, sum(stat.count for stat in after) - blocks_before)
+            peak_total += peak - current_before
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "retained_blocks": blocks_total / len(messages),
+        "peak_bytes": peak_total / len(messages),
+    }
+
+
+async def run_benchmarks(sizes: list[int], messages_count: int, allocation_samples: int) -> dict:
+    results: dict = {}
+    ctx = FakeContext()
+
+    for size in sizes:
+        build_start = time.perf_counter()
+        commands = make_commands(size)
+        parser = CommandParserBuilder().with_commands(commands).build()
+        build_time = time.perf_counter() - build_start
+
+        corpus = make_corpus([command.name() for command in commands], messages_count)
+        size_results: dict = {"build_s": build_time, "kinds": {}, "stages": {}}
+
+        stage_times: dict[str, list[int]] = {stage: [] for stage in STAGES}
+        for kind, messages in corpus.items():
+            size_results["kinds"][kind] = await measure_parse(parser, messages, ctx)
+            size_results["kinds"][kind].update(await measure_allocations(parser, messages[:allocation_samples], ctx))
+
+            for message in messages:
+                try:
+                    await run_stages(parser, message, ctx, stage_times)
+                except Exception:
+                    pass
+
+        for stage, samples in stage_times.items():
+            size_results["stages"][stage] = {"p50_ns": percentile(samples, 0.5), "p99_ns": percentile(samples, 0.99)}
+
+        results[str(size)] = size_results
+
+    return results
+
+
+def print_results(results: dict, baseline: dict | None):
+    def compare(value: float, baseline_value: float | None, higher_is_better: bool) -> str:
+        if baseline_value is None or baseline_value == 0:
+            return ""
+        change = (value - baseline_value) / baseline_value * 100
+        regression = change < 0 if higher_is_better else change > 0
+        return f" ({change:+.0f}%{' !' if regression and abs(change) > 10 else ''})"
+
+    for size, size_results in results.items():
+        base_size = (baseline or {}).get(size, {})
+        print(f"\n== {size} commands (build {size_results['build_s'] * 1000:.1f} ms)")
+        print(f"{'kind':<10}{'msg/s':>16}{'p50 us':>16}{'p99 us':>16}{'peak B':>16}{'blocks':>10}")
+        for kind, stats in size_results["kinds"].items():
+            base = base_size.get("kinds", {}).get(kind, {})
+            print(f"{kind:<10}"
+                  f"{stats['throughput']:>10.0f}{compare(stats['throughput'], base.get('throughput'), True):>6}"
+                  f"{stats['p50_ns'] / 1000:>10.1f}{compare(stats['p50_ns'], base.get('p50_ns'), False):>6}"
+                  f"{stats['p99_ns'] / 1000:>10.1f}{compare(stats['p99_ns'], base.get('p99_ns'), False):>6}"
+                  f"{stats['peak_bytes']:>16.0f}{stats['retained_blocks']:>10.1f}")
+
+        print(f"{'stage':<12}{'p50 us':>16}{'p99 us':>16}")
+        for stage, stats in size_results["stages"].items():
+            base = base_size.get("stages", {}).get(stage, {})
+            print(f"{stage:<12}"
+                  f"{stats['p50_ns'] / 1000:>10.2f}{compare(stats['p50_ns'], base.get('p50_ns'), False):>6}"
+                  f"{stats['p99_ns'] / 1000:>10.2f}{compare(stats['p99_ns'], base.get('p99_ns'), False):>6}")
+
+
+def main(argv: list[str] | None = None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000], help="sizes of command registries")
+    arg_parser.add_argument("--messages", type=int, default=2000, help="messages of every kind replayed per registry")
+    arg_parser.add_argument("--allocation-samples", type=int, default=200, help="messages of every kind traced by tracemalloc")
+    arg_parser.add_argument("--save-baseline", metavar="PATH", help="save results as a baseline")
+    arg_parser.add_argument("--compare", metavar="PATH", help="compare results with a saved baseline")
+    args = arg_parser.parse_args(argv)
+
+    results = asyncio.run(run_benchmarks(args.sizes, args.messages, args.allocation_samples))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f"\nbaseline saved to {args.save_baseline}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
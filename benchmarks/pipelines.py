@@ -0,0 +1,81 @@
+"""
+Player actions sent as separate messages versus chained into pipelines ("!rpg buy potion; use potion; attack").
+
+Counts gateway events (messages) and replies needed for the same actions and measures how long the parser takes
+for all of them. States are kept in an in-memory store.
+
+Run from the repository root:
+    python -m benchmarks.pipelines
+    python -m benchmarks.pipelines --actions 20000 --chain 5
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from common.command_registry import create_command_parser_builder
+from common.fake_gateway import FakeGuildMessageEvent
+from common.models.message_command_parsing import LazyCommand, ParseOutcomeKind
+from common.state_store import StateStore
+
+ACTIONS = ["daily", "buy potion", "use potion", "attack", "profile", "ping!"]
+
+
+async def run_messages(messages: list[tuple[FakeGuildMessageEvent, str]]) -> dict[str, float]:
+    store = StateStore(":memory:")
+    await store.open()
+
+    replies = 0
+
+    async def count_reply(execution_context, content):
+        nonlocal replies
+        replies += 1
+
+    parser = create_command_parser_builder().with_dependency("state", store).with_responder(count_reply).build()
+
+    # command modules listed in the manifest are imported before measuring
+    for command in parser.registered_commands():
+        if isinstance(command, LazyCommand):
+            command.resolve()
+
+    failures = 0
+    start = time.perf_counter()
+    for event, content in messages:
+        outcome = await parser.parse_outcome(content, event)
+        if outcome.kind is not ParseOutcomeKind.SUCCESS:
+            failures += 1
+    elapsed = time.perf_counter() - start
+
+    await store.close()
+    return {"messages": len(messages), "replies": replies, "failures": failures, "seconds": elapsed}
+
+
+def make_messages(actions_count: int, chain: int, players_count: int, seed: int) -> list[tuple[FakeGuildMessageEvent, str]]:
+    rng = random.Random(seed)
+    messages = []
+    while actions_count > 0:
+        chain_length = min(chain, actions_count)
+        actions = [rng.choice(ACTIONS) for _ in range(chain_length)]
+        event = FakeGuildMessageEvent(1 << 22, 5, rng.randrange(1, players_count + 1), "")
+        messages.append((event, "!rpg " + "; ".join(actions)))
+        actions_count -= chain_length
+    return messages
+
+
+def main(argv: list[str] | None = None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--actions", type=int, default=10000, help="player actions in total")
+    arg_parser.add_argument("--chain", type=int, default=4, help="actions chained in a single message")
+    arg_parser.add_argument("--players", type=int, default=500)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args(argv)
+
+    print(f"{args.actions} actions of {args.players} players")
+    print(f"{'messages':<20}{'events':>8}{'replies':>9}{'failures':>10}{'seconds':>9}{'actions/s':>11}")
+    for name, chain in (("separate", 1), (f"chains of {args.chain}", args.chain)):
+        result = asyncio.run(run_messages(make_messages(args.actions, chain, args.players, args.seed)))
+        print(f"{name:<20}{result['messages']:>8}{result['replies']:>9}{result['failures']:>10}{result['seconds']:>9.2f}{args.actions / result['seconds']:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Per-message cost of rejecting ordinary chat before and after the prefix pre-filter.
+
+The old path is the tokenizer and prefix check of the parser before the pre-filter existed (baseline commit f7457d9),
+copied here because the parser's own tokenizer was rewritten since then.
+
+Run from the repository root:
+    python -m benchmarks.prefix_filter
+"""
+import random
+import time
+
+from common.models.message_command_parsing import Command, CommandParserBuilder
+
+CHAT_WORDS = [
+    "hey", "lol", "anyone", "up", "for", "a", "raid", "tonight?", "gg", "wp", "that", "boss", "was", "brutal",
+    "(not", "really)", "brb", "need", "to", "grab", "food", "did", "you", "see", "the", "new", "patch", "notes",
+    "xD", "[afk]", "ok", "who", "has", "the", "key", "for", "dungeon", "3", "\"quoted\"", "https://example.com",
+    ":)", "<@123456789>", "nice", "one", "!", "?",
+]
+
+
+def make_chat_corpus(messages_count: int, seed: int = 1) -> list[str]:
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(messages_count):
+        words_count = rng.randint(1, 30)
+        corpus.append(" ".join(rng.choice(CHAT_WORDS) for _ in range(words_count)))
+    return corpus
+
+
+def make_command_corpus(messages_count: int, seed: int = 2) -> list[str]:
+    rng = random.Random(seed)
+    return [f"!rpg {rng.choice(['ping!', 'inventory show', 'shop buy potion 3'])}" for _ in range(messages_count)]
+
+
+class BaselineRejection:
+    """
+    Tokenizer and prefix lookup of the baseline parser.parse, up to the point where a message with an unknown prefix
+    was rejected.
+    """
+
+    def __init__(self, registered_prefixes: list[str], supported_argument_packing: list[tuple[str, str]]):
+        self._registered_commands = {prefix: [] for prefix in registered_prefixes}
+        self._supported_argument_packing = {x[0]: x[1] for x in supported_argument_packing}
+
+    def is_command(self, command_string: str) -> bool:
+        command_tokens = self.get_command_tokens(command_string)
+
+        # prefix should be contiguous and at the first place
+        command_prefix = command_tokens.pop(0)
+        return self._registered_commands.get(command_prefix) is not None
+
+    def get_command_tokens(self, expr: str) -> list[str]:
+        expr_len: int = len(expr)
+        expr_i: int = 0
+        tokens: list[str] = []
+        current_token: str = ""
+
+        while expr_i < expr_len:
+            c = expr[expr_i]
+            if c == ' ':
+                if len(current_token) > 0:
+                    tokens.append(current_token)
+                    current_token = ""
+            elif c == ':' or c == ',':
+                if len(current_token) > 0:
+                    tokens.append(current_token)
+                    current_token = ""
+                tokens.append(c)
+
+            elif (pack_end := self._supported_argument_packing.get(c)) is not None:
+                if len(current_token) > 0:
+                    raise self.construct_syntax_error(f"Unexpected token \"{pack_end}\"", expr, expr_i)
+
+                open_c = 1
+                pack_end_i = expr_i+1
+                while pack_end_i < expr_len:
+                    if expr[pack_end_i] == pack_end:
+                        open_c-=1
+                    elif expr[pack_end_i] == c:
+                        open_c+=1
+
+                    if open_c == 0:
+                        break
+
+                    pack_end_i+=1
+
+                if open_c != 0:
+                    raise self.construct_syntax_error(f"Expected \"{pack_end}\" but it wasn't found", expr, expr_len - 1)
+
+                tokens.append(expr[expr_i: pack_end_i+1])
+                expr_i = pack_end_i
+            else:
+                current_token += c
+
+            expr_i += 1
+
+        if len(current_token) > 0:
+            tokens.append(current_token)
+
+        return tokens
+
+    def construct_syntax_error(self, err: str, expr: str, error_position: int):
+        err_str: str = err + ": " + expr + "\n"
+        err_off = len(err_str) + 2
+        for expr_i in range(err_off):
+            err_str += " "
+
+        for expr_i in range(len(expr)):
+            if error_position-1 <= expr_i <= error_position + 1:
+                err_str += '^'
+            else:
+                err_str += ' '
+
+        return SyntaxError(err_str)
+
+
+def build_parser():
+    commands = []
+    for name in ["ping!", "inventory show", "shop buy"]:
+        async def command(ctx):
+            ...
+        commands.append(Command("!rpg", name)(command))
+
+    return CommandParserBuilder().with_commands(commands).build()
+
+
+def measure(func, corpus: list[str], repeats: int) -> float:
+    """
+    :return: mean cost of a single call in nanoseconds
+    """
+
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        for message in corpus:
+            try:
+                func(message)
+            except SyntaxError:
+                # unbalanced brackets in chat are reported by the tokenizer as syntax errors
+                pass
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best / len(corpus)
+
+
+def main():
+    parser = build_parser()
+    baseline = BaselineRejection(["!rpg"], CommandParserBuilder._supported_argument_packings)
+    chat = make_chat_corpus(20_000)
+    commands = make_command_corpus(20_000)
+
+    rows = [
+        ("chat, tokenize (old path)", measure(baseline.is_command, chat, 5)),
+        ("chat, tokenize (current)", measure(parser.get_command_tokens, chat, 5)),
+        ("chat, could_match", measure(parser.could_match, chat, 5)),
+        ("commands, could_match", measure(parser.could_match, commands, 5)),
+    ]
+
+    rejected = sum(1 for message in chat if not parser.could_match(message))
+    print(f"chat messages rejected by could_match: {rejected}/{len(chat)}")
+    for label, cost in rows:
+        print(f"{label:<28} {cost:10.1f} ns/message")
+
+
+if __name__ == "__main__":
+    main()
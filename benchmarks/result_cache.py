@@ -0,0 +1,78 @@
+"""
+Lookup commands ("!rpg profile", "!rpg leaderboard", "!rpg item ...") with and without caching of their values,
+while other commands keep changing player states, which invalidates cached profiles of the changed players.
+
+Run from the repository root:
+    python -m benchmarks.result_cache
+    python -m benchmarks.result_cache --commands 50000 --players 200 --lookups 0.9
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from common.command_registry import create_command_parser_builder
+from common.fake_gateway import FakeGuildMessageEvent
+from common.models.message_command_parsing import LazyCommand, ParseOutcomeKind, ResultCache
+from common.state_store import StateStore
+
+LOOKUPS = ["profile", "leaderboard", "item potion", "item sword", "item bow"]
+CHANGES = ["buy potion", "use potion", "attack"]
+
+
+async def run_messages(messages: list[tuple[FakeGuildMessageEvent, str]], result_cache: ResultCache | None) -> dict[str, float]:
+    store = StateStore(":memory:")
+    await store.open()
+
+    builder = create_command_parser_builder().with_dependency("state", store).with_responder(lambda execution_context, content: asyncio.sleep(0))
+    if result_cache is not None:
+        builder.with_result_cache(result_cache)
+        store.add_change_listener(lambda state: result_cache.invalidate(*state.tags()))
+    parser = builder.build()
+
+    # command modules listed in the manifest are imported before measuring
+    for command in parser.registered_commands():
+        if isinstance(command, LazyCommand):
+            command.resolve()
+
+    failures = 0
+    start = time.perf_counter()
+    for event, content in messages:
+        outcome = await parser.parse_outcome(content, event)
+        if outcome.kind is not ParseOutcomeKind.SUCCESS:
+            failures += 1
+    elapsed = time.perf_counter() - start
+
+    await store.close()
+    return {"seconds": elapsed, "failures": failures}
+
+
+def make_messages(commands_count: int, players_count: int, lookups_share: float, seed: int) -> list[tuple[FakeGuildMessageEvent, str]]:
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(commands_count):
+        action = rng.choice(LOOKUPS) if rng.random() < lookups_share else rng.choice(CHANGES)
+        messages.append((FakeGuildMessageEvent(1 << 22, 5, rng.randrange(1, players_count + 1), ""), "!rpg " + action))
+    return messages
+
+
+def main(argv: list[str] | None = None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--commands", type=int, default=20000)
+    arg_parser.add_argument("--players", type=int, default=100)
+    arg_parser.add_argument("--lookups", type=float, default=0.8, help="share of lookup commands")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args(argv)
+
+    messages = make_messages(args.commands, args.players, args.lookups, args.seed)
+
+    print(f"{args.commands} commands of {args.players} players, {args.lookups:.0%} lookups")
+    print(f"{'values':<10}{'seconds':>9}{'commands/s':>12}{'hits':>8}{'misses':>8}{'invalidated':>13}{'failures':>10}")
+    for name, result_cache in (("computed", None), ("cached", ResultCache())):
+        result = asyncio.run(run_messages(messages, result_cache))
+        hits, misses, invalidated = (0, 0, 0) if result_cache is None else (result_cache.hits_count(), result_cache.misses_count(), result_cache.invalidated_count())
+        print(f"{name:<10}{result['seconds']:>9.2f}{args.commands / result['seconds']:>12.0f}{hits:>8}{misses:>8}{invalidated:>13}{result['failures']:>10}")
+
+
+if __name__ == "__main__":
+    main()
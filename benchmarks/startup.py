@@ -0,0 +1,121 @@
+"""
+Startup cost of the bot: building the parser from eagerly imported command modules versus from a command manifest,
+and importing gateways with clients constructed lazily versus all of them constructed at once.
+
+Every measurement runs in a fresh interpreter, command modules are generated into a temporary package.
+
+Run from the repository root:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --modules 200 --commands-per-module 10
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMAND_MODULE_TEMPLATE = '''import hikari
+from typing import Literal
+from common.models.message_command_parsing import Command
+'''
+
+COMMAND_TEMPLATE = '''
+@Command("!rpg", "module{module_i} command{command_i}")
+async def command{command_i}(ctx: hikari.GuildMessageCreateEvent, count: int = 1, items: list[str] | None = None, mode: Literal["fast", "slow"] = "fast"):
+    return f"{{count}} {{items}} {{mode}}"
+'''
+
+EAGER_STARTUP = '''
+import time
+start = time.perf_counter()
+import hikari
+from common.models.message_command_parsing import *
+CommandManifest.import_package_modules({package!r})
+parser = CommandParserBuilder().with_commands(CREATED_COMMANDS).build()
+print(time.perf_counter() - start)
+'''
+
+MANIFEST_STARTUP = '''
+import time
+start = time.perf_counter()
+import hikari
+from common.models.message_command_parsing import *
+manifest = CommandManifest.load_if_up_to_date({manifest_path!r}, {package!r})
+parser = CommandParserBuilder().with_manifest(manifest).build()
+print(time.perf_counter() - start)
+'''
+
+LAZY_GATEWAYS = '''
+import time
+start = time.perf_counter()
+import hikari
+from common.gateways import BOT, OUTBOUND, PARSE_METRICS
+print(time.perf_counter() - start)
+'''
+
+ALL_GATEWAYS = '''
+import time
+start = time.perf_counter()
+import hikari
+from common.gateways import BOT, OUTBOUND, PARSE_METRICS, MCL, ACL, client
+print(time.perf_counter() - start)
+'''
+
+
+def make_command_package(directory: str, package: str, modules_count: int, commands_per_module: int):
+    package_dir = os.path.join(directory, package)
+    os.makedirs(package_dir)
+    open(os.path.join(package_dir, "__init__.py"), "w").close()
+
+    for module_i in range(modules_count):
+        with open(os.path.join(package_dir, f"module{module_i}.py"), "w") as module_file:
+            module_file.write(COMMAND_MODULE_TEMPLATE)
+            for command_i in range(commands_per_module):
+                module_file.write(COMMAND_TEMPLATE.format(module_i=module_i, command_i=command_i))
+
+
+def run_snippet(snippet: str, python_path: str, repeats: int) -> float:
+    """
+    :return: the shortest time printed by the snippet over all repeats
+    """
+
+    env = dict(os.environ, PYTHONPATH=python_path, RPGbot=os.environ.get("RPGbot", "MTIzNDU2Nzg5.benchmark.token"))
+    times = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", snippet], env=env, cwd=REPOSITORY_ROOT, capture_output=True, text=True, check=True)
+        times.append(float(output.stdout.strip().splitlines()[-1]))
+    return min(times)
+
+
+def main(argv: list[str] | None = None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--modules", type=int, default=100, help="generated command modules")
+    arg_parser.add_argument("--commands-per-module", type=int, default=5, help="commands declared in every module")
+    arg_parser.add_argument("--repeats", type=int, default=3, help="fresh interpreters started for every measurement")
+    args = arg_parser.parse_args(argv)
+
+    package = "benchmark_commands"
+    with tempfile.TemporaryDirectory() as directory:
+        make_command_package(directory, package, args.modules, args.commands_per_module)
+        python_path = os.pathsep.join([directory, REPOSITORY_ROOT])
+        manifest_path = os.path.join(directory, "manifest.json")
+
+        generate = f"from common.models.message_command_parsing.command_manifest import CommandManifest\nCommandManifest.generate({package!r}).save({manifest_path!r})\nprint(0)"
+        run_snippet(generate, python_path, 1)
+
+        results = {
+            "eager commands": run_snippet(EAGER_STARTUP.format(package=package), python_path, args.repeats),
+            "manifest": run_snippet(MANIFEST_STARTUP.format(package=package, manifest_path=manifest_path), python_path, args.repeats),
+            "used gateways": run_snippet(LAZY_GATEWAYS, python_path, args.repeats),
+            "all gateways": run_snippet(ALL_GATEWAYS, python_path, args.repeats),
+        }
+
+    print(f"{args.modules} modules x {args.commands_per_module} commands")
+    for name, seconds in results.items():
+        print(f"{name:<16}{seconds * 1000:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Throughput of commands changing player states, with states written behind into SQLite in batches versus every
+command writing and committing its own change.
+
+Every simulated command locks a random player, gives them gold and an item, like "!rpg daily" or "!rpg buy" do.
+After the store is closed the database is checked to contain every change.
+
+Run from the repository root:
+    python -m benchmarks.state_store
+    python -m benchmarks.state_store --commands 100000 --players 20000 --concurrency 128
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from common.state_store import StateStore
+
+
+async def run_commands(store: StateStore, commands_count: int, players_count: int, guilds_count: int, concurrency: int, seed: int) -> float:
+    rng = random.Random(seed)
+    invocations = [(rng.randrange(guilds_count), rng.randrange(players_count)) for _ in range(commands_count)]
+    next_invocation = 0
+
+    async def run_worker():
+        nonlocal next_invocation
+        while next_invocation < len(invocations):
+            guild_id, player_id = invocations[next_invocation]
+            next_invocation += 1
+            async with store.player(guild_id, player_id) as player:
+                player.gold += 1
+                player.add_item("potion")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_worker() for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+
+async def run_store(path: str, write_behind: bool, args: argparse.Namespace) -> dict[str, float]:
+    store = StateStore(path, working_set_size=args.working_set, write_behind=write_behind)
+    await store.open()
+    elapsed = await run_commands(store, args.commands, args.players, args.guilds, args.concurrency, args.seed)
+
+    start = time.perf_counter()
+    await store.close()
+    close_elapsed = time.perf_counter() - start
+
+    connection = sqlite3.connect(path)
+    persisted_gold = connection.execute("SELECT COALESCE(SUM(gold), 0) FROM players").fetchone()[0]
+    connection.close()
+
+    return {
+        "commands/s": args.commands / elapsed,
+        "close_ms": close_elapsed * 1000,
+        "transactions": store.flushes_count(),
+        "evicted": store.evicted_count(),
+        "persisted": persisted_gold == args.commands,
+    }
+
+
+def main(argv: list[str] | None = None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--commands", type=int, default=20000, help="simulated commands")
+    arg_parser.add_argument("--players", type=int, default=1000, help="players in every guild")
+    arg_parser.add_argument("--guilds", type=int, default=4)
+    arg_parser.add_argument("--concurrency", type=int, default=64, help="commands running at the same time")
+    arg_parser.add_argument("--working-set", type=int, default=10000, help="states kept in memory")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args(argv)
+
+    print(f"{args.commands} commands, {args.guilds} guilds x {args.players} players, concurrency {args.concurrency}, working set {args.working_set}")
+    print(f"{'writes':<14}{'commands/s':>12}{'close ms':>10}{'transactions':>14}{'evicted':>10}{'persisted':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, write_behind in (("per command", False), ("write-behind", True)):
+            result = asyncio.run(run_store(os.path.join(directory, f"{name.replace(' ', '-')}.sqlite3"), write_behind, args))
+            print(f"{name:<14}{result['commands/s']:>12.0f}{result['close_ms']:>10.1f}{result['transactions']:>14}{result['evicted']:>10}{str(result['persisted']):>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,133 @@
-import hikari.intents
-from common.models.message_command_parsing import *
-from common.gateways import BOT
 import hikari
-import arc
-import miru
+from common.models.message_command_parsing import *
+from common.gateways import ACL, BOT, GATEWAY_PROFILE, OUTBOUND, PARSE_METRICS, RESULT_CACHE, STATE_STORE
+from common.command_registry import COMMANDS_PACKAGE, create_command_parser_builder
+from common.sharding import ShardSupervisor, WorkerContext, fetch_recommended_shard_count
+from common.slash_commands import SlashCommandGenerator
+from common.state_store import GuildSettings
+import argparse
+import asyncio
 import os
-from commands import *
 
-discord_msg_command_parser = (CommandParserBuilder()
-    .with_commands(CREATED_COMMANDS)
-    .with_string_converter(StringConverter())
+EXECUTION_POOLS = ExecutionPools(thread_pool_size=4, process_pool_size=2)
+
+
+async def respond_through_outbound(msg: hikari.GuildMessageCreateEvent, content):
+    OUTBOUND.send(msg.channel_id, content)
+
+
+async def load_guild_configuration(guild_id: hikari.Snowflake) -> GuildConfiguration:
+    async with STATE_STORE.guild_settings(guild_id) as settings:
+        return GuildConfiguration(dict(settings.prefixes), {prefix: dict(aliases) for prefix, aliases in settings.aliases.items()})
+
+
+discord_msg_command_parser = (create_command_parser_builder()
+    .with_execution_pools(EXECUTION_POOLS)
+    .with_metrics(PARSE_METRICS)
+    .with_responder(respond_through_outbound)
+    .with_dependency("state", STATE_STORE)
+    .with_result_cache(RESULT_CACHE)
+    # prefixes and aliases of guilds are resolved on top of the shared commands, without a parser per guild
+    .with_guild_overlays(load_guild_configuration, max_overlays=10000)
     .build())
 
 
+def invalidate_changed_state(state):
+    RESULT_CACHE.invalidate(*state.tags())
+    if isinstance(state, GuildSettings):
+        guild_overlays = discord_msg_command_parser.guild_overlays()
+        guild_overlays.set_configured(state.guild_id, bool(state.prefixes or state.aliases))
+        guild_overlays.invalidate(state.guild_id)
+
+
+STATE_STORE.add_change_listener(invalidate_changed_state)
+
+# the same commands are invoked by slash commands, whose arguments arrive structured and aren't tokenized
+SLASH_GROUPS = SlashCommandGenerator(discord_msg_command_parser).include_in(ACL)
+
+# changed command modules are swapped in without restarting the bot
+COMMAND_MODULE_WATCHER = CommandModuleWatcher(discord_msg_command_parser, COMMANDS_PACKAGE, interval=2.0, available_gateway_data=GATEWAY_PROFILE.gateway_data())
+
+# references to tasks running for the whole life of the bot, so they aren't garbage collected
+BACKGROUND_TASKS: set[asyncio.Task] = set()
+
+# bad input is often sent many times in a row, it is enough to explain the error once
+ERROR_REPLY_THROTTLE = ErrorReplyThrottle(window=10.0, max_replies=3)
+
+
 @BOT.listen(hikari.GuildMessageCreateEvent)
 async def parse_message_command(msg: hikari.GuildMessageCreateEvent):
     if msg.is_bot or not msg.content:
         return 
 
-    try:
-        await discord_msg_command_parser.parse(msg.message.content, msg)
-    except Exception as e:
-        await msg.message.respond(e)
-BOT.run()
\ No newline at end of file
+    if not discord_msg_command_parser.could_match(msg.content, msg.guild_id):
+        PARSE_METRICS.record_outcome(ParseOutcomeKind.NOT_A_COMMAND)
+        return
+
+    outcome = await discord_msg_command_parser.parse_outcome(msg.message.content, msg)
+    if ERROR_REPLY_THROTTLE.should_reply(msg, outcome):
+        OUTBOUND.send(msg.channel_id, outcome.message())
+
+
+@BOT.listen(hikari.StartingEvent)
+async def open_state_store(_: hikari.StartingEvent):
+    # opened before shards connect, so no command can run without it
+    await STATE_STORE.open()
+    # messages of guilds without prefixes or aliases don't load their configuration
+    discord_msg_command_parser.guild_overlays().set_configured_guilds(await STATE_STORE.configured_guild_ids())
+
+
+@BOT.listen(hikari.StartedEvent)
+async def start_workers(_: hikari.StartedEvent):
+    COMMAND_MODULE_WATCHER.start()
+
+
+@BOT.listen(hikari.StoppingEvent)
+async def shutdown_workers(_: hikari.StoppingEvent):
+    COMMAND_MODULE_WATCHER.stop()
+    # waiting for running commands would block the event loop
+    await asyncio.to_thread(EXECUTION_POOLS.shutdown)
+    await STATE_STORE.close()
+    await OUTBOUND.close(timeout=5.0)
+
+
+def run_gateway_worker(worker: WorkerContext):
+    """
+    Runs the bot with a slice of shards in a worker process started by ShardSupervisor.
+    """
+
+    # workers share the database, the first one takes its snapshots for all of them
+    if worker.worker_id != 0:
+        STATE_STORE.disable_snapshots()
+
+    @BOT.listen(hikari.StartedEvent)
+    async def start_metrics_reporting(_: hikari.StartedEvent):
+        BACKGROUND_TASKS.add(asyncio.get_running_loop().create_task(worker.report_metrics_periodically(PARSE_METRICS)))
+
+    BOT.run(shard_ids=worker.shard_ids, shard_count=worker.shard_count)
+
+
+def main(argv: list[str] | None = None):
+    arg_parser = argparse.ArgumentParser(description="Runs the bot, optionally with shards split among several processes.")
+    arg_parser.add_argument("--workers", type=int, default=1, help="worker processes, each of them runs a slice of shards")
+    arg_parser.add_argument("--shards", type=int, default=None, help="total amount of shards (by default the one recommended by discord, at least one per worker)")
+    args = arg_parser.parse_args(argv)
+
+    if args.workers <= 1:
+        if args.shards is None:
+            BOT.run()
+        else:
+            BOT.run(shard_ids=range(args.shards), shard_count=args.shards)
+        return
+
+    # every worker connects its own slice, so the recommended count is fetched once before the workers start
+    shard_count = args.shards
+    if shard_count is None:
+        shard_count = max(asyncio.run(fetch_recommended_shard_count(os.environ["RPGbot"])), args.workers)
+
+    supervisor = ShardSupervisor(run_gateway_worker, shard_count, args.workers)
+    supervisor.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +0,0 @@
-from commands.rpg import *
\ No newline at end of file
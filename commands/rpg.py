@@ -1,9 +1,203 @@
 import hikari
-from common.gateways import *
-from common.models.message_command_parsing import Command
+from common.gateways import BOT_ADMINS, PARSE_METRICS, RESULT_CACHE
+from common.models.message_command_parsing import CacheScope, Command, Cooldown, GatewayData, MAX_GUILD_ALIASES, MAX_GUILD_PREFIXES, TTL
+from common.state_store import StateStore
+from typing import Literal
 
 @Command("!rpg","ping!")
 async def ping(ctx: hikari.GuildMessageCreateEvent):
-    await ctx.message.respond(f'pong!')
+    return 'pong!'
 
 
+@Command("!rpg", "stats")
+async def stats(ctx: hikari.GuildMessageCreateEvent, output: Literal["summary", "prometheus"] = "summary"):
+    if ctx.author_id not in BOT_ADMINS:
+        return "This command is available only for bot administrators"
+
+    if output == "prometheus":
+        # discord messages are limited to 2000 characters
+        return f"```\n{PARSE_METRICS.render_prometheus()[:1900]}\n```"
+
+    return (f"{PARSE_METRICS.render_summary()}\n**Result cache**\n"
+            f"hits: {RESULT_CACHE.hits_count()}, misses: {RESULT_CACHE.misses_count()}, entries: {RESULT_CACHE.entries_count()}")
+
+
+SHOP_PRICES = {"potion": 25, "sword": 150, "shield": 120, "bow": 100}
+
+ITEM_DESCRIPTIONS = {
+    "potion": "Drink it with \"!rpg use potion\" to gain 50 xp",
+    "sword": "Every sword adds 20 damage to your attacks",
+    "shield": "Sturdy shield, bosses will learn to fear it",
+    "bow": "Light bow for adventurers who keep their distance",
+}
+
+
+@Command("!rpg", "item", cache=TTL(60 * 60))
+async def item_info(ctx: hikari.GuildMessageCreateEvent, item: Literal["potion", "sword", "shield", "bow"]):
+    return f"{item.capitalize()} ({SHOP_PRICES[item]} gold): {ITEM_DESCRIPTIONS[item]}"
+
+
+# cached profiles are invalidated whenever the player changes (see StateStore.add_change_listener in bot.py)
+@Command("!rpg", "profile", cache=TTL(60, scope=CacheScope.MEMBER, tags=("player:{guild_id}:{author_id}",)))
+async def profile(ctx: hikari.GuildMessageCreateEvent, state: StateStore):
+    async with state.player(ctx.guild_id, ctx.author_id) as player:
+        items = ", ".join(f"{count}x {item}" for item, count in sorted(player.inventory.items())) or "nothing"
+        return f"Level {player.level} ({player.experience}/{player.level * 100} xp), {player.gold} gold, carrying {items}"
+
+
+# players change all the time, the leaderboard is allowed to be up to a minute old instead of being read every time
+@Command("!rpg", "leaderboard", cache=TTL(60, scope=CacheScope.GUILD))
+async def leaderboard(ctx: hikari.GuildMessageCreateEvent, state: StateStore):
+    top_players = await state.top_players(ctx.guild_id, limit=10)
+    if not top_players:
+        return "Nobody has played yet"
+    return "\n".join(f"{place}. <@{player.player_id}> level {player.level} ({player.experience} xp)" for place, player in enumerate(top_players, 1))
+
+
+@Command("!rpg", "daily", cooldown=Cooldown(rate=1, per=24 * 60 * 60))
+async def daily(ctx: hikari.GuildMessageCreateEvent, state: StateStore):
+    async with state.player(ctx.guild_id, ctx.author_id) as player:
+        player.gold += 100
+        return f"You received 100 gold, you have {player.gold} gold now"
+
+
+@Command("!rpg", "buy")
+async def buy(ctx: hikari.GuildMessageCreateEvent, state: StateStore, item: Literal["potion", "sword", "shield", "bow"], count: int = 1):
+    if count <= 0:
+        return "You have to buy at least one item"
+
+    price = SHOP_PRICES[item] * count
+    async with state.player(ctx.guild_id, ctx.author_id) as player:
+        if player.gold < price:
+            return f"{count}x {item} costs {price} gold, you have only {player.gold} gold"
+        player.gold -= price
+        player.add_item(item, count)
+        return f"You bought {count}x {item} for {price} gold"
+
+
+@Command("!rpg", "use")
+async def use(ctx: hikari.GuildMessageCreateEvent, state: StateStore, item: Literal["potion"]):
+    async with state.player(ctx.guild_id, ctx.author_id) as player:
+        if not player.remove_item(item):
+            return f"You don't have any {item}"
+        leveled_up = player.gain_experience(50)
+        return f"You drank a {item} and gained 50 xp{', you reached a new level' if leveled_up else ''}"
+
+
+@Command("!rpg", "attack")
+async def attack(ctx: hikari.GuildMessageCreateEvent, state: StateStore):
+    # the player is always locked before the world, so two commands can't wait for each other
+    async with state.player(ctx.guild_id, ctx.author_id) as player, state.world(ctx.guild_id) as world:
+        damage = 10 * player.level + 20 * player.inventory.get("sword", 0)
+        boss_name = world.boss_name
+        world.boss_health -= damage
+
+        if world.boss_health > 0:
+            player.gain_experience(10)
+            return f"You hit {boss_name} for {damage} damage, {world.boss_health} health left"
+
+        world.next_boss()
+        player.gold += 500
+        leveled_up = player.gain_experience(200)
+        return f"You defeated {boss_name} and looted 500 gold{', you reached a new level' if leveled_up else ''}! {world.boss_name} appears"
+
+
+# characters which split messages into tokens, so prefixes and aliases containing them could never be matched
+GUILD_NAME_FORBIDDEN_CHARACTERS = frozenset(" ,:;\"()[]{}")
+
+
+# members with any of these permissions can change prefixes and aliases of their guild
+GUILD_SETTINGS_PERMISSIONS = hikari.Permissions.ADMINISTRATOR | hikari.Permissions.MANAGE_GUILD
+
+
+async def _can_change_guild_settings(ctx: hikari.GuildMessageCreateEvent) -> bool:
+    """
+    :return: True if the author is a bot administrator, the owner of the guild or has a role with any of
+        GUILD_SETTINGS_PERMISSIONS (roles include @everyone of the guild)
+    """
+
+    if ctx.author_id in BOT_ADMINS:
+        return True
+
+    member = ctx.member
+    if member is None:
+        return False
+
+    # roles are cached (the commands require them), they are fetched only if the cache doesn't have them yet
+    roles = member.get_roles()
+    if len(roles) < len(member.role_ids):
+        roles = [role for role in await ctx.app.rest.fetch_roles(ctx.guild_id) if role.id in member.role_ids]
+    if any(role.permissions & GUILD_SETTINGS_PERMISSIONS for role in roles):
+        return True
+
+    guild = ctx.get_guild() or await ctx.app.rest.fetch_guild(ctx.guild_id)
+    return guild.owner_id == ctx.author_id
+
+
+def _guild_name_error(name: str, kind: str, max_length: int) -> str | None:
+    if not 0 < len(name) <= max_length:
+        return f"{kind.capitalize()} has to have 1 to {max_length} characters"
+    if any(c.isspace() or c in GUILD_NAME_FORBIDDEN_CHARACTERS for c in name):
+        return f"{kind.capitalize()} can't contain whitespaces nor any of {''.join(sorted(GUILD_NAME_FORBIDDEN_CHARACTERS - {' '}))}"
+    return None
+
+
+# prefixes and aliases of the guild are resolved by the parser, which reloads them after a change (see bot.py)
+@Command("!rpg", "prefix add", requires=GatewayData.ROLES)
+async def add_prefix(ctx: hikari.GuildMessageCreateEvent, state: StateStore, prefix: str):
+    if not await _can_change_guild_settings(ctx):
+        return "Only members who can manage the guild can change its prefixes and aliases"
+    if (error := _guild_name_error(prefix, "prefix", 8)) is not None:
+        return error
+    if prefix == "!rpg":
+        return "!rpg always works"
+
+    async with state.guild_settings(ctx.guild_id) as settings:
+        if prefix not in settings.prefixes and len(settings.prefixes) >= MAX_GUILD_PREFIXES:
+            return f"Guild can have at most {MAX_GUILD_PREFIXES} prefixes"
+        settings.prefixes[prefix] = "!rpg"
+        return f"\"{prefix} profile\" is the same as \"!rpg profile\" now"
+
+
+@Command("!rpg", "prefix remove", requires=GatewayData.ROLES)
+async def remove_prefix(ctx: hikari.GuildMessageCreateEvent, state: StateStore, prefix: str):
+    if not await _can_change_guild_settings(ctx):
+        return "Only members who can manage the guild can change its prefixes and aliases"
+
+    async with state.guild_settings(ctx.guild_id) as settings:
+        if settings.prefixes.pop(prefix, None) is None:
+            return f"There is no prefix \"{prefix}\""
+        return f"Prefix \"{prefix}\" was removed"
+
+
+@Command("!rpg", "alias add", requires=GatewayData.ROLES)
+async def add_alias(ctx: hikari.GuildMessageCreateEvent, state: StateStore, alias: str, command: str):
+    if not await _can_change_guild_settings(ctx):
+        return "Only members who can manage the guild can change its prefixes and aliases"
+    if (error := _guild_name_error(alias, "alias", 32)) is not None:
+        return error
+    if not command.split():
+        return "Alias has to stand for a command"
+
+    alias = alias.lower()
+    async with state.guild_settings(ctx.guild_id) as settings:
+        prefix_aliases = settings.aliases.setdefault("!rpg", {})
+        if alias not in prefix_aliases and settings.aliases_count() >= MAX_GUILD_ALIASES:
+            return f"Guild can have at most {MAX_GUILD_ALIASES} aliases"
+        prefix_aliases[alias] = " ".join(command.split())
+        # registered command names are matched first, so an alias can't hide a command
+        return f"\"!rpg {alias}\" stands for \"!rpg {prefix_aliases[alias]}\" now, unless there is a command named {alias}"
+
+
+@Command("!rpg", "alias remove", requires=GatewayData.ROLES)
+async def remove_alias(ctx: hikari.GuildMessageCreateEvent, state: StateStore, alias: str):
+    if not await _can_change_guild_settings(ctx):
+        return "Only members who can manage the guild can change its prefixes and aliases"
+
+    async with state.guild_settings(ctx.guild_id) as settings:
+        prefix_aliases = settings.aliases.get("!rpg", {})
+        if prefix_aliases.pop(alias.lower(), None) is None:
+            return f"There is no alias \"{alias}\""
+        if not prefix_aliases:
+            del settings.aliases["!rpg"]
+        return f"Alias \"{alias}\" was removed"
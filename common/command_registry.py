@@ -0,0 +1,36 @@
+import os
+
+from common.models.message_command_parsing import Command, CommandManifest, CommandParserBuilder, CommandScheduler, LazyCommand, StringConverter, CREATED_COMMANDS
+
+COMMANDS_PACKAGE = "commands"
+COMMAND_MANIFEST_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), COMMANDS_PACKAGE, "manifest.json")
+
+
+def registered_commands() -> list[Command | LazyCommand]:
+    """
+    All commands of the bot. Commands are loaded from the manifest if it is up to date, otherwise all command
+    modules are imported.
+    """
+
+    command_manifest = CommandManifest.load_if_up_to_date(COMMAND_MANIFEST_PATH, COMMANDS_PACKAGE)
+    if command_manifest is not None:
+        # command modules are imported when their commands are invoked for the first time
+        return command_manifest.lazy_commands()
+
+    # there is no manifest or command modules were changed after it was generated
+    module_names = set(CommandManifest.import_package_modules(COMMANDS_PACKAGE))
+    return [command for command in CREATED_COMMANDS if command.module_name() in module_names]
+
+
+def create_command_parser_builder() -> CommandParserBuilder:
+    """
+    Builder of the message command parser with all commands of the bot registered, every process running
+    the bot (or a part of its shards) builds its parser from here, so all of them have the same commands.
+    """
+
+    return (CommandParserBuilder()
+        .with_string_converter(StringConverter())
+        .with_scheduler(CommandScheduler(max_concurrency=32, max_pending_per_guild=64, max_pending_per_user=4))
+        # players chain actions, e.g. "!rpg buy potion; use potion; attack"
+        .with_pipelines(";", max_length=10)
+        .with_commands(registered_commands()))
@@ -0,0 +1,172 @@
+"""
+Offline stand-in for the discord gateway, runs the sharded bot runner without discord token or network.
+
+Run from the repository root:
+    python -m common.fake_gateway --workers 4 --shards 8 --duration 10
+    python -m common.fake_gateway --workers 2 --shards 4 --duration 10 --crash-worker 1 --crash-after 2
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from functools import partial
+from typing import AsyncIterator
+
+from common.models.message_command_parsing import ParseMetrics, ParseOutcomeKind
+from common.sharding import ShardSupervisor, WorkerContext, shard_of_guild
+
+FAKE_MESSAGES = [
+    "!rpg ping!", "!rpg stats", "!rpg stats output: prometheus", "!rpg pnig!", "!rpg stats [summary",
+    "!rpg profile", "!rpg daily", "!rpg attack", "!rpg buy potion 2",
+    "hey anyone up for a raid tonight?", "gg wp", "brb need to grab food", "who has the key for dungeon 3",
+]
+
+
+class FakeMessage:
+    __slots__ = ("content", "responses")
+
+    content: str
+
+    # amount of responses, nothing is sent anywhere
+    responses: int
+
+    def __init__(self, content: str):
+        self.content = content
+        self.responses = 0
+
+    async def respond(self, content):
+        self.responses += 1
+
+
+class FakeGuildMessageEvent:
+    """
+    Stands in for hikari.GuildMessageCreateEvent, only attributes used by the bot are provided.
+    """
+
+    __slots__ = ("guild_id", "channel_id", "author_id", "is_bot", "message", "member")
+
+    def __init__(self, guild_id: int, channel_id: int, author_id: int, content: str):
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.author_id = author_id
+        self.is_bot = False
+        self.message = FakeMessage(content)
+
+        # fake authors aren't members of any guild, so they have no permissions
+        self.member = None
+
+    @property
+    def content(self) -> str:
+        return self.message.content
+
+
+class FakeGateway:
+    """
+    Generates guild message events of guilds belonging to the given shards.
+
+    Guild ids are made so that guilds are spread over all shards evenly, the same way as discord spreads them.
+    """
+
+    _guild_ids: list[int]
+    _messages_per_second: float
+    _rng: random.Random
+
+    def __init__(self, shard_ids: list[int], shard_count: int, guilds_count: int = 1000, messages_per_second: float = 0.0, seed: int | None = None):
+        shard_ids = set(shard_ids)
+        self._guild_ids = [guild_i << 22 for guild_i in range(guilds_count) if shard_of_guild(guild_i << 22, shard_count) in shard_ids]
+        self._messages_per_second = messages_per_second
+        self._rng = random.Random(seed)
+
+    async def events(self, duration: float) -> AsyncIterator[FakeGuildMessageEvent]:
+        """
+        Yields events for duration seconds, as fast as they are consumed if messages_per_second is 0.
+        """
+
+        start = time.monotonic()
+        events_count = 0
+        while (elapsed := time.monotonic() - start) < duration:
+            if self._messages_per_second:
+                ahead = events_count / self._messages_per_second - elapsed
+                if ahead > 0:
+                    await asyncio.sleep(ahead)
+
+            guild_id = self._rng.choice(self._guild_ids)
+            yield FakeGuildMessageEvent(guild_id, guild_id + self._rng.randrange(5), self._rng.randrange(1, 500), self._rng.choice(FAKE_MESSAGES))
+            events_count += 1
+
+            # lets tasks of handled events run, the real gateway yields on every received payload as well
+            if events_count % 64 == 0:
+                await asyncio.sleep(0)
+
+
+def run_fake_worker(worker: WorkerContext, duration: float, messages_per_second: float, crash_worker: int | None = None, crash_after: float = 0.0):
+    asyncio.run(_run_fake_worker(worker, duration, messages_per_second, crash_worker, crash_after))
+
+
+async def _run_fake_worker(worker: WorkerContext, duration: float, messages_per_second: float, crash_worker: int | None, crash_after: float):
+    # imported here, so command modules are imported only by workers
+    from common.command_registry import create_command_parser_builder
+    from common.state_store import StateStore
+
+    # states don't outlive the worker, nothing is written to disk
+    state_store = StateStore(":memory:")
+    await state_store.open()
+
+    metrics = ParseMetrics()
+    parser = create_command_parser_builder().with_metrics(metrics).with_dependency("state", state_store).build()
+    gateway = FakeGateway(worker.shard_ids, worker.shard_count, messages_per_second=messages_per_second, seed=worker.worker_id)
+
+    reporter = asyncio.get_running_loop().create_task(worker.report_metrics_periodically(metrics))
+    handlers: set[asyncio.Task] = set()
+    start = time.monotonic()
+
+    async for event in gateway.events(duration):
+        # crash is simulated only in the first process of the worker, so the restarted one keeps running
+        if worker.worker_id == crash_worker and worker.incarnation == 0 and time.monotonic() - start > crash_after:
+            worker.report_metrics(metrics)
+            os._exit(1)
+
+        if not parser.could_match(event.content):
+            metrics.record_outcome(ParseOutcomeKind.NOT_A_COMMAND)
+            continue
+
+        handler = asyncio.get_running_loop().create_task(parser.parse_outcome(event.content, event))
+        handlers.add(handler)
+        handler.add_done_callback(handlers.discard)
+
+    await asyncio.gather(*handlers)
+    await state_store.close()
+    reporter.cancel()
+    worker.report_metrics(metrics)
+
+
+def main(argv: list[str] | None = None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--workers", type=int, default=2, help="worker processes")
+    arg_parser.add_argument("--shards", type=int, default=4, help="shards split among the workers")
+    arg_parser.add_argument("--duration", type=float, default=10.0, help="seconds every worker receives events")
+    arg_parser.add_argument("--rate", type=float, default=0.0, help="messages per second of every worker, 0 means as fast as possible")
+    arg_parser.add_argument("--crash-worker", type=int, default=None, help="id of a worker which crashes once")
+    arg_parser.add_argument("--crash-after", type=float, default=2.0, help="seconds after which the worker crashes")
+    args = arg_parser.parse_args(argv)
+
+    worker_entry = partial(run_fake_worker, duration=args.duration, messages_per_second=args.rate, crash_worker=args.crash_worker, crash_after=args.crash_after)
+    supervisor = ShardSupervisor(worker_entry, args.shards, args.workers, report_interval=1.0)
+
+    start = time.monotonic()
+    supervisor.run()
+    elapsed = time.monotonic() - start
+
+    total = 0
+    for worker_id, metrics in supervisor.worker_metrics().items():
+        handled = sum(metrics.outcome_counts().values())
+        total += handled
+        print(f"worker {worker_id} shards {supervisor.shard_slices()[worker_id]}: {handled} messages, {supervisor.restart_counts().get(worker_id, 0)} restarts")
+
+    print(f"{total} messages in {elapsed:.1f}s ({total / elapsed:.0f} msg/s)")
+    print(supervisor.merged_metrics().render_summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+from typing import Iterable
+
+import hikari
+import hikari.impl
+
+from common.models.message_command_parsing import Command, GatewayData, LazyCommand
+
+# intents and cache components needed by the bot itself, whatever commands are registered
+# (the cached user of the bot is used by hikari, guilds are needed for guild events to be sent at all)
+BASE_INTENTS = hikari.Intents.GUILDS
+BASE_CACHE_COMPONENTS = hikari.api.CacheComponents.ME
+
+# gateway data -> intents which make discord send it and cache components which keep it
+_GATEWAY_DATA_REQUIREMENTS: dict[GatewayData, tuple[hikari.Intents, hikari.api.CacheComponents]] = {
+    GatewayData.MESSAGE_CONTENT: (hikari.Intents.GUILD_MESSAGES | hikari.Intents.MESSAGE_CONTENT, hikari.api.CacheComponents.NONE),
+    GatewayData.MEMBERS: (hikari.Intents.GUILD_MEMBERS, hikari.api.CacheComponents.MEMBERS),
+    GatewayData.ROLES: (hikari.Intents.NONE, hikari.api.CacheComponents.ROLES),
+    GatewayData.CHANNELS: (hikari.Intents.NONE, hikari.api.CacheComponents.GUILD_CHANNELS | hikari.api.CacheComponents.GUILD_THREADS),
+    GatewayData.MESSAGE_HISTORY: (hikari.Intents.GUILD_MESSAGES, hikari.api.CacheComponents.MESSAGES),
+    GatewayData.REACTIONS: (hikari.Intents.GUILD_MESSAGE_REACTIONS, hikari.api.CacheComponents.NONE),
+    GatewayData.PRESENCES: (hikari.Intents.GUILD_PRESENCES, hikari.api.CacheComponents.PRESENCES),
+    GatewayData.VOICE_STATES: (hikari.Intents.GUILD_VOICE_STATES, hikari.api.CacheComponents.VOICE_STATES),
+    GatewayData.EMOJIS: (hikari.Intents.GUILD_EMOJIS, hikari.api.CacheComponents.EMOJIS | hikari.api.CacheComponents.GUILD_STICKERS),
+}
+
+
+class GatewayProfile:
+    """
+    Intents and cache settings of the bot derived from gateway data needed by its commands, so discord doesn't send
+    and hikari doesn't decode or cache events which no command uses.
+
+    Intents can't be changed without reconnecting, so commands added later (e.g. by hot reload) get only the data
+    of the profile the bot was started with.
+    """
+
+    _gateway_data: GatewayData
+
+    def __init__(self, gateway_data: GatewayData):
+        self._gateway_data = gateway_data
+
+    @staticmethod
+    def from_commands(commands: Iterable[Command | LazyCommand]) -> "GatewayProfile":
+        gateway_data = GatewayData.NONE
+        for command in commands:
+            gateway_data |= command.required_gateway_data()
+        return GatewayProfile(gateway_data)
+
+    def provides(self, gateway_data: GatewayData) -> bool:
+        return gateway_data & self._gateway_data == gateway_data
+
+    #----- Profile Properties ------#
+
+    def gateway_data(self) -> GatewayData:
+        return self._gateway_data
+
+    def intents(self) -> hikari.Intents:
+        intents = BASE_INTENTS
+        for gateway_data, (data_intents, _) in _GATEWAY_DATA_REQUIREMENTS.items():
+            if gateway_data in self._gateway_data:
+                intents |= data_intents
+        return intents
+
+    def cache_components(self) -> hikari.api.CacheComponents:
+        cache_components = BASE_CACHE_COMPONENTS
+        for gateway_data, (_, data_cache_components) in _GATEWAY_DATA_REQUIREMENTS.items():
+            if gateway_data in self._gateway_data:
+                cache_components |= data_cache_components
+        return cache_components
+
+    def cache_settings(self) -> hikari.impl.CacheSettings:
+        cache_components = self.cache_components()
+        return hikari.impl.CacheSettings(
+            components=cache_components,
+            max_messages=300 if cache_components & hikari.api.CacheComponents.MESSAGES else 0,
+        )
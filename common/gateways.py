@@ -1,10 +1,79 @@
-import hikari
-import miru
-import arc
 import os
+from common.models.message_command_parsing.metrics import ParseMetrics
+from common.models.message_command_parsing.result_cache import ResultCache
 
-BOT = hikari.GatewayBot(os.environ["RPGbot"], intents=hikari.Intents.ALL)
-MCL = miru.Client(BOT)
 REGISTRED_GUILDS = [866366097242325012]
-ACL = arc.GatewayClient(BOT, default_enabled_guilds=REGISTRED_GUILDS)
-client = arc.GatewayClient(BOT)
\ No newline at end of file
+
+# users allowed to use administrative commands (e.g. "!rpg stats") and to change settings of any guild, ids of
+# the users are read from the environment the same way as the token, e.g. RPGbot_ADMINS="123456789,987654321"
+BOT_ADMINS: frozenset[int] = frozenset(int(user_id) for user_id in os.environ.get("RPGbot_ADMINS", "").replace(",", " ").split())
+
+PARSE_METRICS = ParseMetrics()
+
+# values of commands declared with cache=TTL(...), entries computed from player and world states are invalidated
+# when the states change
+RESULT_CACHE = ResultCache(max_entries=10000)
+
+
+# clients are constructed when they are accessed for the first time (see __getattr__), so importing this module is cheap
+# and clients which aren't used by anything are never constructed
+
+def _create_gateway_profile():
+    # intents and caches are derived from commands of the bot, so events no command uses aren't received nor cached
+    from common.command_registry import registered_commands
+    from common.gateway_profile import GatewayProfile
+    return GatewayProfile.from_commands(registered_commands())
+
+def _create_bot():
+    import hikari
+    gateway_profile = __getattr__("GATEWAY_PROFILE")
+    return hikari.GatewayBot(os.environ["RPGbot"], intents=gateway_profile.intents(), cache_settings=gateway_profile.cache_settings())
+
+def _create_miru_client():
+    import miru
+    return miru.Client(__getattr__("BOT"))
+
+def _create_guild_arc_client():
+    import arc
+    return arc.GatewayClient(__getattr__("BOT"), default_enabled_guilds=REGISTRED_GUILDS)
+
+def _create_arc_client():
+    import arc
+    return arc.GatewayClient(__getattr__("BOT"))
+
+def _create_outbound():
+    # replies are queued per channel and coalesced instead of being sent one REST request each
+    from common.outbound import HikariTransport, OutboundMessenger
+    return OutboundMessenger(HikariTransport(__getattr__("BOT").rest))
+
+def _create_state_store():
+    # states of players are kept in memory and written behind into SQLite
+    from common.state_store import StateStore
+    return StateStore(
+        os.environ.get("RPG_STATE_DB", "rpg_state.sqlite3"),
+        snapshot_interval=15 * 60,
+        snapshot_dir=os.environ.get("RPG_STATE_SNAPSHOTS", "state_snapshots"),
+    )
+
+_GATEWAY_FACTORIES = {
+    "GATEWAY_PROFILE": _create_gateway_profile,
+    "BOT": _create_bot,
+    "MCL": _create_miru_client,
+    "ACL": _create_guild_arc_client,
+    "client": _create_arc_client,
+    "OUTBOUND": _create_outbound,
+    "STATE_STORE": _create_state_store,
+}
+
+def __getattr__(name: str):
+    if name in globals():
+        return globals()[name]
+
+    factory = _GATEWAY_FACTORIES.get(name)
+    if factory is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    # constructed client is stored as a module attribute, so this function isn't called for it again
+    gateway = factory()
+    globals()[name] = gateway
+    return gateway
@@ -1,3 +1,14 @@
 from common.models.message_command_parsing.command import *
+from common.models.message_command_parsing.gateway_data import *
 from common.models.message_command_parsing.command_parser import *
-from common.models.message_command_parsing.string_object_parsing import *
\ No newline at end of file
+from common.models.message_command_parsing.string_object_parsing import *
+from common.models.message_command_parsing.command_index import *
+from common.models.message_command_parsing.command_manifest import *
+from common.models.message_command_parsing.command_reloading import *
+from common.models.message_command_parsing.scheduling import *
+from common.models.message_command_parsing.result_cache import *
+from common.models.message_command_parsing.guild_overlays import *
+from common.models.message_command_parsing.execution import *
+from common.models.message_command_parsing.metrics import *
+from common.models.message_command_parsing.parse_outcome import *
+from common.models.message_command_parsing.error_replies import *
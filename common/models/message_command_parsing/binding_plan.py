@@ -0,0 +1,261 @@
+from enum import Enum
+from types import MappingProxyType, UnionType
+from typing import Any, Callable, Collection, Literal, Mapping, Union, get_args, get_origin
+import inspect
+
+from common.models.message_command_parsing.exceptions import *
+from common.models.message_command_parsing.parse_outcome import ParseOutcome, ParseOutcomeKind, classify_parse_error
+
+
+class ArgumentSlot:
+    """
+    Single parameter of a command which is filled from the command string.
+    """
+
+    __slots__ = ("name", "index", "annotation", "has_default", "default", "converter")
+
+    name: str
+    index: int
+    annotation: type
+    has_default: bool
+    default: Any
+
+    # converts raw argument into the annotated type, None until the plan is resolved by a parser
+    converter: Callable[[str], Any] | None
+
+    def __init__(self, name: str, index: int, annotation: type, has_default: bool, default: Any, converter: Callable[[str], Any] | None = None):
+        self.name = name
+        self.index = index
+        self.annotation = annotation
+        self.has_default = has_default
+        self.default = default
+        self.converter = converter
+
+    def with_converter(self, converter: Callable[[str], Any]) -> "ArgumentSlot":
+        return ArgumentSlot(self.name, self.index, self.annotation, self.has_default, self.default, converter)
+
+
+class ParameterKind(Enum):
+    BOOLEAN = "boolean"
+    INTEGER = "integer"
+    NUMBER = "number"
+    # one of the listed choices, values of literals or lowercased names of enum members
+    CHOICE = "choice"
+    LIST = "list"
+    MAPPING = "mapping"
+    TEXT = "text"
+    # other types (e.g. unions or ones with conversions added by users) are converted from the text as it is typed
+    OTHER = "other"
+
+
+class ParameterDescription:
+    """
+    What kind of value a parameter takes, stored in the command manifest, so the parameters are known (e.g. for slash
+    command options) without importing the module of the command.
+    """
+
+    __slots__ = ("name", "kind", "required", "choices", "type_name")
+
+    name: str
+    kind: ParameterKind
+    required: bool
+
+    # values of CHOICE parameters, None for other kinds
+    choices: list[str | int] | None
+
+    # name of the annotated type, used to describe OTHER parameters
+    type_name: str
+
+    def __init__(self, name: str, kind: ParameterKind, required: bool, choices: list[str | int] | None = None, type_name: str = ""):
+        self.name = name
+        self.kind = kind
+        self.required = required
+        self.choices = choices
+        self.type_name = type_name
+
+    @staticmethod
+    def from_slot(slot: ArgumentSlot) -> "ParameterDescription":
+        annotation = slot.annotation
+        origin = get_origin(annotation)
+        required = not slot.has_default
+
+        # optional parameters are simply left out, so they are described by their other type
+        if origin is Union or origin is UnionType:
+            type_args = [type_arg for type_arg in get_args(annotation) if type_arg is not type(None)]
+            if len(type_args) == 1:
+                annotation = type_args[0]
+                origin = get_origin(annotation)
+
+        if annotation is bool:
+            return ParameterDescription(slot.name, ParameterKind.BOOLEAN, required)
+        if annotation is int:
+            return ParameterDescription(slot.name, ParameterKind.INTEGER, required)
+        if annotation is float:
+            return ParameterDescription(slot.name, ParameterKind.NUMBER, required)
+        if origin is Literal:
+            return ParameterDescription(slot.name, ParameterKind.CHOICE, required, [value if type(value) is int else str(value) for value in get_args(annotation)])
+        if isinstance(annotation, type) and issubclass(annotation, Enum):
+            return ParameterDescription(slot.name, ParameterKind.CHOICE, required, [member.name.lower() for member in annotation])
+        if annotation in (list, tuple) or origin in (list, tuple):
+            return ParameterDescription(slot.name, ParameterKind.LIST, required)
+        if annotation is dict or origin is dict:
+            return ParameterDescription(slot.name, ParameterKind.MAPPING, required)
+        if annotation is str or annotation is Any:
+            return ParameterDescription(slot.name, ParameterKind.TEXT, required)
+        return ParameterDescription(slot.name, ParameterKind.OTHER, required, type_name=getattr(annotation, "__name__", str(annotation)))
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"name": self.name, "kind": self.kind.value, "required": self.required, "choices": self.choices, "type_name": self.type_name}
+
+    @staticmethod
+    def from_dict(description: dict[str, Any]) -> "ParameterDescription":
+        return ParameterDescription(description["name"], ParameterKind(description["kind"]), description["required"], description["choices"], description["type_name"])
+
+
+class BindingPlan:
+    """
+    Immutable description of how raw arguments are bound to parameters of a command.
+
+    It is computed once from the function signature, so binding arguments on every invocation
+    doesn't need to copy or rebuild any information about the command.
+    """
+
+    __slots__ = ("_slots", "_keyword_slots", "_required_count")
+
+    # parameters in positional order, context parameter is not included
+    _slots: tuple[ArgumentSlot, ...]
+    _keyword_slots: Mapping[str, int]
+    _required_count: int
+
+    def __init__(self, slots: tuple[ArgumentSlot, ...]):
+        self._slots = slots
+        self._keyword_slots = MappingProxyType({slot.name: slot.index for slot in slots})
+        self._required_count = sum(1 for slot in slots if not slot.has_default)
+
+    @staticmethod
+    def from_signature(func_sig: inspect.Signature, context_arg_name: str) -> "BindingPlan":
+        slots: list[ArgumentSlot] = []
+
+        for param_name, param in func_sig.parameters.items():
+            if param_name == context_arg_name:
+                continue
+
+            # parameters without type annotations are considered as of string types
+            annotation = str if param.annotation is inspect.Parameter.empty else param.annotation
+            has_default = param.default is not inspect.Parameter.empty
+
+            slots.append(ArgumentSlot(param_name, len(slots), annotation, has_default, param.default if has_default else None))
+
+        return BindingPlan(tuple(slots))
+
+    def without_parameters(self, param_names: Collection[str]) -> "BindingPlan":
+        """
+        :return: copy of this plan without slots of the given parameters, e.g. the ones filled by dependency injection
+        """
+
+        slots = [slot for slot in self._slots if slot.name not in param_names]
+        return BindingPlan(tuple(
+            ArgumentSlot(slot.name, index, slot.annotation, slot.has_default, slot.default, slot.converter) for index, slot in enumerate(slots)
+        ))
+
+    def with_converters(self, string_converter) -> "BindingPlan":
+        """
+        :return: copy of this plan with converters of the given StringConverter resolved for every slot
+        :raises TypeError: if the converter doesn't support type of one of the slots
+        """
+
+        return BindingPlan(tuple(slot.with_converter(string_converter.compile(slot.annotation)) for slot in self._slots))
+
+    def bind(self, positional_arguments: list[str | list[str]], keyword_arguments: list[tuple[str, str | list[str]]]) -> dict[str, Any]:
+        """
+        Maps raw arguments onto parameters, converts them and fills missing ones with defaults.
+
+        :raises RedundantArgumentError: if there are more positional arguments than parameters
+        :raises UnknownArgumentError: if a keyword argument doesn't name any parameter
+        :raises DuplicateArgumentError: if a parameter was given more than once
+        :raises MissingArgumentError: if a parameter without default value wasn't given
+        """
+
+        command_args, failure = self.try_bind(positional_arguments, keyword_arguments)
+        if failure is not None:
+            failure.raise_for_error()
+        return command_args
+
+    def try_bind(self, positional_arguments: list[str | list[str]], keyword_arguments: list[tuple[str, str | list[str]]], argument_offset: Callable[[int], int] | None = None) -> tuple[dict[str, Any] | None, ParseOutcome | None]:
+        """
+        The same as bind, but failures are returned instead of raised.
+
+        :param argument_offset: gives offset of an argument in the command string by the index of the argument
+            (positional arguments are followed by values of keyword arguments), it is called only if binding fails
+            and the position of a redundant argument or argument which couldn't be converted is the offset then
+        :return: (bound arguments, None) or (None, outcome describing the failure)
+        """
+
+        slots = self._slots
+        slots_count = len(slots)
+
+        if len(positional_arguments) > slots_count:
+            redundant_argument = (slots_count + 1, positional_arguments[slots_count])
+            return None, ParseOutcome(ParseOutcomeKind.REDUNDANT_ARGUMENT, position=-1 if argument_offset is None else argument_offset(slots_count),
+                                      error_factory=lambda: RedundantArgumentError(redundant_argument))
+
+        values: list[Any] = list(positional_arguments)
+        values.extend([_UNBOUND] * (slots_count - len(values)))
+
+        for arg_name, arg_value in keyword_arguments:
+            slot_index = self._keyword_slots.get(arg_name)
+            if slot_index is None:
+                return None, ParseOutcome(ParseOutcomeKind.INVALID_ARGUMENT, error_factory=lambda: UnknownArgumentError(arg_name))
+            if values[slot_index] is not _UNBOUND:
+                return None, ParseOutcome(ParseOutcomeKind.INVALID_ARGUMENT, error_factory=lambda: DuplicateArgumentError(arg_name))
+            values[slot_index] = arg_value
+
+        command_args: dict[str, Any] = {}
+        for slot_index in range(slots_count):
+            slot = slots[slot_index]
+            value = values[slot_index]
+
+            if value is _UNBOUND:
+                if not slot.has_default:
+                    return None, ParseOutcome(ParseOutcomeKind.MISSING_ARGUMENT, error_factory=lambda: MissingArgumentError(slot.name))
+                command_args[slot.name] = slot.default
+            else:
+                # converters are user extensible, so their failures can only be caught
+                try:
+                    command_args[slot.name] = slot.converter(value)
+                except Exception as e:
+                    failure = ParseOutcome.from_error(e, classify_parse_error(e, "conversion"))
+                    if argument_offset is not None:
+                        failure.position = argument_offset(self._argument_index(slot_index, positional_arguments, keyword_arguments))
+                    return None, failure
+
+        return command_args, None
+
+    def _argument_index(self, slot_index: int, positional_arguments: list[str | list[str]], keyword_arguments: list[tuple[str, str | list[str]]]) -> int:
+        """
+        :return: index of the argument which filled the slot, in the order expected by argument_offset of try_bind
+        """
+
+        if slot_index < len(positional_arguments):
+            return slot_index
+
+        slot_name = self._slots[slot_index].name
+        for keyword_index, (arg_name, _) in enumerate(keyword_arguments):
+            if arg_name == slot_name:
+                return len(positional_arguments) + keyword_index
+        return -1
+
+    #----- Plan Properties ------#
+
+    def slots(self) -> tuple[ArgumentSlot, ...]:
+        return self._slots
+
+    def keyword_slots(self) -> Mapping[str, int]:
+        return self._keyword_slots
+
+    def required_count(self) -> int:
+        return self._required_count
+
+
+# marks slots which didn't receive any argument, None can't be used because it may be a legitimate value
+_UNBOUND = object()
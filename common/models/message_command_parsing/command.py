@@ -3,6 +3,12 @@ from typing import Callable, get_type_hints, Any
 from types import FunctionType
 import inspect
 
+from common.models.message_command_parsing.binding_plan import BindingPlan
+from common.models.message_command_parsing.scheduling import Cooldown
+from common.models.message_command_parsing.result_cache import TTL, CONTEXT_TAG_FIELDS
+from common.models.message_command_parsing.execution import ExecutionMode
+from common.models.message_command_parsing.gateway_data import GatewayData, MESSAGE_COMMAND_GATEWAY_DATA
+
 
 class Command:
     _prefix: str
@@ -11,6 +17,7 @@ class Command:
     _is_async: bool
 
     _context_arg_name: str
+    _takes_context: bool
 
     _args_info: dict[str, type]
     _required_params: tuple[str]
@@ -20,10 +27,31 @@ class Command:
     _not_required_params_len: int
     _function_defaults: dict[str, Any]
 
-    def __init__(self, prefix: str, name: str, context_arg_name: str = "ctx"):
+    _signature: inspect.Signature
+    _binding_plan: BindingPlan
+
+    _cooldown: Cooldown | None
+    _execution_mode: ExecutionMode
+
+    # caching of returned values, None if the command is invoked every time
+    _cache: TTL | None
+
+    # gateway data the command reads besides the content of the message which invoked it
+    _requires: GatewayData
+
+    # parameter whose value identifies what the command changes, commands of a pipeline with the same target run
+    # in order, None if the command changes only the author of the message
+    _target: str | None
+
+    def __init__(self, prefix: str, name: str, context_arg_name: str = "ctx", cooldown: Cooldown | None = None, execution: ExecutionMode = ExecutionMode.INLINE, requires: GatewayData = GatewayData.NONE, target: str | None = None, cache: TTL | None = None):
         self._prefix = prefix
         self._name = name
         self._context_arg_name = context_arg_name
+        self._cooldown = cooldown
+        self._execution_mode = execution
+        self._requires = requires
+        self._target = target
+        self._cache = cache
 
         self._args_info = {}
 
@@ -62,15 +90,34 @@ class Command:
         self._required_params = tuple(self._required_params)
         self._not_required_params = tuple(self._not_required_params)
 
-        self._is_async = inspect.isawaitable(func)
+        self._signature = func_sig
+        self._binding_plan = BindingPlan.from_signature(func_sig, self._context_arg_name)
+
+        self._is_async = inspect.iscoroutinefunction(func)
+        self._takes_context = self._context_arg_name in func_sig.parameters
+
+        if self._target is not None and (self._target not in func_sig.parameters or self._target == self._context_arg_name):
+            raise ValueError(f"Target of command \"{self._name}\" has to be one of its parameters, \"{self._target}\" isn't")
+
+        if self._cache is not None and (unknown_fields := self._cache.tag_fields() - set(func_sig.parameters) - set(CONTEXT_TAG_FIELDS)):
+            raise ValueError(f"Cache tags of command \"{self._name}\" use unknown fields: {', '.join(sorted(unknown_fields))}")
+
+        if self._execution_mode is not ExecutionMode.INLINE and self._is_async:
+            raise ValueError(f"Command \"{self._name}\" runs in a pool, so it has to be a plain function")
+
+        # execution context (e.g. discord event) can't be sent to another process
+        if self._execution_mode is ExecutionMode.PROCESS and self._takes_context:
+            raise ValueError(f"Command \"{self._name}\" runs in a process pool, so it can't take \"{self._context_arg_name}\" parameter")
 
         return self
 
     def invoke(self, **kwargs):
-        self._func(**kwargs)
+        return self._func(**kwargs)
 
     async def invoke_async(self, **kwargs):
-        await self._func(**kwargs)
+        if self._is_async:
+            return await self._func(**kwargs)
+        return self._func(**kwargs)
 
     #----- Command Properties ------#
 
@@ -86,12 +133,42 @@ class Command:
     def context_arg_name(self):
         return self._context_arg_name
 
+    def takes_context(self) -> bool:
+        return self._takes_context
+
+    def execution_mode(self) -> ExecutionMode:
+        return self._execution_mode
+
+    def module_name(self) -> str:
+        return self._func.__module__
+
+    def attribute_name(self) -> str:
+        return self._func.__qualname__
+
     def get_args_info(self) -> dict[str, type]:
         return self._args_info
 
     def get_parameter_default_value(self, param_name: str) -> Any | None:
         return self._function_defaults.get(param_name)
 
+    def cooldown(self) -> Cooldown | None:
+        return self._cooldown
+
+    def target(self) -> str | None:
+        return self._target
+
+    def cache(self) -> TTL | None:
+        return self._cache
+
+    def required_gateway_data(self) -> GatewayData:
+        return self._requires | MESSAGE_COMMAND_GATEWAY_DATA
+
+    def signature(self) -> inspect.Signature:
+        return self._signature
+
+    def binding_plan(self) -> BindingPlan:
+        return self._binding_plan
+
     def get_required_params_count(self) -> int:
         return self._required_params_len
 
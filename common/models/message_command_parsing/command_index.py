@@ -0,0 +1,129 @@
+from common.models.message_command_parsing.command import Command
+from common.models.message_command_parsing.exceptions import AmbiguousCommandError
+
+
+class CommandTrieNode:
+    __slots__ = ("children", "command")
+
+    # next words of the command name, keys are already case folded if the index is case insensitive
+    children: dict[str, "CommandTrieNode"]
+
+    # command whose name ends at this node, None if this node is only a part of longer names
+    command: Command | None
+
+    def __init__(self):
+        self.children = {}
+        self.command = None
+
+
+class CommandTrie:
+    """
+    Multi-word command name index for a single prefix.
+
+    Command names are split into words once (when inserted), so a lookup is a single walk over message tokens
+    instead of rebuilding and comparing every possible name.
+    """
+
+    _root: CommandTrieNode
+    _case_sensitive: bool
+    _commands_count: int
+
+    def __init__(self, case_sensitive: bool):
+        self._root = CommandTrieNode()
+        self._case_sensitive = case_sensitive
+        self._commands_count = 0
+
+    def insert(self, command: Command):
+        """
+        :raises AmbiguousCommandError: if there is already a command with the same name in this trie
+        """
+
+        node = self._root
+        for word in self._split_name(command.name()):
+            next_node = node.children.get(word)
+            if next_node is None:
+                next_node = CommandTrieNode()
+                node.children[word] = next_node
+            node = next_node
+
+        if node.command is not None:
+            raise AmbiguousCommandError(command.name() if self._case_sensitive else command.name().lower())
+
+        node.command = command
+        self._commands_count += 1
+
+    def find(self, tokens: list[str]) -> tuple[Command | None, int]:
+        """
+        Finds the command with the longest name matching the beginning of tokens.
+
+        :return: found command (or None) and count of tokens consumed by its name
+        """
+
+        node = self._root
+        best_command: Command | None = None
+        best_len: int = 0
+
+        tokens_i = 0
+        tokens_len = len(tokens)
+        while tokens_i < tokens_len:
+            word = tokens[tokens_i] if self._case_sensitive else tokens[tokens_i].lower()
+            node = node.children.get(word)
+            if node is None:
+                break
+
+            tokens_i += 1
+            if node.command is not None:
+                best_command = node.command
+                best_len = tokens_i
+
+        return best_command, best_len
+
+    def get(self, name: str) -> Command | None:
+        """
+        :return: command with exactly this name, None if there is no such command
+        """
+
+        node = self._root
+        for word in self._split_name(name):
+            node = node.children.get(word)
+            if node is None:
+                return None
+        return node.command
+
+    def remove(self, command: Command) -> bool:
+        """
+        Removes the command and nodes which aren't part of any other name.
+
+        :return: False if the command wasn't in this trie
+        """
+
+        path: list[tuple[CommandTrieNode, str]] = []
+        node = self._root
+        for word in self._split_name(command.name()):
+            next_node = node.children.get(word)
+            if next_node is None:
+                return False
+            path.append((node, word))
+            node = next_node
+
+        if node.command is not command:
+            return False
+
+        node.command = None
+        self._commands_count -= 1
+
+        for parent, word in reversed(path):
+            child = parent.children[word]
+            if child.command is not None or child.children:
+                break
+            del parent.children[word]
+
+        return True
+
+    def _split_name(self, name: str) -> list[str]:
+        if not self._case_sensitive:
+            name = name.lower()
+        return name.split()
+
+    def __len__(self):
+        return self._commands_count
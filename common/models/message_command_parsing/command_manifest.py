@@ -0,0 +1,222 @@
+import hashlib
+import importlib
+import importlib.util
+import json
+import os
+import pkgutil
+
+from common.models.message_command_parsing.binding_plan import ParameterDescription
+from common.models.message_command_parsing.command import Command, CREATED_COMMANDS
+from common.models.message_command_parsing.exceptions import StaleManifestError
+from common.models.message_command_parsing.gateway_data import GatewayData
+
+MANIFEST_VERSION = 3
+
+
+class CommandManifestEntry:
+    __slots__ = ("prefix", "name", "module_name", "attribute_name", "signature", "required_gateway_data", "parameters")
+
+    prefix: str
+    name: str
+
+    # the command is looked up as this attribute of the module when it is invoked for the first time
+    module_name: str
+    attribute_name: str
+
+    # signature of the command function, only informative
+    signature: str
+
+    # value of GatewayData flags, so intents and caches of the bot can be derived without importing the module
+    required_gateway_data: int
+
+    # descriptions of parameters (see ParameterDescription.to_dict), so slash commands can be generated without
+    # importing the module, the context parameter isn't included
+    parameters: list[dict]
+
+    def __init__(self, prefix: str, name: str, module_name: str, attribute_name: str, signature: str, required_gateway_data: int, parameters: list[dict]):
+        self.prefix = prefix
+        self.name = name
+        self.module_name = module_name
+        self.attribute_name = attribute_name
+        self.signature = signature
+        self.required_gateway_data = required_gateway_data
+        self.parameters = parameters
+
+    @staticmethod
+    def from_command(command: Command) -> "CommandManifestEntry":
+        parameters = [ParameterDescription.from_slot(slot).to_dict() for slot in command.binding_plan().slots()]
+        return CommandManifestEntry(command.prefix(), command.name(), command.module_name(), command.attribute_name(), str(command.signature()), command.required_gateway_data().value, parameters)
+
+    def to_dict(self) -> dict[str, str | int]:
+        return {attribute: getattr(self, attribute) for attribute in self.__slots__}
+
+
+class LazyCommand:
+    """
+    Stands in for a command listed in the manifest, its module is imported when the command is resolved.
+
+    Only prefix, name, required gateway data and descriptions of parameters are available before the command is
+    resolved, which is enough for dispatching, for deriving intents of the bot and for generating slash commands.
+    """
+
+    __slots__ = ("_entry", "_command")
+
+    _entry: CommandManifestEntry
+    _command: Command | None
+
+    def __init__(self, entry: CommandManifestEntry):
+        self._entry = entry
+        self._command = None
+
+    def resolve(self) -> Command:
+        """
+        :raises StaleManifestError: if the module doesn't declare the command anymore
+        :raises ImportError: if the module can't be imported
+        """
+
+        if self._command is None:
+            module = importlib.import_module(self._entry.module_name)
+            command = getattr(module, self._entry.attribute_name, None)
+            if not isinstance(command, Command) or command.prefix() != self._entry.prefix or command.name() != self._entry.name:
+                raise StaleManifestError(self._entry.name, self._entry.module_name)
+            self._command = command
+
+        return self._command
+
+    def is_resolved(self) -> bool:
+        return self._command is not None
+
+    def name(self) -> str:
+        return self._entry.name
+
+    def prefix(self) -> str:
+        return self._entry.prefix
+
+    def module_name(self) -> str:
+        return self._entry.module_name
+
+    def required_gateway_data(self) -> GatewayData:
+        return GatewayData(self._entry.required_gateway_data)
+
+    def parameters(self) -> list[ParameterDescription]:
+        """
+        :return: descriptions of all parameters except the context one, including parameters filled with dependencies
+        """
+
+        return [ParameterDescription.from_dict(description) for description in self._entry.parameters]
+
+
+class CommandManifest:
+    """
+    Prefixes, names and locations of all commands declared in modules of a package.
+    """
+
+    _package_name: str
+    _entries: list[CommandManifestEntry]
+
+    # module file name -> sha256 of its source, used to detect manifests which weren't generated again after a change
+    _module_hashes: dict[str, str]
+
+    def __init__(self, package_name: str, entries: list[CommandManifestEntry], module_hashes: dict[str, str]):
+        self._package_name = package_name
+        self._entries = entries
+        self._module_hashes = module_hashes
+
+    @staticmethod
+    def import_package_modules(package_name: str) -> list[str]:
+        """
+        Imports every module of the package, so their commands are created.
+
+        :return: names of imported modules
+        """
+
+        package = importlib.import_module(package_name)
+        module_names = [f"{package_name}.{module_info.name}" for module_info in pkgutil.iter_modules(package.__path__)]
+        for module_name in module_names:
+            importlib.import_module(module_name)
+        return module_names
+
+    @staticmethod
+    def generate(package_name: str) -> "CommandManifest":
+        module_names = set(CommandManifest.import_package_modules(package_name))
+        entries = [CommandManifestEntry.from_command(command) for command in CREATED_COMMANDS if command.module_name() in module_names]
+        return CommandManifest(package_name, entries, _hash_package_modules(package_name))
+
+    @staticmethod
+    def load(path: str) -> "CommandManifest":
+        """
+        :raises ValueError: if the manifest was generated by another version of the manifest format
+        """
+
+        with open(path) as manifest_file:
+            manifest = json.load(manifest_file)
+
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported command manifest version {manifest.get('version')}")
+
+        entries = [CommandManifestEntry(**entry) for entry in manifest["commands"]]
+        return CommandManifest(manifest["package"], entries, manifest["modules"])
+
+    @staticmethod
+    def load_if_up_to_date(path: str, package_name: str) -> "CommandManifest | None":
+        """
+        :return: the manifest, or None if it doesn't exist, can't be read or modules of the package changed since it was generated
+        """
+
+        if not os.path.exists(path):
+            return None
+
+        try:
+            manifest = CommandManifest.load(path)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+        if manifest._package_name != package_name or manifest._module_hashes != _hash_package_modules(package_name):
+            return None
+        return manifest
+
+    def save(self, path: str):
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "package": self._package_name,
+            "modules": self._module_hashes,
+            "commands": [entry.to_dict() for entry in self._entries],
+        }
+        with open(path, "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+            manifest_file.write("\n")
+
+    def lazy_commands(self) -> list[LazyCommand]:
+        return [LazyCommand(entry) for entry in self._entries]
+
+    #----- Manifest Properties ------#
+
+    def package_name(self) -> str:
+        return self._package_name
+
+    def entries(self) -> list[CommandManifestEntry]:
+        return self._entries
+
+
+def package_module_paths(package_name: str) -> dict[str, str]:
+    """
+    Finds source files of modules of the package without importing it, so no command module is run.
+
+    :return: file name -> path of every module of the package (not recursive)
+    """
+
+    module_paths: dict[str, str] = {}
+    for package_dir in importlib.util.find_spec(package_name).submodule_search_locations:
+        for file_name in sorted(os.listdir(package_dir)):
+            if file_name.endswith(".py"):
+                module_paths[file_name] = os.path.join(package_dir, file_name)
+    return module_paths
+
+
+def _hash_package_modules(package_name: str) -> dict[str, str]:
+    module_hashes: dict[str, str] = {}
+    for file_name, module_path in package_module_paths(package_name).items():
+        with open(module_path, "rb") as module_file:
+            module_hashes[file_name] = hashlib.sha256(module_file.read()).hexdigest()
+    return module_hashes
+
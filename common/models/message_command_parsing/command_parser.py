@@ -2,25 +2,63 @@ import re
 
 from common.models.message_command_parsing.string_object_parsing import StringConverter
 from common.models.message_command_parsing.command import Command
+from common.models.message_command_parsing.command_index import CommandTrie
+from common.models.message_command_parsing.command_manifest import CommandManifest, LazyCommand
+from common.models.message_command_parsing.binding_plan import BindingPlan, ParameterDescription
+from common.models.message_command_parsing.command_suggestions import CommandSuggestionIndex
+from common.models.message_command_parsing.scheduling import CommandScheduler, Cooldown, SchedulerTicket
+from common.models.message_command_parsing.execution import ExecutionMode, ExecutionPools
+from common.models.message_command_parsing.metrics import ParseMetrics, StageTimer
+from common.models.message_command_parsing.result_cache import ResultCache
+from common.models.message_command_parsing.guild_overlays import GuildConfiguration, GuildOverlay, GuildOverlays
+from common.models.message_command_parsing.parse_outcome import ParseOutcome, ParseOutcomeKind
 from common.models.message_command_parsing.exceptions import *
-import Levenshtein
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+import asyncio
 import string
 
 ALLOWED_CHARACTERS = list(string.ascii_letters) + ['-', '_']
 
+# metrics of messages chaining several commands are recorded under this name instead of a command name
+PIPELINE_METRICS_NAME = "pipeline"
+
+async def respond_to_message(execution_context, content):
+    await execution_context.message.respond(content)
+
 class CommandParserBuilder:
-    _commands: list[Command] = None
+    _commands: list[Command | LazyCommand] = None
+    _manifest: CommandManifest | None = None
     _supported_argument_packings: list[tuple[str,str]] = [('{','}'), ('(',')'), ('[',']'), ('"', '"')]
     _case_sensitive: bool = False
     _string_converter: StringConverter = StringConverter()
+    _scheduler: CommandScheduler | None = None
+    _execution_pools: ExecutionPools | None = None
+    _metrics: ParseMetrics | None = None
+    _responder: Callable[[Any, Any], Awaitable[None]] | None = None
+    _dependencies: dict[str, Any] | None = None
+    _pipeline_separator: str | None = None
+    _max_pipeline_length: int = 10
+    _result_cache: ResultCache | None = None
+    _guild_configuration_loader: Callable[[Hashable], Awaitable[GuildConfiguration | None]] | None = None
+    _max_guild_overlays: int = 10000
 
     def __init__(self):
         ...
 
-    def with_commands(self, commands: list[Command]):
+    def with_commands(self, commands: list[Command | LazyCommand]):
         self._commands = commands
         return self
 
+    def with_manifest(self, manifest: CommandManifest):
+        """
+        Commands of the manifest are registered without importing their modules, each module is imported
+        when one of its commands is invoked for the first time.
+        """
+
+        self._manifest = manifest
+        return self
+
     def with_supported_argument_packing(self, supported_argument_packings: list[tuple[str,str]]):
         self._supported_argument_packings = supported_argument_packings
         return self
@@ -33,43 +71,130 @@ class CommandParserBuilder:
         self._string_converter = converter
         return self
 
+    def with_scheduler(self, scheduler: CommandScheduler):
+        self._scheduler = scheduler
+        return self
+
+    def with_execution_pools(self, execution_pools: ExecutionPools):
+        self._execution_pools = execution_pools
+        return self
+
+    def with_metrics(self, metrics: ParseMetrics):
+        self._metrics = metrics
+        return self
+
+    def with_responder(self, responder: Callable[[Any, Any], Awaitable[None]]):
+        self._responder = responder
+        return self
+
+    def with_dependency(self, param_name: str, value: Any):
+        """
+        Every command having a parameter with this name receives the value instead of an argument from the message,
+        e.g. with_dependency("state", state_store) gives the state store to commands with "state" parameter.
+        """
+
+        self._dependencies = {**(self._dependencies or {}), param_name: value}
+        return self
+
+    def with_pipelines(self, separator: str = ";", max_length: int = 10):
+        """
+        Allows chaining commands in a single message, e.g. "!rpg buy potion; use potion; !rpg attack".
+        Commands after the first one may omit the prefix, the prefix of the previous command is used then.
+
+        :raises ValueError: if the separator isn't a single character or it already has another meaning
+        """
+
+        if len(separator) != 1 or separator in (' ', ':', ',') or any(separator in packing for packing in self._supported_argument_packings):
+            raise ValueError(f"\"{separator}\" can't separate commands")
+
+        self._pipeline_separator = separator
+        self._max_pipeline_length = max_length
+        return self
+
+    def with_result_cache(self, result_cache: ResultCache):
+        """
+        Values returned by commands declared with cache=TTL(...) are stored in the cache and replayed to later
+        invocations with the same arguments without invoking the command.
+        """
+
+        self._result_cache = result_cache
+        return self
+
+    def with_guild_overlays(self, loader: Callable[[Hashable], Awaitable[GuildConfiguration | None]], max_overlays: int = 10000):
+        """
+        Guilds can add their own prefixes and aliases to the registered commands, e.g. "? inv" in a guild which
+        configured "?" for "!rpg" and "inv" for "profile" is the same as "!rpg profile" there.
+
+        :param loader: coroutine function giving the configuration of a guild (by its id), None if it has none
+        :param max_overlays: count of guilds whose configuration is kept loaded (see GuildOverlays)
+        """
+
+        self._guild_configuration_loader = loader
+        self._max_guild_overlays = max_overlays
+        return self
+
     def build(self):
         """
 
         :raises AmbiguousCommandError: if one of the commands has the same prefix and name as command added earlier
-        :raises Exception: if no commands were given
+        :raises ValueError: if a command running in a process pool takes a dependency
+        :raises Exception: if neither commands nor manifest were given
         """
 
-        if self._commands is None:
+        if self._commands is None and self._manifest is None:
            raise Exception("Cannot build parser without commands")
 
-        registered_commands: dict[str,list[Command]] = {}
-
-        for command in self._commands:
-            prefix_registered_commands: list[Command] = registered_commands.get(command.prefix())
-            if prefix_registered_commands is None:
-                registered_commands[command.prefix()] = [command]
+        commands: list[Command | LazyCommand] = list(self._commands or [])
+        if self._manifest is not None:
+            commands.extend(self._manifest.lazy_commands())
 
-            else:
-                for registered_command in prefix_registered_commands:
-                    registered_command_name = registered_command.name()
-                    command_name = command.name()
+        registered_commands: dict[str,list[Command | LazyCommand]] = {}
+        command_index: dict[str,CommandTrie] = {}
+        suggestion_index: dict[str,CommandSuggestionIndex] = {}
 
-                    if not self._case_sensitive:
-                        registered_command_name = registered_command_name.lower()
-                        command_name = command_name.lower()
+        for command in commands:
+            prefix_index: CommandTrie = command_index.get(command.prefix())
+            if prefix_index is None:
+                prefix_index = CommandTrie(self._case_sensitive)
+                command_index[command.prefix()] = prefix_index
+                suggestion_index[command.prefix()] = CommandSuggestionIndex(self._case_sensitive)
+                registered_commands[command.prefix()] = []
 
-                    if registered_command_name == command_name:
-                        raise AmbiguousCommandError(command_name)
+            # ambiguity is detected by the trie itself during insertion
+            prefix_index.insert(command)
+            suggestion_index[command.prefix()].add(command)
+            registered_commands[command.prefix()].append(command)
 
-                registered_commands[command.prefix()].append(command)
+        guild_overlays = None
+        if self._guild_configuration_loader is not None:
+            guild_overlays = GuildOverlays(self._guild_configuration_loader, self._max_guild_overlays, self._case_sensitive)
 
-        return CommandParser(registered_commands, self._case_sensitive, self._supported_argument_packings, self._string_converter)
+        return CommandParser(registered_commands, self._case_sensitive, self._supported_argument_packings, self._string_converter, command_index, suggestion_index, self._scheduler, self._execution_pools, self._metrics, self._responder, self._dependencies, self._pipeline_separator, self._max_pipeline_length, self._result_cache, guild_overlays)
 
 class CommandParser:
 
-    # splits all commands into smaller groups with the same prefix
-    _registered_commands: dict[str,list[Command]]
+    # splits all commands into smaller groups with the same prefix, commands of a manifest are lazy until invoked
+    _registered_commands: dict[str,list[Command | LazyCommand]]
+
+    # command name tries of each prefix, used for dispatching
+    _command_index: dict[str,CommandTrie]
+
+    # similarity indexes of each prefix and recently suggested commands, used when a command wasn't found
+    _suggestion_index: dict[str,CommandSuggestionIndex]
+    _suggestion_cache: OrderedDict
+    _suggestion_cache_limit: int = 1024
+
+    # limits concurrently running commands, if None commands are awaited directly
+    _scheduler: CommandScheduler | None
+
+    # runs commands declared to be executed in thread or process pools
+    _execution_pools: ExecutionPools
+
+    # records duration of parse stages and outcomes, if None nothing is measured
+    _metrics: ParseMetrics | None
+
+    # sends values returned by commands, called with the execution context and the value
+    _responder: Callable[[Any, Any], Awaitable[None]]
 
     # all registered prefixes, it is faster to access this instead of pulling out list of prefixes from dictionary
     _all_prefixes: list[str]
@@ -81,153 +206,965 @@ class CommandParser:
     _supported_argument_packing: dict[str,str]
     _reversed_argument_packing: dict[str,str]
 
+    # matches every character which can change the state of the tokenizer outside of packings
+    _special_characters: re.Pattern
+
+    # closing character of packing -> pattern matching a run of the character, deeply nested packings end with them
+    _closing_runs: dict[str, re.Pattern]
+
     _string_converter: StringConverter
 
+    # binding plans of registered commands with converters of this parser resolved, plans of lazy commands
+    # are added when they are resolved
+    _binding_plans: dict[Command,BindingPlan]
+
+    # parameter name -> value injected into every command with such parameter (see CommandParserBuilder.with_dependency)
+    _dependencies: dict[str,Any]
+
+    # dependencies taken by each command whose binding plan was resolved, parameters of the plans don't include them
+    _command_dependencies: dict[Command,dict[str,Any]]
+
+    # prefixes grouped by their first character (longest first), used to reject messages before tokenizing them
+    _prefixes_by_first_char: dict[str,tuple[str,...]]
+
+    # characters which end the first token of a message (see get_command_tokens)
+    _prefix_terminators: frozenset[str]
+
+    # separates commands chained in a single message, None if messages can't chain commands
+    _pipeline_separator: str | None
+    _max_pipeline_length: int
+
+    # values returned by commands declared with TTL, None if nothing is cached
+    _result_cache: ResultCache | None
+
+    # prefixes and aliases of guilds resolved on top of the index of registered commands, None if guilds can't have any
+    _guild_overlays: GuildOverlays | None
 
-    def __init__(self, registered_commands: dict[str,list[Command]], case_sensitive: bool, supported_argument_packing: list[tuple[str,str]], string_converter: StringConverter):
+    def __init__(self, registered_commands: dict[str,list[Command | LazyCommand]], case_sensitive: bool, supported_argument_packing: list[tuple[str,str]], string_converter: StringConverter, command_index: dict[str,CommandTrie] | None = None, suggestion_index: dict[str,CommandSuggestionIndex] | None = None, scheduler: CommandScheduler | None = None, execution_pools: ExecutionPools | None = None, metrics: ParseMetrics | None = None, responder: Callable[[Any, Any], Awaitable[None]] | None = None, dependencies: dict[str, Any] | None = None, pipeline_separator: str | None = None, max_pipeline_length: int = 10, result_cache: ResultCache | None = None, guild_overlays: GuildOverlays | None = None):
         self._registered_commands = registered_commands
         self._case_sensitive = case_sensitive
         self._supported_argument_packing = { x[0]: x[1] for x in supported_argument_packing }
         self._reversed_argument_packing = { x[1]: x[0] for x in supported_argument_packing }
+        self._pipeline_separator = pipeline_separator
+        self._max_pipeline_length = max_pipeline_length
+        self._result_cache = result_cache
+        self._guild_overlays = guild_overlays
+
+        separators = {' ', ':', ','} if pipeline_separator is None else {' ', ':', ',', pipeline_separator}
+        special_characters = separators | set(self._supported_argument_packing) | set(self._reversed_argument_packing)
+        self._special_characters = re.compile("[" + "".join(re.escape(c) for c in sorted(special_characters)) + "]")
+        self._closing_runs = {pack_end: re.compile(re.escape(pack_end) + "+") for pack_end in self._reversed_argument_packing}
         self._string_converter = string_converter
 
-        self._all_prefixes = []
-        for registered_prefix in registered_commands:
+        self._index_prefixes()
+        self._prefix_terminators = frozenset(list(separators) + list(self._supported_argument_packing.keys()))
+
+        if command_index is None:
+            command_index = {}
+            for registered_prefix, prefix_commands in registered_commands.items():
+                command_index[registered_prefix] = CommandTrie(case_sensitive)
+                for command in prefix_commands:
+                    command_index[registered_prefix].insert(command)
+        self._command_index = command_index
+
+        if suggestion_index is None:
+            suggestion_index = {}
+            for registered_prefix, prefix_commands in registered_commands.items():
+                suggestion_index[registered_prefix] = CommandSuggestionIndex(case_sensitive)
+                for command in prefix_commands:
+                    suggestion_index[registered_prefix].add(command)
+        self._suggestion_index = suggestion_index
+        self._suggestion_cache = OrderedDict()
+
+        self._scheduler = scheduler
+        self._execution_pools = execution_pools if execution_pools is not None else ExecutionPools()
+        self._metrics = metrics
+        self._responder = responder if responder is not None else respond_to_message
+
+        self._dependencies = dict(dependencies or {})
+        self._binding_plans = {}
+        self._command_dependencies = {}
+        for prefix_commands in registered_commands.values():
+            for command in prefix_commands:
+                if isinstance(command, Command):
+                    self._binding_plans[command], self._command_dependencies[command] = self._create_binding_plan(command)
+
+    def _index_prefixes(self):
+        all_prefixes: list[str] = []
+        for registered_prefix in self._registered_commands:
             if ' ' in registered_prefix:
                 raise ValueError("Whitespaces in prefixes are not supported")
-            self._all_prefixes.append(registered_prefix)
+            all_prefixes.append(registered_prefix)
+
+        prefixes_by_first_char: dict[str,list[str]] = {}
+        for registered_prefix in all_prefixes:
+            if registered_prefix:
+                prefixes_by_first_char.setdefault(registered_prefix[0], []).append(registered_prefix)
+
+        self._all_prefixes = all_prefixes
+        self._prefixes_by_first_char = {
+            c: tuple(sorted(prefixes, key=len, reverse=True)) for c, prefixes in prefixes_by_first_char.items()
+        }
+
+    def add_command(self, command: Command | LazyCommand):
+        """
+        :raises AmbiguousCommandError: if there is already a command with the same prefix and name
+        """
+
+        self.swap_commands([], [command])
+
+    def remove_command(self, command: Command | LazyCommand):
+        """
+        :raises ValueError: if the command isn't registered
+        """
+
+        self.swap_commands([command], [])
+
+    def replace_command(self, old_command: Command | LazyCommand, new_command: Command | LazyCommand):
+        self.swap_commands([old_command], [new_command])
+
+    def swap_commands(self, removed_commands: list[Command | LazyCommand], added_commands: list[Command | LazyCommand]):
+        """
+        Removes and adds commands in a single step, so every parse sees either all the removed commands or all the
+        added ones. Invocations which already started keep running the removed commands.
+
+        Everything which can fail is checked before the parser is changed, so the parser stays untouched on failure.
+
+        :raises ValueError: if one of the removed commands isn't registered or a prefix contains whitespace
+        :raises AmbiguousCommandError: if an added command has the same prefix and name as another command which stays registered
+        :raises TypeError: if the converter doesn't support type of one of the added command parameters
+        :raises ValueError: if an added command running in a process pool takes a dependency
+        """
+
+        for command in removed_commands:
+            if command not in self._registered_commands.get(command.prefix(), ()):
+                raise ValueError(f"Command \"{command.name()}\" isn't registered")
+            if ' ' in command.prefix():
+                raise ValueError("Whitespaces in prefixes are not supported")
+
+        removed_names = {self._command_key(command) for command in removed_commands}
+        added_names: set[tuple[str, tuple[str, ...]]] = set()
+        for command in added_commands:
+            if ' ' in command.prefix():
+                raise ValueError("Whitespaces in prefixes are not supported")
+
+            command_key = self._command_key(command)
+            prefix_index = self._command_index.get(command.prefix())
+            is_registered = prefix_index is not None and prefix_index.get(command.name()) is not None
+            if command_key in added_names or (is_registered and command_key not in removed_names):
+                raise AmbiguousCommandError(command.name() if self._case_sensitive else command.name().lower())
+            added_names.add(command_key)
+
+        added_binding_plans = {command: self._create_binding_plan(command) for command in added_commands if isinstance(command, Command)}
+
+        # nothing can fail from now on and nothing is awaited, so parses can't see the parser half changed
+        for command in removed_commands:
+            prefix = command.prefix()
+            self._command_index[prefix].remove(command)
+            self._suggestion_index[prefix].remove(command)
+            self._registered_commands[prefix].remove(command)
+
+            resolved_command = command.resolve() if isinstance(command, LazyCommand) and command.is_resolved() else command
+            self._binding_plans.pop(resolved_command, None)
+            self._command_dependencies.pop(resolved_command, None)
+
+            if not self._registered_commands[prefix]:
+                del self._registered_commands[prefix]
+                del self._command_index[prefix]
+                del self._suggestion_index[prefix]
+
+        for command in added_commands:
+            prefix = command.prefix()
+            if prefix not in self._registered_commands:
+                self._registered_commands[prefix] = []
+                self._command_index[prefix] = CommandTrie(self._case_sensitive)
+                self._suggestion_index[prefix] = CommandSuggestionIndex(self._case_sensitive)
+
+            self._command_index[prefix].insert(command)
+            self._suggestion_index[prefix].add(command)
+            self._registered_commands[prefix].append(command)
+
+        for command, (binding_plan, command_dependencies) in added_binding_plans.items():
+            self._binding_plans[command] = binding_plan
+            self._command_dependencies[command] = command_dependencies
+        self._suggestion_cache.clear()
+        self._index_prefixes()
+
+        # replaced commands may return different values for the same arguments
+        if removed_commands and self._result_cache is not None:
+            self._result_cache.clear()
+
+    def _command_key(self, command: Command | LazyCommand) -> tuple[str, tuple[str, ...]]:
+        name = command.name() if self._case_sensitive else command.name().lower()
+        return command.prefix(), tuple(name.split())
+
+    def registered_commands(self) -> list[Command | LazyCommand]:
+        return [command for prefix_commands in self._registered_commands.values() for command in prefix_commands]
+
+    def guild_overlays(self) -> GuildOverlays | None:
+        return self._guild_overlays
+
+
+    def could_match(self, command_string: str, guild_id: Hashable | None = None) -> bool:
+        """
+        Cheap pre-filter which looks only at the beginning of the message.
+
+        Returns False only if parse would certainly not find any registered prefix, so it can be used to skip
+        tokenizing ordinary chat messages.
+
+        :param guild_id: guild the message was sent in, its prefixes are matched too if its overlay is loaded (if it
+            isn't, the message has to be parsed, which loads it), guilds without a configuration have no prefixes
+            of their own (see GuildOverlays.set_configured_guilds)
+        """
 
+        start = 0
+        string_len = len(command_string)
+        while start < string_len and command_string[start] == ' ':
+            start += 1
+
+        if start == string_len:
+            return False
+
+        prefixes = self._prefixes_by_first_char.get(command_string[start], ())
+        for prefix in prefixes:
+            if command_string.startswith(prefix, start):
+                prefix_end = start + len(prefix)
+                if prefix_end == string_len or command_string[prefix_end] in self._prefix_terminators:
+                    return True
+
+        if self._guild_overlays is None or guild_id is None:
+            return False
+
+        overlay = self._guild_overlays.cached(guild_id)
+        if overlay is None:
+            return True
+
+        # guilds have only a few prefixes of their own
+        for prefix in overlay.custom_prefixes():
+            if command_string.startswith(prefix, start):
+                prefix_end = start + len(prefix)
+                if prefix_end == string_len or command_string[prefix_end] in self._prefix_terminators:
+                    return True
+
+        return False
+
+    def _starts_with_prefix(self, command_string: str, overlay: GuildOverlay | None) -> bool:
+        """
+        :return: True if the first token of the message is a registered prefix or a prefix of the guild
+        """
+
+        # commands without a prefix may start with anything
+        if "" in self._command_index:
+            return True
+
+        start = 0
+        string_len = len(command_string)
+        while start < string_len and command_string[start] == ' ':
+            start += 1
+
+        end = start
+        while end < string_len and command_string[end] not in self._prefix_terminators:
+            end += 1
+
+        first_token = command_string[start:end]
+        if first_token in self._command_index:
+            return True
+
+        registered_prefix = None if overlay is None else overlay.registered_prefix(first_token)
+        return registered_prefix is not None and registered_prefix in self._command_index
 
     async def parse(self, command_string: str, execution_context) -> bool:
-        command_tokens = self.get_command_tokens(command_string)
+        """
+        :return: True if a command was invoked, False if the message isn't a command
+        :raises Exception: exception describing why the command couldn't be invoked, or the one raised by the command
+        """
+
+        outcome = await self.parse_outcome(command_string, execution_context)
+        outcome.raise_for_error()
+        return outcome.kind is ParseOutcomeKind.SUCCESS
+
+    async def parse_outcome(self, command_string: str, execution_context) -> ParseOutcome:
+        """
+        The same as parse, but failures are returned instead of raised.
+
+        Common failures (unknown commands, bad syntax, wrong arguments, cooldowns) don't raise any exception
+        on the way, their messages are rendered only if the outcome is asked for them.
+        """
+
+        if self._metrics is None:
+            return await self._parse(command_string, execution_context, None)
+
+        timer = self._metrics.start()
+        outcome = await self._parse(command_string, execution_context, timer)
+        self._metrics.record(timer, outcome.kind)
+        return outcome
+
+    async def _parse(self, command_string: str, execution_context, timer: StageTimer | None) -> ParseOutcome:
+        overlay = None
+        if self._guild_overlays is not None and (guild_id := getattr(execution_context, "guild_id", None)) is not None:
+            overlay = await self._guild_overlays.get(guild_id)
+
+        # ordinary chat is rejected before tokenizing it, so mistakes in it aren't reported as syntax errors
+        if not self._starts_with_prefix(command_string, overlay):
+            return ParseOutcome(ParseOutcomeKind.NOT_A_COMMAND, command_string)
+
+        command_spans, syntax_failure = self._scan_token_spans(command_string)
+        if timer is not None:
+            timer.mark("tokenize")
+
+        if syntax_failure is not None:
+            message, position = syntax_failure
+            return ParseOutcome(ParseOutcomeKind.SYNTAX_ERROR, command_string, position=position,
+                                error_factory=lambda: self.construct_syntax_error(message, command_string, position))
+
+        if not command_spans:
+            return ParseOutcome(ParseOutcomeKind.NOT_A_COMMAND, command_string)
+
+        if self._pipeline_separator is not None:
+            pipeline_spans = self._split_pipeline(command_string, command_spans)
+            if pipeline_spans is not None:
+                return await self._parse_pipeline(command_string, pipeline_spans, execution_context, overlay, timer)
+
+        invocation, failure = self._find_invocation(command_string, command_spans, None, overlay, timer)
+        if failure is not None:
+            return failure
+        command = invocation.command
+
+        # refuse the invocation before spending any time on converting its arguments
+        ticket, refusal = self._admit_command(command, execution_context)
+        if refusal is not None:
+            refusal.command_string = command_string
+            return refusal
+
+        _, binding_failure = self._bind_invocation(invocation, command_string, execution_context)
+        if binding_failure is not None:
+            if ticket is not None:
+                ticket.release()
+            return binding_failure
+
+        if timer is not None:
+            timer.mark("conversion")
+
+        return await self._run_invocation(invocation, ticket, command_string, execution_context, self._responder, timer)
+
+    async def invoke_outcome(self, prefix: str, command_name: str, keyword_arguments: list[tuple[str, str]], execution_context, responder: Callable[[Any, Any], Awaitable[None]] | None = None) -> ParseOutcome:
+        """
+        Invokes a command whose arguments arrived already structured (e.g. options of a slash command), so nothing
+        is tokenized. Raw arguments are bound and converted by the same binding plan as arguments of message commands.
+
+        :param keyword_arguments: (parameter name, raw argument) pairs
+        :param responder: sends the value returned by the command instead of the responder of the parser
+        """
+
+        if self._metrics is None:
+            return await self._invoke(prefix, command_name, keyword_arguments, execution_context, responder, None)
+
+        timer = self._metrics.start()
+        outcome = await self._invoke(prefix, command_name, keyword_arguments, execution_context, responder, timer)
+        self._metrics.record(timer, outcome.kind)
+        return outcome
+
+    async def _invoke(self, prefix: str, command_name: str, keyword_arguments: list[tuple[str, str]], execution_context, responder: Callable[[Any, Any], Awaitable[None]] | None, timer: StageTimer | None) -> ParseOutcome:
+        command_string = f"{prefix} {command_name}"
+
+        try:
+            command = self.find_command(prefix, command_name)
+        except Exception as e:
+            return ParseOutcome.from_error(e, ParseOutcomeKind.COMMAND_ERROR, command_string)
+
+        if command is None:
+            if timer is not None:
+                timer.mark("lookup")
+            return ParseOutcome(ParseOutcomeKind.NOT_FOUND, command_string, error_factory=lambda: CommandNotFoundError(command_name))
+
+        if timer is not None:
+            timer.command_name = command.name()
+            timer.mark("lookup")
+
+        ticket, refusal = self._admit_command(command, execution_context)
+        if refusal is not None:
+            refusal.command_string = command_string
+            return refusal
+
+        invocation = _Invocation(command, prefix, [], keyword_arguments)
+        _, binding_failure = self._bind_invocation(invocation, command_string, execution_context)
+        if binding_failure is not None:
+            if ticket is not None:
+                ticket.release()
+            return binding_failure
+
+        if timer is not None:
+            timer.mark("conversion")
+
+        return await self._run_invocation(invocation, ticket, command_string, execution_context, responder or self._responder, timer)
+
+    async def _run_invocation(self, invocation: "_Invocation", ticket: SchedulerTicket | None, command_string: str, execution_context, responder: Callable[[Any, Any], Awaitable[None]], timer: StageTimer | None) -> ParseOutcome:
+        command = invocation.command
+        command_args = invocation.command_args
+        if ticket is None:
+            invoke = lambda: self._execution_pools.invoke(command, command_args)
+        else:
+            invoke = lambda: self._scheduler.execute(ticket, lambda: self._execution_pools.invoke(command, command_args))
+
+        try:
+            try:
+                result = await self._invoke_cached(command, invocation.arguments, execution_context, invoke)
+            finally:
+                # cached values are replayed without waiting for the scheduler
+                if ticket is not None:
+                    ticket.release()
+
+            # commands which can't respond by themselves (e.g. ones running in other processes) return their response
+            if result is not None:
+                await responder(execution_context, result)
+        except Exception as e:
+            return ParseOutcome.from_error(e, ParseOutcomeKind.COMMAND_ERROR, command_string, command)
+
+        if timer is not None:
+            timer.mark("invocation")
+
+        return ParseOutcome(ParseOutcomeKind.SUCCESS, command_string, command)
+
+    async def _parse_pipeline(self, command_string: str, pipeline_spans: list[list[tuple[int,int]]], execution_context, overlay: GuildOverlay | None, timer: StageTimer | None) -> ParseOutcome:
+        """
+        Runs commands chained in a single message, e.g. "!rpg buy potion; use potion; !rpg attack".
+
+        All commands are found and their arguments converted before any of them runs, so a mistake in the last
+        command doesn't leave the first ones done. Commands with the same target (the author of the message, unless
+        the command declares its target parameter) run one after another in the written order, commands of different
+        targets run concurrently. Values returned by the commands are sent in a single reply.
+        """
+
+        if len(pipeline_spans) > self._max_pipeline_length:
+            return ParseOutcome(ParseOutcomeKind.SYNTAX_ERROR, command_string,
+                                error_factory=lambda: PipelineTooLongError(self._max_pipeline_length, self._pipeline_separator))
+
+        if timer is not None:
+            timer.command_name = PIPELINE_METRICS_NAME
+
+        invocations: list[_Invocation] = []
+        prefix = None
+        for invocation_spans in pipeline_spans:
+            invocation, failure = self._find_invocation(command_string, invocation_spans, prefix, overlay, None)
+            if failure is not None:
+                return failure
+            prefix = invocation.prefix
+            invocation.index = len(invocations)
+            invocations.append(invocation)
+
+        if timer is not None:
+            timer.mark("lookup")
+
+        # arguments are given literally, so none of them depends on results of the previous commands
+        for invocation in invocations:
+            invocation.command_args, binding_failure = self._bind_invocation(invocation, command_string, execution_context)
+            if binding_failure is not None:
+                return binding_failure
+
+        if timer is not None:
+            timer.mark("conversion")
+
+        target_groups: dict[Hashable, list[_Invocation]] = {}
+        for invocation in invocations:
+            target_groups.setdefault(self._invocation_target(invocation, execution_context), []).append(invocation)
+
+        # every use of a command counts against its cooldown, but a group of commands running one after another
+        # takes a single place in the scheduler
+        cooldown_uses: dict[Cooldown, list] = {}
+        for invocation in invocations:
+            if (cooldown := invocation.command.cooldown()) is not None:
+                cooldown_uses.setdefault(cooldown, [invocation.command, 0])[1] += 1
+
+        # tokens of all cooldowns are taken only if the whole pipeline is admitted, a refused pipeline doesn't run
+        acquired: list[tuple[Cooldown, int]] = []
+        tickets: list[SchedulerTicket | None] = []
+        refusal = None
+        for cooldown, (command, count) in cooldown_uses.items():
+            if (refusal := self._check_cooldown(command, execution_context, count)) is not None:
+                break
+            acquired.append((cooldown, count))
+        if refusal is None:
+            for group in target_groups.values():
+                ticket, refusal = self._reserve_ticket(group[0].command, execution_context)
+                if refusal is not None:
+                    break
+                tickets.append(ticket)
+        if refusal is not None:
+            for ticket in tickets:
+                if ticket is not None:
+                    ticket.release()
+            for cooldown, count in acquired:
+                cooldown.refund(execution_context, count)
+            refusal.command_string = command_string
+            return refusal
+
+        results: list[Any] = [None] * len(invocations)
+        failures: list[tuple[int, ParseOutcome]] = []
+
+        async def run_group(group: list[_Invocation]):
+            for invocation in group:
+                try:
+                    results[invocation.index] = await self._invoke_cached(invocation.command, invocation.arguments, execution_context,
+                                                                          lambda: self._execution_pools.invoke(invocation.command, invocation.command_args))
+                except Exception as e:
+                    # later commands of the same target may rely on the failed one, so they don't run
+                    failures.append((invocation.index, ParseOutcome.from_error(e, ParseOutcomeKind.COMMAND_ERROR, command_string, invocation.command)))
+                    return
+
+        await asyncio.gather(*(
+            run_group(group) if ticket is None else self._scheduler.execute(ticket, lambda group=group: run_group(group))
+            for group, ticket in zip(target_groups.values(), tickets)
+        ))
+
+        replies = [str(result) for result in results if result is not None]
+        if replies:
+            try:
+                await self._responder(execution_context, "\n".join(replies))
+            except Exception as e:
+                return ParseOutcome.from_error(e, ParseOutcomeKind.COMMAND_ERROR, command_string)
+
+        if timer is not None:
+            timer.mark("invocation")
+
+        if failures:
+            return min(failures, key=lambda failure: failure[0])[1]
+        return ParseOutcome(ParseOutcomeKind.SUCCESS, command_string)
+
+    async def _invoke_cached(self, command: Command, arguments: dict[str, Any] | None, execution_context, invoke: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Nothing is looked up by the command here, so invocations bound before the command was replaced (e.g. by a hot
+        reload) still finish.
+
+        :param arguments: converted arguments of the invocation without its context and dependencies (see _bind_invocation)
+        :return: value cached for the command and its arguments, otherwise the value returned by invoke, which is cached
+            if the command is declared with TTL
+        """
+
+        ttl = command.cache()
+        if ttl is None or self._result_cache is None or arguments is None:
+            return await invoke()
+
+        # context and dependencies aren't arguments, the scope of the TTL decides which context attributes are in the key
+        cache_key = ttl.make_key(command, arguments, execution_context)
+
+        result = self._result_cache.get(cache_key)
+        if result is not None:
+            return result
+
+        invalidations = self._result_cache.invalidations_count()
+        result = await invoke()
+        if result is not None:
+            self._result_cache.put(cache_key, result, ttl.seconds(), ttl.format_tags(arguments, execution_context), invalidations)
+        return result
+
+    def _split_pipeline(self, command_string: str, command_spans: list[tuple[int,int]]) -> list[list[tuple[int,int]]] | None:
+        """
+        :return: spans of every command chained in the message, None if the message contains a single command
+        """
+
+        separator = self._pipeline_separator
+        pipeline_spans: list[list[tuple[int,int]]] = [[]]
+        for span in command_spans:
+            if span[1] - span[0] == 1 and command_string[span[0]] == separator:
+                pipeline_spans.append([])
+            else:
+                pipeline_spans[-1].append(span)
+
+        if len(pipeline_spans) == 1:
+            return None
+
+        # empty commands (e.g. after a trailing separator) are ignored
+        return [invocation_spans for invocation_spans in pipeline_spans if invocation_spans]
+
+    def _find_invocation(self, command_string: str, command_spans: list[tuple[int,int]], default_prefix: str | None, overlay: GuildOverlay | None, timer: StageTimer | None) -> tuple["_Invocation | None", ParseOutcome | None]:
+        """
+        Finds the command of a single invocation, its arguments aren't converted yet.
+
+        :param default_prefix: prefix used if the invocation doesn't start with a registered one (commands of
+            a pipeline may omit it), None if the prefix is required
+        :param overlay: prefixes and aliases of the guild the message was sent in, registered prefixes and command
+            names take precedence over them
+        :return: (invocation, None) or (None, outcome describing the failure)
+        """
 
         # prefix should be contiguous and at the first place
-        command_prefix = command_tokens.pop(0)
+        prefix_start, prefix_end = command_spans[0]
+        command_prefix = command_string[prefix_start:prefix_end]
+
+        if (prefix_index := self._command_index.get(command_prefix)) is not None:
+            command_spans = command_spans[1:]
+        elif overlay is not None and (registered_prefix := overlay.registered_prefix(command_prefix)) is not None \
+                and (prefix_index := self._command_index.get(registered_prefix)) is not None:
+            command_prefix = registered_prefix
+            command_spans = command_spans[1:]
+        elif default_prefix is not None and (prefix_index := self._command_index.get(default_prefix)) is not None:
+            command_prefix = default_prefix
+        else:
+            # if any command doesn't have this prefix, then you shouldn't process command further
+            return None, ParseOutcome(ParseOutcomeKind.NOT_A_COMMAND, command_string)
 
-        # if any command doesn't have this prefix, then you shouldn't process command further
-        if (command_list := self._registered_commands.get(command_prefix)) is None:
-            return False
+        command_tokens = [command_string[token_start:token_end] for token_start, token_end in command_spans]
 
         # extract keyword arguments from tokens (keyword args are the last ones)
-        keyword_arguments, other_tokens = self.get_command_keyword_args_tokens(command_tokens)
+        try:
+            keyword_arguments, other_tokens = self.get_command_keyword_args_tokens(command_tokens)
+        except SyntaxError as e:
+            return None, ParseOutcome.from_error(e, ParseOutcomeKind.SYNTAX_ERROR, command_string)
+        if timer is not None:
+            timer.mark("keywords")
 
         # we have pulled out keyword args and prefix so the last things are command and positional arguments
-        command, positional_arguments = self.get_command_from_tokens(other_tokens, command_list)
+        command, positional_arguments = self.get_command_from_tokens(other_tokens, prefix_index)
 
-        positional_arguments = self.format_positional_args(positional_arguments)
+        # the alias is replaced by the words it stands for, which may include arguments too
+        if command is None and overlay is not None and other_tokens and overlay.has_aliases():
+            alias_words = overlay.alias(command_prefix, other_tokens[0] if self._case_sensitive else other_tokens[0].lower())
+            if alias_words is not None:
+                command, positional_arguments = self.get_command_from_tokens([*alias_words, *other_tokens[1:]], prefix_index)
 
         # command is None if there was no command with the same name found
         if command is None:
-            command_name = ""
-            for token in other_tokens:
-                command_name += token+" "
-            best_matching_command = self.get_best_matching_command(command_prefix, command_name)
-            if best_matching_command is None:
-                raise CommandNotFoundError(command_name )
+            if timer is not None:
+                timer.mark("lookup")
+            command_name = " ".join(other_tokens)
+            return None, ParseOutcome(ParseOutcomeKind.NOT_FOUND, command_string, position=command_spans[0][0] if command_spans else prefix_end,
+                                      error_factory=lambda: self._construct_command_not_found_error(command_prefix, command_name))
+
+        if isinstance(command, LazyCommand):
+            try:
+                command = self._resolve_lazy_command(command)
+            except Exception as e:
+                return None, ParseOutcome.from_error(e, ParseOutcomeKind.COMMAND_ERROR, command_string)
+
+        if timer is not None:
+            timer.command_name = command.name()
+            timer.mark("lookup")
+
+        invocation = _Invocation(command, command_prefix, positional_arguments, keyword_arguments)
+        invocation.spans = command_spans
+        return invocation, None
+
+    def _bind_invocation(self, invocation: "_Invocation", command_string: str, execution_context) -> tuple[dict[str, Any] | None, ParseOutcome | None]:
+        command = invocation.command
+        argument_offset = None if invocation.spans is None else lambda argument_index: self._argument_offset(command_string, invocation, argument_index)
+        command_args, binding_failure = self._binding_plans[command].try_bind(self.format_positional_args(invocation.positional_arguments), invocation.keyword_arguments, argument_offset)
+        if binding_failure is not None:
+            binding_failure.command_string = command_string
+            binding_failure.command = command
+            if invocation.spans is None:
+                # the command string isn't the one the arguments came from
+                binding_failure.position = -1
+            elif binding_failure.kind is not ParseOutcomeKind.REDUNDANT_ARGUMENT and binding_failure.position >= 0:
+                binding_failure.position = self._argument_error_position(command_string, binding_failure.position, binding_failure.error())
+            return None, binding_failure
+
+        # cache keys are made only of arguments, so they are kept before the context and dependencies are added
+        if command.cache() is not None:
+            invocation.arguments = dict(command_args)
+
+        # add context parameter and dependencies
+        if command.takes_context():
+            command_args[command.context_arg_name()] = execution_context
+        if command_dependencies := self._command_dependencies[command]:
+            command_args.update(command_dependencies)
+
+        invocation.command_args = command_args
+        return command_args, None
+
+    def _argument_offset(self, command_string: str, invocation: "_Invocation", argument_index: int) -> int:
+        """
+        Used only when binding fails, so tokens aren't kept for every invocation.
+
+        :param argument_index: index of the argument as given to BindingPlan.try_bind, positional arguments (tokens
+            joined with commas are one argument) followed by values of keyword arguments
+        :return: offset in command_string where the argument starts, offset of the alias for arguments which come
+            from an alias, -1 if there is no such argument
+        """
+
+        spans = invocation.spans
+        tokens = [command_string[token_start:token_end] for token_start, token_end in spans]
+
+        # keyword arguments are the last tokens, each of them is a name, a colon and a value
+        colons = [token_index for token_index, token in enumerate(tokens) if token == ':']
+        positional_end = colons[0] - 1 if colons else len(tokens)
+        positional_tokens = invocation.positional_arguments
+        tokens_offset = positional_end - len(positional_tokens)
+
+        # the same grouping as format_positional_args
+        argument_starts: list[int] = []
+        in_list = after_comma = False
+        for token_index, token in enumerate(positional_tokens):
+            if token == ',':
+                if not in_list and not argument_starts:
+                    argument_starts.append(token_index)
+                in_list = after_comma = True
+            elif after_comma:
+                after_comma = False
             else:
-                raise CommandNotFoundError(command_name, best_matching_command.name())
+                in_list = False
+                argument_starts.append(token_index)
 
-        args_info = command.get_args_info().copy()
-        args_names = list(args_info.keys())
-        args_names.pop(0)
+        if 0 <= argument_index < len(argument_starts):
+            return spans[max(tokens_offset + argument_starts[argument_index], 0)][0]
 
-        arg_count = len(keyword_arguments) + len(positional_arguments)
+        # keyword arguments are collected starting with the last one
+        keyword_index = argument_index - len(argument_starts)
+        if 0 <= keyword_index < len(colons) and (value_index := colons[-1 - keyword_index] + 1) < len(spans):
+            return spans[value_index][0]
+        return -1
 
-        # check if total amount of arguments is lesser than minimum argument count
-        if arg_count < command.get_required_params_count() - 1:
-            raise MissingArgumentError(args_names[-1])
+    def _argument_error_position(self, command_string: str, argument_start: int, error: Exception) -> int:
+        """
+        :return: offset in command_string of the error raised while converting the argument starting at
+            argument_start, errors of literals have positions relative to the part of the argument they were raised for
+        """
 
-        if len(positional_arguments) > (command.get_required_params_count() + command.get_non_required_params_count() - 1):
-            raise RedundantArgumentError((len(args_names), positional_arguments[len(args_names)]))
+        expr = getattr(error, "expr", None)
+        position = getattr(error, "position", -1)
+        if expr is None or position < 0:
+            return argument_start
 
-        if len(positional_arguments) + len(keyword_arguments) > (command.get_required_params_count() + command.get_non_required_params_count() - 1):
-            raise  RedundantArgumentError((len(args_names) + 1, keyword_arguments[(len(positional_arguments) + len(keyword_arguments) - len(args_names) - 1)]))
+        expr_start = command_string.find(expr, argument_start)
+        return argument_start if expr_start < 0 else expr_start + position
 
+    def _invocation_target(self, invocation: "_Invocation", execution_context) -> Hashable:
+        target = invocation.command.target()
+        if target is None:
+            return getattr(execution_context, "author_id", None)
 
-        command_args: dict[str, str] = {}
+        target_value = invocation.command_args.get(target)
+        try:
+            hash(target_value)
+        except TypeError:
+            target_value = repr(target_value)
+        return target_value
 
-        for arg_index in range(len(positional_arguments)):
-            command_args.update({args_names[arg_index]: positional_arguments[arg_index]})
+    def find_command(self, prefix: str, command_name: str) -> Command | None:
+        """
+        :return: registered command with the prefix and the name, lazy commands are resolved, None if there is none
+        :raises StaleManifestError: if the module of a lazy command doesn't declare it anymore
+        :raises TypeError: if the converter doesn't support type of one of the command parameters
+        :raises ValueError: if the command runs in a process pool and takes a dependency
+        """
 
-        for arg in keyword_arguments:
-            arg_parts = arg.split(':')
-            command_args.update({arg_parts[0]: arg_parts[1]})
+        prefix_index = self._command_index.get(prefix)
+        command = None if prefix_index is None else prefix_index.get(command_name)
+        if isinstance(command, LazyCommand):
+            command = self._resolve_lazy_command(command)
+        return command
 
-        for arg_name in args_names:
+    def binding_plan(self, command: Command) -> BindingPlan:
+        """
+        :return: plan binding arguments of the registered command, parameters filled with dependencies aren't included
+        """
 
-            # check if there are any missing arguments
-            if command_args.get(arg_name) is None:
+        return self._binding_plans[command]
 
-                # try pulling the default value for argument
-                default_val = command.get_parameter_default_value(arg_name)
-                if default_val is None:
-                    raise MissingArgumentError(f"Missing argument \"{arg_name}\"")
-                else:
-                    command_args[arg_name] = default_val
-            else:
-                # parse arguments into specified type
-                command_args[arg_name] = self._string_converter.convert_from_string(command_args[arg_name], args_info[arg_name])
+    def parameter_descriptions(self, command: Command | LazyCommand) -> list[ParameterDescription]:
+        """
+        Lazy commands which weren't invoked yet are described by the manifest, so their modules aren't imported.
 
-        # add context parameter
-        command_args.update({command.context_arg_name(): execution_context})
+        :return: descriptions of parameters of the registered command, parameters filled with dependencies aren't included
+        """
 
-        # Invoke command
-        await command.invoke_async(**command_args)
+        if isinstance(command, LazyCommand):
+            if not command.is_resolved():
+                return [description for description in command.parameters() if description.name not in self._dependencies]
+            command = self._resolve_lazy_command(command)
+        return [ParameterDescription.from_slot(slot) for slot in self._binding_plans[command].slots()]
 
-        return True
+    def _resolve_lazy_command(self, lazy_command: LazyCommand) -> Command:
+        """
+        Imports the module of the command (only when it is invoked for the first time) and resolves its binding plan.
+
+        :raises StaleManifestError: if the module doesn't declare the command anymore
+        :raises TypeError: if the converter doesn't support type of one of the command parameters
+        :raises ValueError: if the command runs in a process pool and takes a dependency
+        """
+
+        command = lazy_command.resolve()
+        if command not in self._binding_plans:
+            self._binding_plans[command], self._command_dependencies[command] = self._create_binding_plan(command)
+        return command
+
+    def _create_binding_plan(self, command: Command) -> tuple[BindingPlan, dict[str, Any]]:
+        """
+        :return: binding plan of the command with converters of this parser and dependencies the command takes
+        :raises TypeError: if the converter doesn't support type of one of the command parameters
+        :raises ValueError: if the command runs in a process pool and takes a dependency
+        """
+
+        command_dependencies = {param_name: value for param_name, value in self._dependencies.items() if param_name in command.signature().parameters}
+
+        # dependencies (e.g. database connections) can't be sent to another process
+        if command_dependencies and command.execution_mode() is ExecutionMode.PROCESS:
+            raise ValueError(f"Command \"{command.name()}\" runs in a process pool, so it can't take \"{next(iter(command_dependencies))}\" dependency")
+
+        binding_plan = command.binding_plan()
+        if command_dependencies:
+            binding_plan = binding_plan.without_parameters(command_dependencies.keys())
+        return binding_plan.with_converters(self._string_converter), command_dependencies
+
+    def admit_command(self, command: Command, execution_context) -> SchedulerTicket | None:
+        """
+        :return: ticket of the scheduler (None if the parser has no scheduler)
+        :raises CommandOnCooldownError: if the cooldown of the command has no tokens left for the context
+        :raises CommandBusyError: if the scheduler queues of the context are full
+        """
+
+        ticket, refusal = self._admit_command(command, execution_context)
+        if refusal is not None:
+            refusal.raise_for_error()
+        return ticket
+
+    def _admit_command(self, command: Command, execution_context) -> tuple[SchedulerTicket | None, ParseOutcome | None]:
+        refusal = self._check_cooldown(command, execution_context)
+        if refusal is not None:
+            return None, refusal
+
+        ticket, refusal = self._reserve_ticket(command, execution_context)
+        # the command doesn't run, so it doesn't count against its cooldown
+        if refusal is not None and (cooldown := command.cooldown()) is not None:
+            cooldown.refund(execution_context)
+        return ticket, refusal
+
+    def _check_cooldown(self, command: Command, execution_context, count: int = 1) -> ParseOutcome | None:
+        """
+        :param count: tokens taken from the cooldown of the command, all of them or none
+        """
+
+        cooldown = command.cooldown()
+        if cooldown is not None and (retry_after := cooldown.try_acquire(execution_context, count)) > 0:
+            return ParseOutcome(ParseOutcomeKind.ON_COOLDOWN, command=command,
+                                error_factory=lambda: CommandOnCooldownError(command.name(), retry_after))
+        return None
+
+    def _reserve_ticket(self, command: Command, execution_context) -> tuple[SchedulerTicket | None, ParseOutcome | None]:
+        if self._scheduler is None:
+            return None, None
+
+        ticket = self._scheduler.try_reserve(execution_context)
+        if ticket is None:
+            return None, ParseOutcome(ParseOutcomeKind.BUSY, command=command, error_factory=CommandBusyError)
+
+        return ticket, None
 
     def get_command_tokens(self, expr: str) -> list[str]:
+        return [expr[token_start:token_end] for token_start, token_end in self.get_command_token_spans(expr)]
+
+    def get_command_token_spans(self, expr: str) -> list[tuple[int,int]]:
+        """
+        Splits expression into tokens in a single pass.
+
+        Only characters which can change the tokenizer state are visited, runs of ordinary characters are skipped by
+        the compiled pattern. A packing ends with the closing character which balances the opening characters of the
+        same kind, other characters inside of it (including other packings) are part of the token.
+
+        :return: (start, end) offsets of every token in expr
+        :raises SyntaxError: if a packing is opened in the middle of a token or not closed
+        """
+
+        spans, syntax_failure = self._scan_token_spans(expr)
+        if syntax_failure is not None:
+            raise self.construct_syntax_error(syntax_failure[0], expr, syntax_failure[1])
+        return spans
+
+    def _scan_token_spans(self, expr: str) -> tuple[list[tuple[int,int]] | None, tuple[str,int] | None]:
+        """
+        :return: (spans, None) or (None, (message, position)) describing the syntax error
+        """
+
+        spans: list[tuple[int,int]] = []
         expr_len: int = len(expr)
-        expr_i: int = 0
-        tokens: list[str] = []
-        current_token: str = ""
 
-        while expr_i < expr_len:
+        # start of the current token which isn't a packing, -1 if there is no such token
+        token_start: int = -1
+
+        # first character which wasn't yet assigned to any token
+        plain_from: int = 0
+
+        # hot loop, so frequently used attributes are pulled into locals
+        find_special = self._special_characters.search
+        packings = self._supported_argument_packing
+        pipeline_separator = self._pipeline_separator
+
+        expr_i: int = 0
+        while (special_match := find_special(expr, expr_i)) is not None:
+            expr_i = special_match.start()
             c = expr[expr_i]
+
+            if token_start == -1 and expr_i > plain_from:
+                token_start = plain_from
+
             if c == ' ':
-                if len(current_token) > 0:
-                    tokens.append(current_token)
-                    current_token = ""
-            elif c == ':' or c == ',':
-                if len(current_token) > 0:
-                    tokens.append(current_token)
-                    current_token = ""
-                tokens.append(c)
-
-            elif (pack_end := self._supported_argument_packing.get(c)) is not None:
-                if len(current_token) > 0:
-                    raise self.construct_syntax_error(f"Unexpected token \"{pack_end}\"", expr, expr_i)
-
-                open_c = 1
-                pack_end_i = expr_i+1
-                while pack_end_i < expr_len:
-                    if expr[pack_end_i] == pack_end:
-                        open_c-=1
-                    elif expr[pack_end_i] == c:
-                        open_c+=1
-
-                    if open_c == 0:
-                        break
-
-                    pack_end_i+=1
-
-                if open_c != 0:
-                    raise self.construct_syntax_error(f"Expected \"{pack_end}\" but it wasn't found", expr, expr_len - 1)
-
-                tokens.append(expr[expr_i: pack_end_i+1])
-                expr_i = pack_end_i
+                if token_start != -1:
+                    spans.append((token_start, expr_i))
+                    token_start = -1
+            elif c == ':' or c == ',' or c == pipeline_separator:
+                if token_start != -1:
+                    spans.append((token_start, expr_i))
+                    token_start = -1
+                spans.append((expr_i, expr_i + 1))
+
+            elif (pack_end := packings.get(c)) is not None:
+                if token_start != -1:
+                    return None, (f"Unexpected token \"{pack_end}\"", expr_i)
+
+                packing_end, syntax_failure = self._find_packing_end(expr, expr_i, pack_end)
+                if syntax_failure is not None:
+                    return None, syntax_failure
+                spans.append((expr_i, packing_end + 1))
+                expr_i = packing_end
             else:
-                current_token += c
+                # closing character without an opening one is an ordinary part of a token
+                if token_start == -1:
+                    token_start = expr_i
 
             expr_i += 1
+            plain_from = expr_i
 
-        if len(current_token) > 0:
-            tokens.append(current_token)
+        if token_start == -1 and expr_len > plain_from:
+            token_start = plain_from
 
-        return tokens
+        if token_start != -1:
+            spans.append((token_start, expr_len))
 
-    def get_command_keyword_args_tokens(self, command_tokens: list[str]) -> tuple[list[str],list[str]]:
-        keyword_arguments: list[str] = []
+        return spans, None
+
+    def _find_packing_end(self, expr: str, packing_start: int, pack_end: str) -> tuple[int, tuple[str,int] | None]:
+        """
+        :return: (index of the character closing packing opened at packing_start, None) or (-1, (message, position))
+            if the packing isn't closed
+        """
+
+        pack_start = expr[packing_start]
+        if pack_start == pack_end:
+            packing_end = expr.find(pack_end, packing_start + 1)
+            if packing_end == -1:
+                return -1, (f"Expected \"{pack_end}\" but it wasn't found", len(expr) - 1)
+            return packing_end, None
+
+        depth = 1
+        search_from = packing_start + 1
+
+        # every run of closing characters is visited once, opening characters before it are counted in C instead of
+        # one by one
+        find = expr.find
+        count = expr.count
+        match_closing_run = self._closing_runs[pack_end].match
+        while (packing_end := find(pack_end, search_from)) != -1:
+            if packing_end != search_from:
+                depth += count(pack_start, search_from, packing_end)
+            run_length = match_closing_run(expr, packing_end).end() - packing_end
+            if run_length >= depth:
+                return packing_end + depth - 1, None
+            depth -= run_length
+            search_from = packing_end + run_length
+
+        return -1, (f"Expected \"{pack_end}\" but it wasn't found", len(expr) - 1)
+
+    def get_command_keyword_args_tokens(self, command_tokens: list[str]) -> tuple[list[tuple[str,str]],list[str]]:
+        keyword_arguments: list[tuple[str,str]] = []
         expr_i = len(command_tokens) - 1
         ct_len = len(command_tokens)
         last_keyword_arg: int = expr_i + 1
@@ -235,7 +1172,6 @@ class CommandParser:
         while expr_i >= 0:
             if command_tokens[expr_i] == ':':
                 arg_collector_i = expr_i+1
-                arg = ""
                 while arg_collector_i< ct_len and command_tokens[arg_collector_i] != ':':
                     arg_collector_i+=1
 
@@ -245,110 +1181,115 @@ class CommandParser:
                 if command_tokens[arg_collector_i] == ':':
                     arg_collector_i -= 2
 
-                arg_builder = expr_i+1
-                while arg_builder <= arg_collector_i:
-                    arg += command_tokens[arg_builder]
-                    arg_builder+=1
+                arg_tokens = command_tokens[expr_i+1: arg_collector_i+1]
+                if expr_i == 0 or len(arg_tokens) == 0:
+                    raise SyntaxError("Keyword argument needs both name and value (name: value)")
 
-                keyword_arguments.append(f"{command_tokens[expr_i - 1]}:{self.format_positional_args(arg)[0]}")
+                keyword_arguments.append((command_tokens[expr_i - 1], self.format_positional_args(arg_tokens)[0]))
                 last_keyword_arg = expr_i - 1
 
             expr_i -= 1
 
         return keyword_arguments, command_tokens[0: last_keyword_arg]
 
-    def get_command_from_tokens(self, command_tokens: list[str], commands_source) -> tuple[Command | None, list[str]]:
-        command_tokens_i : int = len(command_tokens) - 1
-
-        while command_tokens_i >= 0:
-            command_name = command_tokens[0]
-            index = 1
-            while index <= command_tokens_i:
-                command_name+=" " + command_tokens[index]
-                index+=1
-
-            if not self._case_sensitive:
-                command_name = command_name.lower()
-
-            for command in commands_source:
-                if (not self._case_sensitive and command_name == command.name().lower()) or command_name == command.name():
-                    return command, command_tokens[command_tokens_i+1:]
-
-            command_tokens_i -= 1
-
-        return None, command_tokens
-
-    def format_positional_args(self, pos_tokens) -> list[str]:
-        positional_arguments: list[str] = []
-        current_token: str = ""
-        pos_tokens_len = len(pos_tokens)
-        list_expr_begin: bool = False
-
-        for token_i in range(pos_tokens_len):
-            if token_i + 1 < pos_tokens_len:
-                if pos_tokens[token_i + 1] == ',':
-                    if list_expr_begin:
-                        current_token += pos_tokens[token_i]
-                    else:
-                        current_token += "[" + pos_tokens[token_i]
-                        list_expr_begin = True
-                else:
-                    if list_expr_begin:
-                        if pos_tokens[token_i] == ',':
-                            current_token += ','
-                        else:
-                            positional_arguments.append(current_token + pos_tokens[token_i] + "]")
-                            list_expr_begin = False
-                            current_token = ""
-                    else:
-                        positional_arguments.append(pos_tokens[token_i])
-            else:
-                if pos_tokens[token_i] == ',':
-                    if list_expr_begin:
-                        positional_arguments.append(current_token + "]")
-                    else:
-                        positional_arguments.append("[" + pos_tokens[token_i] + "]")
-                else:
-                    if list_expr_begin:
-                        positional_arguments.append(current_token + pos_tokens[token_i] + "]")
-                    else:
-                        positional_arguments.append(pos_tokens[token_i])
+    def get_command_from_tokens(self, command_tokens: list[str], commands_source: CommandTrie) -> tuple[Command | None, list[str]]:
+        command, name_len = commands_source.find(command_tokens)
+
+        if command is None:
+            return None, command_tokens
+
+        return command, command_tokens[name_len:]
+
+    def format_positional_args(self, pos_tokens: list[str]) -> list[str | list[str]]:
+        """
+        Groups tokens joined with commas into lists, e.g. tokens of "a b, c, d e" become ["a", ["b", "c", "d"], "e"].
+
+        Lists are built directly from tokens instead of being rebuilt into strings which would have to be parsed again.
+        """
 
+        positional_arguments: list[str | list[str]] = []
+        current_list: list[str] | None = None
+        after_comma: bool = False
+
+        for token in pos_tokens:
+            if token == ',':
+                if current_list is None:
+                    current_list = [positional_arguments.pop()] if positional_arguments else []
+                    positional_arguments.append(current_list)
+                after_comma = True
+            elif after_comma:
+                current_list.append(token)
+                after_comma = False
+            else:
+                current_list = None
+                positional_arguments.append(token)
 
         return positional_arguments
 
 
     def construct_syntax_error(self, err: str, expr: str, error_position: int):
-        err_str: str = err + ": " + expr + "\n"
-        err_off = len(err_str) + 2
-        for expr_i in range(err_off):
-            err_str += " "
-
-        for expr_i in range(len(expr)):
-            if error_position-1 <= expr_i <= error_position + 1:
-                err_str += '^'
-            else:
-                err_str += ' '
+        err_str: str = f"{err}: {expr}\n"
 
-        return SyntaxError(err_str)
+        # expression is repeated under the message with the characters around the error position marked
+        marker_start = min(max(0, error_position - 1), len(expr))
+        marker_end = max(marker_start, min(len(expr), error_position + 2))
 
-    def get_best_matching_command(self, prefix: str, command_name) -> Command | None:
-        current_command: Command = None
-        best_similarity: float = 0
-        current_similarity: float
+        return SyntaxError(err_str + " " * (len(err_str) + 2 + marker_start) + "^" * (marker_end - marker_start) + " " * (len(expr) - marker_end))
 
-        for command in self._registered_commands[prefix]:
-            current_similarity = Levenshtein.ratio(command_name, command.name())
-            if current_similarity > best_similarity:
-                best_similarity = current_similarity
-                current_command = command
+    def _construct_command_not_found_error(self, prefix: str, command_name: str) -> CommandNotFoundError:
+        best_matching_command = self.get_best_matching_command(prefix, command_name)
+        if best_matching_command is None:
+            return CommandNotFoundError(command_name)
+        return CommandNotFoundError(command_name, best_matching_command.name())
 
+    def get_best_matching_command(self, prefix: str, command_name: str) -> Command | None:
+        command_name = command_name.strip()
+        cache_key = (prefix, command_name)
 
-        if best_similarity > 0.6:
-            return current_command
-        else:
-            return None
+        # the same misspellings are often sent many times in a row
+        if cache_key in self._suggestion_cache:
+            self._suggestion_cache.move_to_end(cache_key)
+            return self._suggestion_cache[cache_key]
+
+        best_matching_command = self._suggestion_index[prefix].find_most_similar(command_name)
+
+        self._suggestion_cache[cache_key] = best_matching_command
+        if len(self._suggestion_cache) > self._suggestion_cache_limit:
+            self._suggestion_cache.popitem(last=False)
+
+        return best_matching_command
+
+
+class _Invocation:
+    """
+    Command found in a message together with its raw arguments, arguments are converted later.
+    """
+
+    __slots__ = ("command", "prefix", "positional_arguments", "keyword_arguments", "command_args", "arguments", "spans", "index")
+
+    command: Command
+    prefix: str
+    positional_arguments: list[str]
+    keyword_arguments: list[tuple[str, str]]
+
+    # converted arguments, None until the invocation is bound
+    command_args: dict[str, Any] | None
 
+    # converted arguments without the context and dependencies, kept only for commands whose values are cached
+    arguments: dict[str, Any] | None
 
+    # spans of the tokens following the prefix in the command string, None if the arguments didn't come in a message
+    spans: list[tuple[int, int]] | None
 
+    # position of the invocation in its pipeline
+    index: int
 
+    def __init__(self, command: Command, prefix: str, positional_arguments: list[str], keyword_arguments: list[tuple[str, str]]):
+        self.command = command
+        self.prefix = prefix
+        self.positional_arguments = positional_arguments
+        self.keyword_arguments = keyword_arguments
+        self.command_args = None
+        self.arguments = None
+        self.spans = None
+        self.index = 0
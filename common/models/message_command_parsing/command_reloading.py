@@ -0,0 +1,138 @@
+import asyncio
+import importlib
+import logging
+import os
+import sys
+
+from common.models.message_command_parsing.command import Command, CREATED_COMMANDS
+from common.models.message_command_parsing.command_manifest import LazyCommand, package_module_paths
+from common.models.message_command_parsing.command_parser import CommandParser
+from common.models.message_command_parsing.gateway_data import GatewayData
+
+logger = logging.getLogger(__name__)
+
+
+class CommandModuleWatcher:
+    """
+    Polls modification times of modules of a command package and swaps commands of changed modules in the parser.
+
+    A changed module is reloaded and all its commands are replaced at once by CommandParser.swap_commands, commands
+    which are already running keep their old code. If the module fails to reload, its previous commands stay registered.
+
+    Commands running in a process pool are imported by the pool processes themselves, which keep the old code
+    until the pool is restarted. Intents of a connected bot can't change either, so a reloaded command needing
+    gateway data the bot wasn't started with is registered with a warning.
+    """
+
+    _parser: CommandParser
+    _package_name: str
+    _interval: float
+
+    # gateway data received by the running bot, None if it isn't known
+    _available_gateway_data: GatewayData | None
+
+    # module name -> (modification time, size) of its source file when it was seen for the last time
+    _module_states: dict[str, tuple[int, int]]
+
+    _task: asyncio.Task | None
+
+    def __init__(self, parser: CommandParser, package_name: str = "commands", interval: float = 2.0, available_gateway_data: GatewayData | None = None):
+        self._parser = parser
+        self._package_name = package_name
+        self._interval = interval
+        self._available_gateway_data = available_gateway_data
+        self._module_states = self._scan()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._interval)
+            self.poll()
+
+    def poll(self) -> list[str]:
+        """
+        Reloads modules which were changed, added or deleted since the last poll.
+
+        :return: names of modules whose commands were swapped
+        """
+
+        module_states = self._scan()
+        changed_modules = [module_name for module_name, state in module_states.items() if self._module_states.get(module_name) != state]
+        deleted_modules = [module_name for module_name in self._module_states if module_name not in module_states]
+
+        # a module which failed to reload isn't retried until it is changed again
+        self._module_states = module_states
+
+        reloaded_modules = []
+        for module_name in changed_modules + deleted_modules:
+            try:
+                self.reload_module(module_name)
+            except Exception:
+                logger.exception("Reloading module %s failed, its previous commands stay registered", module_name)
+            else:
+                reloaded_modules.append(module_name)
+
+        return reloaded_modules
+
+    def reload_module(self, module_name: str):
+        """
+        Imports the module again (or forgets it if it was deleted) and swaps its commands in the parser.
+
+        :raises AmbiguousCommandError: if a new command has the same name as a command of another module
+        :raises Exception: anything raised by the module while it is imported
+        """
+
+        old_commands = [command for command in self._parser.registered_commands() if command.module_name() == module_name]
+
+        # commands created by the module register themselves, they are forgotten again if anything fails
+        created_before = len(CREATED_COMMANDS)
+        try:
+            if module_name in self._scan():
+                # finders cache listings of directories, a module created after the last import may not be found otherwise
+                importlib.invalidate_caches()
+                module = sys.modules.get(module_name)
+                module = importlib.import_module(module_name) if module is None else importlib.reload(module)
+                new_commands = list(dict.fromkeys(
+                    value for value in vars(module).values() if isinstance(value, Command) and value.module_name() == module_name
+                ))
+            else:
+                sys.modules.pop(module_name, None)
+                new_commands = []
+
+            self._parser.swap_commands(old_commands, new_commands)
+        except Exception:
+            del CREATED_COMMANDS[created_before:]
+            raise
+
+        removed_commands = {
+            id(command.resolve() if isinstance(command, LazyCommand) else command)
+            for command in old_commands if not isinstance(command, LazyCommand) or command.is_resolved()
+        }
+        CREATED_COMMANDS[:] = [command for command in CREATED_COMMANDS if id(command) not in removed_commands]
+
+        if self._available_gateway_data is not None:
+            for command in new_commands:
+                missing_gateway_data = command.required_gateway_data() & ~self._available_gateway_data
+                if missing_gateway_data:
+                    logger.warning("Command %s needs %s which the bot doesn't receive until it is restarted", command.name(), missing_gateway_data)
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        module_states: dict[str, tuple[int, int]] = {}
+        for file_name, module_path in package_module_paths(self._package_name).items():
+            if file_name == "__init__.py":
+                continue
+            try:
+                module_stat = os.stat(module_path)
+            except FileNotFoundError:
+                continue
+            module_states[f"{self._package_name}.{file_name[:-3]}"] = (module_stat.st_mtime_ns, module_stat.st_size)
+        return module_states
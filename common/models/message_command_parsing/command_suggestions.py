@@ -0,0 +1,110 @@
+from collections import Counter
+from itertools import chain
+
+from common.models.message_command_parsing.command import Command
+import Levenshtein
+
+# minimal similarity of names for a command to be suggested
+MIN_SUGGESTION_SIMILARITY = 0.6
+
+# amount of commands (sharing the most trigrams with the searched name) whose similarity is fully computed
+SUGGESTION_CANDIDATES = 8
+
+
+class CommandSuggestionIndex:
+    """
+    Trigram index of command names of a single prefix, used for "did you mean" suggestions.
+
+    Instead of computing similarity of the searched name with every command, only commands sharing
+    the most trigrams with it are compared.
+    """
+
+    _case_sensitive: bool
+
+    # commands and their (case folded) names, removed commands leave None in their place until the lists are compacted
+    _commands: list[Command | None]
+    _names: list[str | None]
+    _command_indexes: dict[Command, int]
+
+    # count of None placeholders in the lists
+    _removed_count: int
+
+    # trigram -> indexes of commands whose names contain it
+    _trigrams: dict[str, set[int]]
+
+    def __init__(self, case_sensitive: bool):
+        self._case_sensitive = case_sensitive
+        self._commands = []
+        self._names = []
+        self._command_indexes = {}
+        self._trigrams = {}
+        self._removed_count = 0
+
+    def add(self, command: Command):
+        name = self._fold(command.name())
+        command_i = len(self._commands)
+        self._commands.append(command)
+        self._names.append(name)
+        self._command_indexes[command] = command_i
+
+        for trigram in self._get_trigrams(name):
+            self._trigrams.setdefault(trigram, set()).add(command_i)
+
+    def remove(self, command: Command):
+        command_i = self._command_indexes.pop(command, None)
+        if command_i is None:
+            return
+
+        for trigram in self._get_trigrams(self._names[command_i]):
+            trigram_commands = self._trigrams[trigram]
+            trigram_commands.discard(command_i)
+            if not trigram_commands:
+                del self._trigrams[trigram]
+        self._commands[command_i] = None
+        self._names[command_i] = None
+        self._removed_count += 1
+
+        # reloaded modules remove and add their commands again and again, placeholders would pile up otherwise
+        if self._removed_count * 2 > len(self._commands):
+            self._compact()
+
+    def _compact(self):
+        commands = [command for command in self._commands if command is not None]
+        self._commands = []
+        self._names = []
+        self._command_indexes = {}
+        self._trigrams = {}
+        self._removed_count = 0
+        for command in commands:
+            self.add(command)
+
+    def find_most_similar(self, command_name: str) -> Command | None:
+        command_name = self._fold(command_name)
+
+        # counting is done by Counter in C, posting sets are only chained together here
+        shared_trigrams = Counter(chain.from_iterable(self._trigrams.get(trigram, ()) for trigram in self._get_trigrams(command_name)))
+
+        candidates = [command_i for command_i, _ in shared_trigrams.most_common(SUGGESTION_CANDIDATES)]
+
+        best_command: Command | None = None
+        best_similarity: float = MIN_SUGGESTION_SIMILARITY
+        for command_i in candidates:
+            similarity = Levenshtein.ratio(command_name, self._names[command_i])
+            if similarity > best_similarity:
+                best_similarity = similarity
+                best_command = self._commands[command_i]
+
+        return best_command
+
+    def __len__(self):
+        return len(self._command_indexes)
+
+    def _fold(self, command_name: str) -> str:
+        command_name = " ".join(command_name.split())
+        return command_name if self._case_sensitive else command_name.lower()
+
+    @staticmethod
+    def _get_trigrams(name: str) -> set[str]:
+        # padding lets the first and the last characters take part in as many trigrams as all the others
+        padded_name = f"  {name}  "
+        return {padded_name[i: i + 3] for i in range(len(padded_name) - 2)}
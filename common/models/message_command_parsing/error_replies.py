@@ -0,0 +1,84 @@
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+from common.models.message_command_parsing.parse_outcome import ParseOutcome, ParseOutcomeKind
+
+
+class _SenderReplies:
+    __slots__ = ("window_start", "replies_count", "replied_failures")
+
+    window_start: float
+    replies_count: int
+
+    # (outcome kind, command string) of failures replied in the current window
+    replied_failures: set[tuple[ParseOutcomeKind, str]]
+
+    def __init__(self, window_start: float):
+        self.window_start = window_start
+        self.replies_count = 0
+        self.replied_failures = set()
+
+
+class ErrorReplyThrottle:
+    """
+    Decides which failed parses are answered, so spammed bad input doesn't turn into one REST call per message.
+
+    Replies are limited per user in a channel: the same failure of the same message is answered only once per
+    window and at most max_replies failures are answered per window, all the others are dropped silently.
+    """
+
+    _window: float
+    _max_replies: int
+
+    # (channel id, author id) -> replies of the current window, ordered from the least recently used
+    _senders: OrderedDict[Hashable, _SenderReplies]
+    _senders_limit: int
+
+    _suppressed_count: int
+
+    def __init__(self, window: float = 10.0, max_replies: int = 3, senders_limit: int = 10000):
+        if window <= 0 or max_replies <= 0:
+            raise ValueError("Reply window and amount of replies must be positive")
+
+        self._window = window
+        self._max_replies = max_replies
+        self._senders = OrderedDict()
+        self._senders_limit = senders_limit
+        self._suppressed_count = 0
+
+    def should_reply(self, execution_context, outcome: ParseOutcome) -> bool:
+        """
+        Records the reply if it is allowed, so it has to be called only once per outcome.
+
+        :return: True if the failure should be answered, always False for outcomes which aren't failures
+        """
+
+        if not outcome.is_error():
+            return False
+
+        key = (getattr(execution_context, "channel_id", None), getattr(execution_context, "author_id", None))
+        now = time.monotonic()
+
+        sender = self._senders.get(key)
+        if sender is None or now - sender.window_start >= self._window:
+            sender = _SenderReplies(now)
+            self._senders[key] = sender
+            if len(self._senders) > self._senders_limit:
+                # the least recently used sender is the most likely to have its window already expired
+                self._senders.popitem(last=False)
+        self._senders.move_to_end(key)
+
+        failure = (outcome.kind, outcome.command_string)
+        if sender.replies_count >= self._max_replies or failure in sender.replied_failures:
+            self._suppressed_count += 1
+            return False
+
+        sender.replies_count += 1
+        sender.replied_failures.add(failure)
+        return True
+
+    #----- Throttle Properties ------#
+
+    def suppressed_count(self) -> int:
+        return self._suppressed_count
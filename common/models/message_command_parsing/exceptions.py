@@ -18,4 +18,42 @@ class CommandNotFoundError(Exception):
         if most_similar_command_name is None:
             super().__init__(f"Cannot find command with name of \"{command_name}\"")
         else:
-            super().__init__(f"Cannot find command with name of \"{command_name}\" (do you mean \"{most_similar_command_name}\"?)")
\ No newline at end of file
+            super().__init__(f"Cannot find command with name of \"{command_name}\" (do you mean \"{most_similar_command_name}\"?)")
+
+class UnknownArgumentError(Exception):
+    def __init__(self, param_name: str):
+        super().__init__(f"Unknown argument \"{param_name}\"")
+
+class DuplicateArgumentError(Exception):
+    def __init__(self, param_name: str):
+        super().__init__(f"Argument \"{param_name}\" was given more than once")
+
+class CommandOnCooldownError(Exception):
+    retry_after: float
+
+    def __init__(self, command_name: str, retry_after: float):
+        super().__init__(f"Command \"{command_name}\" is on cooldown, try again in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+class CommandBusyError(Exception):
+    def __init__(self):
+        super().__init__("Too many commands are waiting, try again later")
+
+class LiteralSyntaxError(SyntaxError):
+    expr: str
+
+    # offset in expr, not in the whole command string
+    position: int
+
+    def __init__(self, message: str, expr: str, position: int):
+        super().__init__(f"{message} at position {position}: {expr}")
+        self.expr = expr
+        self.position = position
+
+class StaleManifestError(Exception):
+    def __init__(self, command_name: str, module_name: str):
+        super().__init__(f"Command \"{command_name}\" listed in the manifest wasn't found in module \"{module_name}\", the manifest has to be generated again")
+
+class PipelineTooLongError(SyntaxError):
+    def __init__(self, max_length: int, separator: str):
+        super().__init__(f"Too many commands in one message, at most {max_length} can be chained with \"{separator}\"")
@@ -0,0 +1,98 @@
+import asyncio
+import importlib
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from enum import Enum
+from functools import partial
+from typing import Any
+
+
+class ExecutionMode(Enum):
+    # coroutine functions are awaited and plain functions are called directly on the event loop
+    INLINE = "inline"
+
+    # plain function is called in a thread pool, for blocking work (I/O, blocking libraries)
+    THREAD = "thread"
+
+    # plain function is called in a process pool, for CPU bound work (e.g. battle simulations)
+    PROCESS = "process"
+
+
+def _invoke_in_process(module_name: str, command_attribute: str, kwargs: dict[str, Any]) -> Any:
+    # decorated function is replaced in its module by the Command, so the command is looked up instead of pickling the function
+    command = getattr(importlib.import_module(module_name), command_attribute)
+    return command.invoke(**kwargs)
+
+
+class ExecutionPools:
+    """
+    Thread and process pools running commands which can't be run on the event loop.
+
+    Pools are created when the first command needs them.
+    """
+
+    _thread_pool_size: int
+    _process_pool_size: int
+
+    _thread_pool: ThreadPoolExecutor | None
+    _process_pool: ProcessPoolExecutor | None
+
+    # submitted and not yet finished invocations of each pool
+    _queue_depth: dict[ExecutionMode, int]
+
+    _is_shut_down: bool
+
+    def __init__(self, thread_pool_size: int = 4, process_pool_size: int = 2):
+        self._thread_pool_size = thread_pool_size
+        self._process_pool_size = process_pool_size
+        self._thread_pool = None
+        self._process_pool = None
+        self._queue_depth = {ExecutionMode.THREAD: 0, ExecutionMode.PROCESS: 0}
+        self._is_shut_down = False
+
+    async def invoke(self, command, kwargs: dict[str, Any]) -> Any:
+        """
+        Runs the command in the way declared by its execution mode.
+
+        :return: value returned by the command
+        """
+
+        mode = command.execution_mode()
+        if mode is ExecutionMode.INLINE:
+            return await command.invoke_async(**kwargs)
+
+        if mode is ExecutionMode.THREAD:
+            call = partial(command.invoke, **kwargs)
+        else:
+            call = partial(_invoke_in_process, command.module_name(), command.attribute_name(), kwargs)
+
+        self._queue_depth[mode] += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(mode), call)
+        finally:
+            self._queue_depth[mode] -= 1
+
+    def _get_executor(self, mode: ExecutionMode) -> Executor:
+        if self._is_shut_down:
+            raise RuntimeError("Execution pools were shut down")
+
+        if mode is ExecutionMode.THREAD:
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(self._thread_pool_size, thread_name_prefix="command")
+            return self._thread_pool
+
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(self._process_pool_size)
+        return self._process_pool
+
+    def queue_depth(self) -> dict[ExecutionMode, int]:
+        return dict(self._queue_depth)
+
+    def shutdown(self, wait: bool = True):
+        """
+        Waits for running commands (if wait is True) and stops the pools, commands submitted later will be rejected.
+        """
+
+        self._is_shut_down = True
+        for pool in (self._thread_pool, self._process_pool):
+            if pool is not None:
+                pool.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,41 @@
+from enum import Flag, auto
+
+
+class GatewayData(Flag):
+    """
+    Data received from the discord gateway which a command needs, the bot subscribes to (intents) and caches
+    only the data needed by its registered commands.
+    """
+
+    NONE = 0
+
+    # content of guild messages, every message command needs it to be parsed at all
+    MESSAGE_CONTENT = auto()
+
+    # guild members, their nicknames and roles
+    MEMBERS = auto()
+
+    # roles of guilds, their names, colors and permissions
+    ROLES = auto()
+
+    # channels and threads of guilds
+    CHANNELS = auto()
+
+    # recently sent messages, e.g. to look up a message which was replied to
+    MESSAGE_HISTORY = auto()
+
+    # reactions added to and removed from messages
+    REACTIONS = auto()
+
+    # online statuses and activities of members
+    PRESENCES = auto()
+
+    # members connected to voice channels
+    VOICE_STATES = auto()
+
+    # custom emojis and stickers of guilds
+    EMOJIS = auto()
+
+
+# every message command is parsed from the content of a guild message
+MESSAGE_COMMAND_GATEWAY_DATA = GatewayData.MESSAGE_CONTENT
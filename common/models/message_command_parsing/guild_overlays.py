@@ -0,0 +1,273 @@
+import asyncio
+import logging
+import sys
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable, Iterable
+
+logger = logging.getLogger(__name__)
+
+# limits of a single guild, together with the count of cached overlays they bound memory taken by overlays
+MAX_GUILD_PREFIXES = 5
+MAX_GUILD_ALIASES = 25
+
+
+class GuildConfiguration:
+    """
+    Prefixes and aliases a guild configured on top of the commands of the bot, returned by the loader of GuildOverlays.
+    """
+
+    # custom prefix -> registered prefix it stands for, e.g. {"?": "!rpg"}
+    prefixes: dict[str, str]
+
+    # registered prefix -> alias -> words the alias stands for, e.g. {"!rpg": {"inv": "profile", "hp": "buy potion"}}
+    aliases: dict[str, dict[str, str]]
+
+    def __init__(self, prefixes: dict[str, str] | None = None, aliases: dict[str, dict[str, str]] | None = None):
+        self.prefixes = prefixes if prefixes is not None else {}
+        self.aliases = aliases if aliases is not None else {}
+
+
+class GuildOverlay:
+    """
+    Compiled configuration of a single guild. Prefixes resolve to registered prefixes and aliases to words which
+    replace them in the message, both with a single dictionary lookup, the commands themselves are found in the
+    index shared by all guilds.
+    """
+
+    __slots__ = ("_prefixes", "_aliases")
+
+    # custom prefix -> registered prefix
+    _prefixes: dict[str, str]
+
+    # (registered prefix, alias) -> words of the command name (and arguments) the alias stands for
+    _aliases: dict[tuple[str, str], tuple[str, ...]]
+
+    def __init__(self, prefixes: dict[str, str], aliases: dict[tuple[str, str], tuple[str, ...]]):
+        self._prefixes = prefixes
+        self._aliases = aliases
+
+    @staticmethod
+    def compile(configuration: GuildConfiguration, case_sensitive: bool) -> "GuildOverlay":
+        """
+        Prefixes with whitespaces and aliases which aren't a single word are left out, as are prefixes and aliases
+        over the limits.
+        """
+
+        if not configuration.prefixes and not configuration.aliases:
+            return EMPTY_GUILD_OVERLAY
+
+        # prefixes and words are shared by many guilds, interned strings are stored only once
+        prefixes = {}
+        for custom_prefix, registered_prefix in configuration.prefixes.items():
+            if len(prefixes) == MAX_GUILD_PREFIXES:
+                break
+            if custom_prefix and not any(c.isspace() for c in custom_prefix):
+                prefixes[sys.intern(custom_prefix)] = sys.intern(registered_prefix)
+
+        aliases = {}
+        for registered_prefix, prefix_aliases in configuration.aliases.items():
+            for alias, command_words in prefix_aliases.items():
+                if len(aliases) == MAX_GUILD_ALIASES:
+                    break
+                words = command_words.split()
+                if len(alias.split()) != 1 or not words:
+                    continue
+                alias = alias.strip() if case_sensitive else alias.strip().lower()
+                aliases[(sys.intern(registered_prefix), sys.intern(alias))] = tuple(sys.intern(word) for word in words)
+
+        return GuildOverlay(prefixes, aliases)
+
+    def registered_prefix(self, prefix: str) -> str | None:
+        """
+        :return: registered prefix the custom prefix stands for, None if the guild doesn't have such prefix
+        """
+
+        return self._prefixes.get(prefix)
+
+    def alias(self, registered_prefix: str, word: str) -> tuple[str, ...] | None:
+        """
+        :param word: first word after the prefix, lowercased if commands aren't case sensitive
+        :return: words the alias stands for, None if the word isn't an alias
+        """
+
+        return self._aliases.get((registered_prefix, word))
+
+    #----- Overlay Properties ------#
+
+    def custom_prefixes(self) -> tuple[str, ...]:
+        return tuple(self._prefixes)
+
+    def has_aliases(self) -> bool:
+        return bool(self._aliases)
+
+    def is_empty(self) -> bool:
+        return not self._prefixes and not self._aliases
+
+
+# shared by all guilds which didn't configure anything, which are most of them
+EMPTY_GUILD_OVERLAY = GuildOverlay({}, {})
+
+
+class GuildOverlays:
+    """
+    Overlays of guilds which sent messages recently, on top of the commands registered in the parser.
+
+    Overlays are loaded when a guild sends a message for the first time (or after its overlay was evicted) and kept
+    in a bounded store, the least recently used are evicted first. An overlay has to be invalidated when its guild
+    changes the configuration, it is loaded again with the next message.
+
+    Most guilds don't configure anything. Once the guilds with a configuration are known (see set_configured_guilds),
+    the other guilds get the empty overlay without a load and without taking an entry in the store, so they can't
+    evict overlays of configured guilds. Until then every guild is loaded.
+    """
+
+    # guild id -> configuration of the guild, None if the guild has none
+    _loader: Callable[[Hashable], Awaitable[GuildConfiguration | None]]
+
+    _max_overlays: int
+    _case_sensitive: bool
+
+    # guild id -> overlay, ordered from the least recently used
+    _overlays: OrderedDict
+
+    # guilds whose configuration is being loaded, messages of the same guild wait for the same load
+    _loading: dict[Hashable, asyncio.Task]
+
+    # ids of guilds which have a configuration, None if they aren't known yet
+    _configured_guilds: set[Hashable] | None
+
+    _loaded_count: int
+    _evicted_count: int
+    _invalidated_count: int
+    _failed_count: int
+
+    def __init__(self, loader: Callable[[Hashable], Awaitable[GuildConfiguration | None]], max_overlays: int = 10000, case_sensitive: bool = False):
+        if max_overlays <= 0:
+            raise ValueError("Guild overlays must have room for at least one overlay")
+
+        self._loader = loader
+        self._max_overlays = max_overlays
+        self._case_sensitive = case_sensitive
+        self._overlays = OrderedDict()
+        self._loading = {}
+        self._configured_guilds = None
+
+        self._loaded_count = 0
+        self._evicted_count = 0
+        self._invalidated_count = 0
+        self._failed_count = 0
+
+    def cached(self, guild_id: Hashable) -> GuildOverlay | None:
+        """
+        :return: overlay of the guild if it is loaded or the guild has no configuration, None otherwise
+        """
+
+        if self._configured_guilds is not None and guild_id not in self._configured_guilds:
+            return EMPTY_GUILD_OVERLAY
+
+        overlay = self._overlays.get(guild_id)
+        if overlay is not None:
+            self._overlays.move_to_end(guild_id)
+        return overlay
+
+    async def get(self, guild_id: Hashable) -> GuildOverlay:
+        """
+        :return: overlay of the guild, the empty overlay if its configuration couldn't be loaded (commands keep
+            working with registered prefixes and names then, the load is retried with the next message)
+        """
+
+        overlay = self.cached(guild_id)
+        if overlay is not None:
+            return overlay
+
+        loading = self._loading.get(guild_id)
+        if loading is None:
+            loading = asyncio.get_running_loop().create_task(self._load(guild_id))
+            self._loading[guild_id] = loading
+
+        # a cancelled message doesn't cancel the load other messages of the guild may wait for
+        return await asyncio.shield(loading)
+
+    async def _load(self, guild_id: Hashable) -> GuildOverlay:
+        task = asyncio.current_task()
+        try:
+            configuration = await self._loader(guild_id)
+        except Exception:
+            self._failed_count += 1
+            logger.exception("Configuration of guild %s couldn't be loaded", guild_id)
+            return EMPTY_GUILD_OVERLAY
+        finally:
+            if self._loading.get(guild_id) is task:
+                del self._loading[guild_id]
+            else:
+                # the guild was invalidated during the load, the configuration may be already outdated
+                task = None
+
+        overlay = EMPTY_GUILD_OVERLAY if configuration is None else GuildOverlay.compile(configuration, self._case_sensitive)
+        if task is None or (self._configured_guilds is not None and guild_id not in self._configured_guilds):
+            return overlay
+
+        self._overlays[guild_id] = overlay
+        self._loaded_count += 1
+        while len(self._overlays) > self._max_overlays:
+            self._overlays.popitem(last=False)
+            self._evicted_count += 1
+        return overlay
+
+    def invalidate(self, guild_id: Hashable):
+        """
+        Forgets the overlay of the guild, its configuration is loaded again with the next message of the guild.
+        """
+
+        self._loading.pop(guild_id, None)
+        if self._overlays.pop(guild_id, None) is not None:
+            self._invalidated_count += 1
+
+    def set_configured_guilds(self, guild_ids: Iterable[Hashable]):
+        """
+        Only the given guilds have their configuration loaded from now on, overlays of other guilds are forgotten.
+        """
+
+        self._configured_guilds = set(guild_ids)
+        for guild_id in [guild_id for guild_id in self._overlays if guild_id not in self._configured_guilds]:
+            del self._overlays[guild_id]
+
+    def set_configured(self, guild_id: Hashable, configured: bool):
+        """
+        Records whether the guild has a configuration after it changed it, has no effect until the guilds with a
+        configuration are known. The overlay of the guild still has to be invalidated.
+        """
+
+        if self._configured_guilds is None:
+            return
+        if configured:
+            self._configured_guilds.add(guild_id)
+        else:
+            self._configured_guilds.discard(guild_id)
+
+    def clear(self):
+        self._loading.clear()
+        self._overlays.clear()
+
+    #----- Overlays Properties ------#
+
+    def overlays_count(self) -> int:
+        return len(self._overlays)
+
+    def max_overlays(self) -> int:
+        return self._max_overlays
+
+    def configured_count(self) -> int | None:
+        return None if self._configured_guilds is None else len(self._configured_guilds)
+
+    def loaded_count(self) -> int:
+        return self._loaded_count
+
+    def evicted_count(self) -> int:
+        return self._evicted_count
+
+    def invalidated_count(self) -> int:
+        return self._invalidated_count
+
+    def failed_count(self) -> int:
+        return self._failed_count
@@ -0,0 +1,143 @@
+import re
+
+from common.models.message_command_parsing.exceptions import LiteralSyntaxError
+
+# nested lists/dicts deeper than this are rejected instead of exhausting the interpreter stack
+MAX_LITERAL_DEPTH = 100
+
+_WHITESPACES = " \t\n"
+
+# patterns finding the end of an unquoted value for every set of characters which can terminate it
+_SCALAR_ENDS: dict[str, re.Pattern] = {
+    terminators: re.compile("[" + re.escape(terminators + "[{") + "]") for terminators in ("", ",]", ",}", ":,}")
+}
+
+
+def parse_literal(expr: str) -> str | list | dict:
+    """
+    Parses list ([a, b]) and dict ({key: value}) literals in a single pass.
+
+    Values which are neither lists nor dicts are returned as stripped raw strings (quoted strings keep
+    their quotes), so they can be converted into the target type later.
+
+    :raises LiteralSyntaxError: if the literal is malformed, the error contains offset of the problem
+    """
+
+    reader = _LiteralReader(expr)
+    value = reader.read_value(0, "")
+    reader.skip_whitespaces()
+    if reader.position != len(expr):
+        raise reader.error(f"Unexpected \"{expr[reader.position]}\"")
+
+    return value
+
+
+class _LiteralReader:
+    __slots__ = ("expr", "position")
+
+    expr: str
+    position: int
+
+    def __init__(self, expr: str):
+        self.expr = expr
+        self.position = 0
+
+    def error(self, message: str, position: int | None = None) -> LiteralSyntaxError:
+        return LiteralSyntaxError(message, self.expr, self.position if position is None else position)
+
+    def skip_whitespaces(self):
+        expr = self.expr
+        position = self.position
+        while position < len(expr) and expr[position] in _WHITESPACES:
+            position += 1
+        self.position = position
+
+    def read_value(self, depth: int, terminators: str) -> str | list | dict:
+        self.skip_whitespaces()
+        if self.position == len(self.expr):
+            raise self.error("Expected value")
+
+        c = self.expr[self.position]
+        if c == '[' or c == '{':
+            if depth == MAX_LITERAL_DEPTH:
+                raise self.error("Literal is nested too deeply")
+            return self.read_list(depth + 1) if c == '[' else self.read_dict(depth + 1)
+
+        return self.read_scalar(terminators)
+
+    def read_list(self, depth: int) -> list:
+        # skip "["
+        self.position += 1
+        elements: list = []
+
+        self.skip_whitespaces()
+        if self.position < len(self.expr) and self.expr[self.position] == ']':
+            self.position += 1
+            return elements
+
+        while True:
+            elements.append(self.read_value(depth, ",]"))
+            if self.read_separator("]"):
+                return elements
+
+    def read_dict(self, depth: int) -> dict:
+        # skip "{"
+        self.position += 1
+        elements: dict = {}
+
+        self.skip_whitespaces()
+        if self.position < len(self.expr) and self.expr[self.position] == '}':
+            self.position += 1
+            return elements
+
+        while True:
+            key_position = self.position
+            key = self.read_scalar(":,}")
+            if self.position == len(self.expr) or self.expr[self.position] != ':':
+                raise self.error("Expected \":\"")
+            if key in elements:
+                raise self.error(f"Duplicated key \"{key}\"", key_position)
+
+            self.position += 1
+            elements[key] = self.read_value(depth, ",}")
+            if self.read_separator("}"):
+                return elements
+
+    def read_separator(self, closing: str) -> bool:
+        """
+        :return: True if the closing character was read, False if it was a comma
+        """
+
+        self.skip_whitespaces()
+        if self.position == len(self.expr):
+            raise self.error(f"Expected \"{closing}\"")
+
+        c = self.expr[self.position]
+        self.position += 1
+        if c == closing:
+            return True
+        if c != ',':
+            raise self.error(f"Expected \",\" or \"{closing}\"", self.position - 1)
+        return False
+
+    def read_scalar(self, terminators: str) -> str:
+        self.skip_whitespaces()
+        expr = self.expr
+        start = self.position
+
+        if start < len(expr) and expr[start] == '"':
+            end = expr.find('"', start + 1)
+            if end == -1:
+                raise self.error("Expected \"\"\"", len(expr) - 1)
+            self.position = end + 1
+            return expr[start: end + 1]
+
+        scalar_end = _SCALAR_ENDS[terminators].search(expr, start)
+        position = len(expr) if scalar_end is None else scalar_end.start()
+
+        value = expr[start: position].rstrip(_WHITESPACES)
+        if not value:
+            raise self.error("Expected value", position)
+
+        self.position = position
+        return value
@@ -0,0 +1,213 @@
+import time
+from bisect import bisect_left
+
+from common.models.message_command_parsing.parse_outcome import ParseOutcomeKind
+
+
+# parse stages in the order they are run
+PARSE_STAGES = ("tokenize", "keywords", "lookup", "conversion", "invocation")
+_NEXT_STAGES = dict(zip(PARSE_STAGES, PARSE_STAGES[1:]))
+
+# upper bounds of histogram buckets in seconds
+DEFAULT_BUCKETS = (
+    1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0,
+)
+
+
+class Histogram:
+    __slots__ = ("_bounds_ns", "_counts", "_sum_ns", "_count")
+
+    _bounds_ns: tuple[int, ...]
+
+    # count of values of each bucket (not cumulative), the last one counts values above the last bound
+    _counts: list[int]
+    _sum_ns: int
+    _count: int
+
+    def __init__(self, bounds_ns: tuple[int, ...]):
+        self._bounds_ns = bounds_ns
+        self._counts = [0] * (len(bounds_ns) + 1)
+        self._sum_ns = 0
+        self._count = 0
+
+    def record(self, value_ns: int):
+        self._counts[bisect_left(self._bounds_ns, value_ns)] += 1
+        self._sum_ns += value_ns
+        self._count += 1
+
+    def merge(self, other: "Histogram"):
+        self._counts = [count + other_count for count, other_count in zip(self._counts, other._counts)]
+        self._sum_ns += other._sum_ns
+        self._count += other._count
+
+    def quantile(self, fraction: float) -> float:
+        """
+        :return: upper bound (in seconds) of the bucket containing the quantile
+        """
+
+        target = fraction * self._count
+        cumulative = 0
+        for bucket_i, bucket_count in enumerate(self._counts):
+            cumulative += bucket_count
+            if cumulative >= target and bucket_count:
+                return self._bounds_ns[bucket_i] / 1e9 if bucket_i < len(self._bounds_ns) else float("inf")
+        return 0.0
+
+    def count(self) -> int:
+        return self._count
+
+
+class StageTimer:
+    """
+    Measures consecutive stages of a single parse.
+    """
+
+    __slots__ = ("command_name", "stage_times", "failed_stage", "_last_mark")
+
+    command_name: str
+    stage_times: list[tuple[str, int]]
+
+    # stage which was running when the parse stopped
+    failed_stage: str
+
+    def __init__(self):
+        self.command_name = ""
+        self.stage_times = []
+        self.failed_stage = PARSE_STAGES[0]
+        self._last_mark = time.perf_counter_ns()
+
+    def mark(self, finished_stage: str):
+        now = time.perf_counter_ns()
+        self.stage_times.append((finished_stage, now - self._last_mark))
+        self._last_mark = now
+
+        self.failed_stage = _NEXT_STAGES.get(finished_stage, finished_stage)
+
+
+class ParseMetrics:
+    """
+    In-memory histograms of parse stage durations (per command) and counters of parse outcomes.
+    """
+
+    _bounds: tuple[float, ...]
+    _bounds_ns: tuple[int, ...]
+
+    # (command name, stage) -> histogram, command name is empty for messages which didn't resolve any command
+    _stage_histograms: dict[tuple[str, str], Histogram]
+
+    # (command name, outcome) -> count
+    _outcomes: dict[tuple[str, ParseOutcomeKind], int]
+
+    def __init__(self, bounds: tuple[float, ...] = DEFAULT_BUCKETS):
+        self._bounds = bounds
+        self._bounds_ns = tuple(int(bound * 1e9) for bound in bounds)
+        self._stage_histograms = {}
+        self._outcomes = {}
+
+    def start(self) -> StageTimer:
+        return StageTimer()
+
+    def record(self, timer: StageTimer, outcome: ParseOutcomeKind):
+        for stage, duration_ns in timer.stage_times:
+            histogram = self._stage_histograms.get((timer.command_name, stage))
+            if histogram is None:
+                histogram = Histogram(self._bounds_ns)
+                self._stage_histograms[(timer.command_name, stage)] = histogram
+            histogram.record(duration_ns)
+
+        outcome_key = (timer.command_name, outcome)
+        self._outcomes[outcome_key] = self._outcomes.get(outcome_key, 0) + 1
+
+    def record_outcome(self, outcome: ParseOutcomeKind, command_name: str = ""):
+        outcome_key = (command_name, outcome)
+        self._outcomes[outcome_key] = self._outcomes.get(outcome_key, 0) + 1
+
+    def merge(self, other: "ParseMetrics"):
+        """
+        Adds measurements of other metrics (e.g. of another worker process) to these ones.
+
+        :raises ValueError: if the metrics have different histogram buckets
+        """
+
+        if other._bounds != self._bounds:
+            raise ValueError("Metrics with different histogram buckets can't be merged")
+
+        for histogram_key, histogram in other._stage_histograms.items():
+            own_histogram = self._stage_histograms.get(histogram_key)
+            if own_histogram is None:
+                own_histogram = Histogram(self._bounds_ns)
+                self._stage_histograms[histogram_key] = own_histogram
+            own_histogram.merge(histogram)
+
+        for outcome_key, count in other._outcomes.items():
+            self._outcomes[outcome_key] = self._outcomes.get(outcome_key, 0) + count
+
+    def outcome_counts(self) -> dict[ParseOutcomeKind, int]:
+        counts: dict[ParseOutcomeKind, int] = {}
+        for (_, outcome), count in self._outcomes.items():
+            counts[outcome] = counts.get(outcome, 0) + count
+        return counts
+
+    def render_prometheus(self, namespace: str = "rpgbot") -> str:
+        """
+        :return: all metrics in Prometheus text exposition format
+        """
+
+        lines: list[str] = [
+            f"# HELP {namespace}_parse_outcomes_total Parsed messages by outcome.",
+            f"# TYPE {namespace}_parse_outcomes_total counter",
+        ]
+        for (command_name, outcome), count in sorted(self._outcomes.items(), key=lambda item: (item[0][0], item[0][1].value)):
+            lines.append(f'{namespace}_parse_outcomes_total{{command="{_escape_label(command_name)}",outcome="{outcome.value}"}} {count}')
+
+        lines.append(f"# HELP {namespace}_parse_stage_seconds Duration of parse stages.")
+        lines.append(f"# TYPE {namespace}_parse_stage_seconds histogram")
+        for (command_name, stage), histogram in sorted(self._stage_histograms.items()):
+            labels = f'command="{_escape_label(command_name)}",stage="{stage}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self._bounds, histogram._counts):
+                cumulative += bucket_count
+                lines.append(f'{namespace}_parse_stage_seconds_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+            lines.append(f'{namespace}_parse_stage_seconds_bucket{{{labels},le="+Inf"}} {histogram._count}')
+            lines.append(f"{namespace}_parse_stage_seconds_sum{{{labels}}} {histogram._sum_ns / 1e9:.9f}")
+            lines.append(f"{namespace}_parse_stage_seconds_count{{{labels}}} {histogram._count}")
+
+        return "\n".join(lines) + "\n"
+
+    def render_summary(self) -> str:
+        """
+        :return: short human readable summary (outcome counts and stage latencies of all commands together)
+        """
+
+        lines = ["**Outcomes**"]
+        for outcome, count in sorted(self.outcome_counts().items(), key=lambda item: -item[1]):
+            lines.append(f"{outcome.value}: {count}")
+
+        lines.append("**Stages** (p50 / p99)")
+        for stage in PARSE_STAGES:
+            merged = Histogram(self._bounds_ns)
+            for (_, histogram_stage), histogram in self._stage_histograms.items():
+                if histogram_stage == stage:
+                    merged.merge(histogram)
+            if merged.count():
+                lines.append(f"{stage}: {self._format_quantile(merged.quantile(0.5))} / {self._format_quantile(merged.quantile(0.99))}")
+
+        return "\n".join(lines)
+
+    def _format_quantile(self, upper_bound: float) -> str:
+        # quantiles in the overflow bucket are only known to be over the last bound
+        if upper_bound == float("inf"):
+            return f">{_format_seconds(self._bounds[-1])}"
+        return f"<{_format_seconds(upper_bound)}"
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:g}s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:g}ms"
+    return f"{seconds * 1e6:g}us"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
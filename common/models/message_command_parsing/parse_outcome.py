@@ -0,0 +1,109 @@
+from enum import Enum
+from typing import Callable
+
+from common.models.message_command_parsing.exceptions import *
+
+
+class ParseOutcomeKind(Enum):
+    SUCCESS = "success"
+    NOT_A_COMMAND = "not_a_command"
+    NOT_FOUND = "not_found"
+    SYNTAX_ERROR = "syntax_error"
+    MISSING_ARGUMENT = "missing_argument"
+    REDUNDANT_ARGUMENT = "redundant_argument"
+    INVALID_ARGUMENT = "invalid_argument"
+    ON_COOLDOWN = "on_cooldown"
+    BUSY = "busy"
+    COMMAND_ERROR = "command_error"
+
+
+def classify_parse_error(error: Exception, failed_stage: str) -> ParseOutcomeKind:
+    # anything raised by the command itself is its own error, even if it is e.g. a SyntaxError
+    if failed_stage == "invocation":
+        return ParseOutcomeKind.COMMAND_ERROR
+    if isinstance(error, CommandNotFoundError):
+        return ParseOutcomeKind.NOT_FOUND
+    if isinstance(error, MissingArgumentError):
+        return ParseOutcomeKind.MISSING_ARGUMENT
+    if isinstance(error, RedundantArgumentError):
+        return ParseOutcomeKind.REDUNDANT_ARGUMENT
+    if isinstance(error, CommandOnCooldownError):
+        return ParseOutcomeKind.ON_COOLDOWN
+    if isinstance(error, CommandBusyError):
+        return ParseOutcomeKind.BUSY
+    if isinstance(error, SyntaxError):
+        return ParseOutcomeKind.SYNTAX_ERROR
+    if isinstance(error, (UnknownArgumentError, DuplicateArgumentError, ValueError)):
+        return ParseOutcomeKind.INVALID_ARGUMENT
+    return ParseOutcomeKind.COMMAND_ERROR
+
+
+class ParseOutcome:
+    """
+    Result of parsing a single message, failures are described instead of raised.
+
+    Exception describing a failure (and so its message) is created only when it is asked for, most failures
+    (e.g. spammed bad input whose replies are throttled) are only counted and never rendered.
+    """
+
+    __slots__ = ("kind", "command_string", "command", "position", "_error_factory", "_error")
+
+    kind: ParseOutcomeKind
+    command_string: str
+
+    # resolved command, None if parsing failed before the command was found
+    command: object | None
+
+    # offset in command_string the failure relates to, -1 if it doesn't relate to any particular place
+    position: int
+
+    # creates the exception describing the failure, None for outcomes which aren't failures
+    _error_factory: Callable[[], Exception] | None
+    _error: Exception | None
+
+    def __init__(self, kind: ParseOutcomeKind, command_string: str = "", command=None, position: int = -1, error_factory: Callable[[], Exception] | None = None):
+        self.kind = kind
+        self.command_string = command_string
+        self.command = command
+        self.position = position
+        self._error_factory = error_factory
+        self._error = None
+
+    @staticmethod
+    def from_error(error: Exception, kind: ParseOutcomeKind, command_string: str = "", command=None) -> "ParseOutcome":
+        """
+        :return: outcome of a failure whose exception was already raised somewhere else
+        """
+
+        outcome = ParseOutcome(kind, command_string, command, getattr(error, "position", -1))
+        outcome._error = error
+        return outcome
+
+    def is_success(self) -> bool:
+        return self.kind is ParseOutcomeKind.SUCCESS
+
+    def is_error(self) -> bool:
+        return self.kind is not ParseOutcomeKind.SUCCESS and self.kind is not ParseOutcomeKind.NOT_A_COMMAND
+
+    def error(self) -> Exception | None:
+        if self._error is None and self._error_factory is not None:
+            self._error = self._error_factory()
+            self._error_factory = None
+        return self._error
+
+    def message(self) -> str:
+        """
+        :return: message describing the failure, empty string if the outcome isn't a failure
+        """
+
+        error = self.error()
+        return "" if error is None else str(error)
+
+    def raise_for_error(self):
+        """
+        :raises Exception: exception describing the failure, the same one the command raised in case of COMMAND_ERROR
+        """
+
+        error = self.error()
+        if error is not None:
+            raise error
@@ -0,0 +1,273 @@
+import string
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import Any, Hashable, Iterable
+
+
+class CacheScope(Enum):
+    # attributes of the execution context which are part of the cache key
+    GLOBAL = ()
+    GUILD = ("guild_id",)
+    CHANNEL = ("channel_id",)
+    USER = ("author_id",)
+    # the same user has a separate entry in every guild, e.g. for commands showing guild specific state of a player
+    MEMBER = ("guild_id", "author_id")
+
+
+# attributes of the execution context which can be used in cache tags besides arguments of the command
+CONTEXT_TAG_FIELDS = ("guild_id", "channel_id", "author_id")
+
+
+class TTL:
+    """
+    Caching of values returned by a command, declared on the command decorator:
+
+        @Command("!rpg", "profile", cache=TTL(60, scope=CacheScope.MEMBER, tags=("player:{guild_id}:{author_id}",)))
+
+    Invocations with the same converted arguments (and the same scope key) get the cached value until it expires
+    or one of its tags is invalidated. Tags are formatted with arguments of the command and guild_id, channel_id
+    and author_id of the execution context.
+
+    Only commands whose value depends solely on their arguments and the tagged state should be cached.
+    """
+
+    _seconds: float
+    _scope: CacheScope
+    _tags: tuple[str, ...]
+
+    def __init__(self, seconds: float, scope: CacheScope = CacheScope.GLOBAL, tags: Iterable[str] = ()):
+        if seconds <= 0:
+            raise ValueError("Cache TTL must be positive")
+
+        self._seconds = seconds
+        self._scope = scope
+        self._tags = tuple(tags)
+
+    def make_key(self, command, arguments: dict[str, Any], execution_context) -> Hashable:
+        """
+        :param arguments: converted arguments of the command, without its context and dependencies
+        """
+
+        scope_key = tuple(getattr(execution_context, attribute_name, None) for attribute_name in self._scope.value)
+        return command.prefix(), command.name(), scope_key, _freeze(arguments)
+
+    def format_tags(self, arguments: dict[str, Any], execution_context) -> tuple[str, ...]:
+        if not self._tags:
+            return ()
+
+        fields = {field_name: getattr(execution_context, field_name, None) for field_name in CONTEXT_TAG_FIELDS}
+        fields.update(arguments)
+        return tuple(tag.format_map(fields) for tag in self._tags)
+
+    def tag_fields(self) -> set[str]:
+        """
+        :return: names of the fields the tags are formatted with
+        """
+
+        return {field_name for tag in self._tags for _, field_name, _, _ in string.Formatter().parse(tag) if field_name}
+
+    #----- TTL Properties ------#
+
+    def seconds(self) -> float:
+        return self._seconds
+
+    def scope(self) -> CacheScope:
+        return self._scope
+
+    def tags(self) -> tuple[str, ...]:
+        return self._tags
+
+
+class _CacheEntry:
+    __slots__ = ("value", "expires_at", "tags")
+
+    value: Any
+    expires_at: float
+    tags: tuple[str, ...]
+
+    def __init__(self, value: Any, expires_at: float, tags: tuple[str, ...]):
+        self.value = value
+        self.expires_at = expires_at
+        self.tags = tags
+
+
+class ResultCache:
+    """
+    Bounded store of values returned by commands declared with TTL, shared by all commands of a parser.
+
+    Entries are evicted when they expire, when the store is full (the least recently used first) or when one
+    of their tags is invalidated, e.g. after the state the value was computed from changed.
+    """
+
+    _max_entries: int
+
+    # cache key -> entry, ordered from the least recently used
+    _entries: OrderedDict
+
+    # tag -> keys of entries with the tag, entries are removed from here together with the entry
+    _tagged_keys: dict[str, set[Hashable]]
+
+    _hits_count: int
+    _misses_count: int
+    _expired_count: int
+    _evicted_count: int
+    _invalidated_count: int
+
+    # incremented by every invalidation, values computed while a tag of theirs was invalidated may be stale and
+    # aren't stored
+    _invalidations: int
+
+    # tag -> invalidations count when the tag was invalidated the last time, only recently invalidated tags are kept
+    _invalidated_tags: OrderedDict
+    _invalidated_tags_limit: int
+
+    # invalidations count of the latest invalidation which isn't kept anymore, values computed before it aren't stored
+    _forgotten_invalidation: int
+
+    def __init__(self, max_entries: int = 10000, invalidated_tags_limit: int = 4096):
+        if max_entries <= 0:
+            raise ValueError("Result cache must have room for at least one entry")
+
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._tagged_keys = {}
+
+        self._hits_count = 0
+        self._misses_count = 0
+        self._expired_count = 0
+        self._evicted_count = 0
+        self._invalidated_count = 0
+        self._invalidations = 0
+        self._invalidated_tags = OrderedDict()
+        self._invalidated_tags_limit = invalidated_tags_limit
+        self._forgotten_invalidation = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        """
+        :return: cached value, None if there is none or it expired
+        """
+
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses_count += 1
+            return None
+
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self._expired_count += 1
+            self._misses_count += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self._hits_count += 1
+        return entry.value
+
+    def put(self, key: Hashable, value: Any, seconds: float, tags: tuple[str, ...] = (), invalidations: int | None = None):
+        """
+        :param invalidations: invalidations_count() from before the value was computed, the value isn't stored if
+            one of its tags was invalidated since then (it could have been computed from the invalidated state)
+        """
+
+        if invalidations is not None and self._invalidated_since(tags, invalidations):
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = _CacheEntry(value, time.monotonic() + seconds, tags)
+        for tag in tags:
+            self._tagged_keys.setdefault(tag, set()).add(key)
+
+        while len(self._entries) > self._max_entries:
+            self._remove(next(iter(self._entries)))
+            self._evicted_count += 1
+
+    def invalidate(self, *tags: str) -> int:
+        """
+        Evicts all entries with any of the tags.
+
+        :return: count of evicted entries
+        """
+
+        self._invalidations += 1
+
+        invalidated_count = 0
+        for tag in tags:
+            self._invalidated_tags[tag] = self._invalidations
+            self._invalidated_tags.move_to_end(tag)
+
+            tagged_keys = self._tagged_keys.get(tag)
+            if tagged_keys is None:
+                continue
+            for key in list(tagged_keys):
+                self._remove(key)
+                invalidated_count += 1
+
+        while len(self._invalidated_tags) > self._invalidated_tags_limit:
+            _, self._forgotten_invalidation = self._invalidated_tags.popitem(last=False)
+
+        self._invalidated_count += invalidated_count
+        return invalidated_count
+
+    def clear(self):
+        self._invalidations += 1
+        self._forgotten_invalidation = self._invalidations
+        self._invalidated_tags.clear()
+        self._entries.clear()
+        self._tagged_keys.clear()
+
+    def _invalidated_since(self, tags: tuple[str, ...], invalidations: int) -> bool:
+        if self._forgotten_invalidation > invalidations:
+            return True
+        return any(self._invalidated_tags.get(tag, 0) > invalidations for tag in tags)
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        for tag in entry.tags:
+            tagged_keys = self._tagged_keys[tag]
+            tagged_keys.discard(key)
+            if not tagged_keys:
+                del self._tagged_keys[tag]
+
+    #----- Cache Properties ------#
+
+    def entries_count(self) -> int:
+        return len(self._entries)
+
+    def hits_count(self) -> int:
+        return self._hits_count
+
+    def misses_count(self) -> int:
+        return self._misses_count
+
+    def expired_count(self) -> int:
+        return self._expired_count
+
+    def evicted_count(self) -> int:
+        return self._evicted_count
+
+    def invalidated_count(self) -> int:
+        return self._invalidated_count
+
+    def invalidations_count(self) -> int:
+        return self._invalidations
+
+
+def _freeze(value: Any) -> Hashable:
+    """
+    :return: hashable equivalent of a converted argument, e.g. lists become tuples
+    """
+
+    if isinstance(value, dict):
+        return frozenset((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return type(value).__name__, tuple(_freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(item) for item in value)
+
+    try:
+        hash(value)
+    except TypeError:
+        return type(value).__name__, repr(value)
+    return value
@@ -0,0 +1,240 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from enum import Enum
+from typing import Any, Awaitable, Callable, Hashable
+
+from common.models.message_command_parsing.exceptions import CommandBusyError
+
+
+class CooldownScope(Enum):
+    # attribute of the execution context which identifies the bucket
+    USER = "author_id"
+    CHANNEL = "channel_id"
+    GUILD = "guild_id"
+    GLOBAL = None
+
+
+class Cooldown:
+    """
+    Token bucket limiting how often a command can be invoked, declared on the command decorator:
+
+        @Command("!rpg", "fight", cooldown=Cooldown(rate=2, per=10.0))
+
+    Every scope key (e.g. user) has its own bucket of `rate` tokens refilled over `per` seconds.
+    """
+
+    _rate: int
+    _per: float
+    _scope: CooldownScope
+
+    # scope key -> (tokens left, time of the last refill), ordered from the least recently used
+    _buckets: OrderedDict
+    _buckets_limit: int
+
+    def __init__(self, rate: int, per: float, scope: CooldownScope = CooldownScope.USER, buckets_limit: int = 10000):
+        if rate <= 0 or per <= 0:
+            raise ValueError("Cooldown rate and period must be positive")
+
+        self._rate = rate
+        self._per = per
+        self._scope = scope
+        self._buckets = OrderedDict()
+        self._buckets_limit = buckets_limit
+
+    def try_acquire(self, execution_context, count: int = 1) -> float:
+        """
+        Takes tokens from the bucket of the context, either all of them or none.
+
+        :param count: tokens taken, e.g. for every use of the command in a pipeline
+        :return: 0 if the tokens were taken, otherwise time in seconds after which enough tokens will be available
+        """
+
+        key = self._key(execution_context)
+        now = time.monotonic()
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = float(self._rate)
+        else:
+            self._buckets.move_to_end(key)
+            tokens = min(float(self._rate), bucket[0] + (now - bucket[1]) * self._rate / self._per)
+
+        if tokens < count:
+            self._buckets[key] = (tokens, now)
+            return (count - tokens) * self._per / self._rate
+
+        self._buckets[key] = (tokens - count, now)
+        if len(self._buckets) > self._buckets_limit:
+            # the least recently used bucket is the most likely to be already refilled
+            self._buckets.popitem(last=False)
+
+        return 0
+
+    def refund(self, execution_context, count: int = 1):
+        """
+        Returns tokens taken by try_acquire, e.g. when the command was refused for another reason before it ran.
+        """
+
+        key = self._key(execution_context)
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            self._buckets[key] = (min(float(self._rate), bucket[0] + count), bucket[1])
+
+    def _key(self, execution_context) -> Hashable:
+        return None if self._scope.value is None else getattr(execution_context, self._scope.value, None)
+
+    def scope(self) -> CooldownScope:
+        return self._scope
+
+
+class SchedulerTicket:
+    """
+    Reservation of a place in scheduler queues, taken before the arguments of a command are converted.
+    """
+
+    __slots__ = ("_scheduler", "guild_key", "user_key", "_released")
+
+    guild_key: Hashable
+    user_key: Hashable
+
+    def __init__(self, scheduler: "CommandScheduler", guild_key: Hashable, user_key: Hashable):
+        self._scheduler = scheduler
+        self.guild_key = guild_key
+        self.user_key = user_key
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._scheduler._release_ticket(self)
+
+
+class CommandScheduler:
+    """
+    Limits how many commands run at once.
+
+    Invocations waiting for a free slot are queued per guild and guilds are served in round robin order,
+    so a flood of commands from one guild doesn't starve the others. Invocations exceeding per guild or per
+    user limits of waiting and running commands are refused with CommandBusyError.
+    """
+
+    _max_concurrency: int
+    _max_pending_per_guild: int
+    _max_pending_per_user: int
+
+    _running: int
+
+    # waiting (and running) invocations of each guild and user
+    _pending_per_guild: dict[Hashable, int]
+    _pending_per_user: dict[Hashable, int]
+
+    # futures of invocations waiting for a free slot and guilds which have any of them, in serving order
+    _guild_queues: dict[Hashable, deque]
+    _ready_guilds: deque
+
+    def __init__(self, max_concurrency: int = 32, max_pending_per_guild: int = 64, max_pending_per_user: int = 4):
+        self._max_concurrency = max_concurrency
+        self._max_pending_per_guild = max_pending_per_guild
+        self._max_pending_per_user = max_pending_per_user
+
+        self._running = 0
+        self._pending_per_guild = {}
+        self._pending_per_user = {}
+        self._guild_queues = {}
+        self._ready_guilds = deque()
+
+    def reserve(self, execution_context) -> SchedulerTicket:
+        """
+        :raises CommandBusyError: if the guild or the user of the context has too many pending commands
+        """
+
+        ticket = self.try_reserve(execution_context)
+        if ticket is None:
+            raise CommandBusyError()
+        return ticket
+
+    def try_reserve(self, execution_context) -> SchedulerTicket | None:
+        """
+        :return: ticket, or None if the guild or the user of the context has too many pending commands
+        """
+
+        guild_key = getattr(execution_context, "guild_id", None)
+        user_key = getattr(execution_context, "author_id", None)
+
+        guild_pending = self._pending_per_guild.get(guild_key, 0)
+        user_pending = self._pending_per_user.get(user_key, 0)
+        if guild_pending >= self._max_pending_per_guild or user_pending >= self._max_pending_per_user:
+            return None
+
+        self._pending_per_guild[guild_key] = guild_pending + 1
+        self._pending_per_user[user_key] = user_pending + 1
+        return SchedulerTicket(self, guild_key, user_key)
+
+    async def execute(self, ticket: SchedulerTicket, invoke: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Waits for a free slot and runs the invocation, the ticket is released afterwards.
+        """
+
+        try:
+            if self._running < self._max_concurrency and not self._ready_guilds:
+                self._running += 1
+            else:
+                await self._wait_for_slot(ticket.guild_key)
+
+            try:
+                return await invoke()
+            finally:
+                self._release_slot()
+        finally:
+            ticket.release()
+
+    async def _wait_for_slot(self, guild_key: Hashable):
+        slot_granted = asyncio.get_running_loop().create_future()
+
+        guild_queue = self._guild_queues.get(guild_key)
+        if guild_queue is None:
+            guild_queue = deque()
+            self._guild_queues[guild_key] = guild_queue
+            self._ready_guilds.append(guild_key)
+        guild_queue.append(slot_granted)
+
+        try:
+            await slot_granted
+        except asyncio.CancelledError:
+            # slot could have been granted right before the waiting task was cancelled
+            if slot_granted.done() and not slot_granted.cancelled():
+                self._release_slot()
+            raise
+
+    def _release_slot(self):
+        self._running -= 1
+
+        while self._running < self._max_concurrency and self._ready_guilds:
+            guild_key = self._ready_guilds.popleft()
+            guild_queue = self._guild_queues[guild_key]
+            slot_granted = guild_queue.popleft()
+
+            if guild_queue:
+                self._ready_guilds.append(guild_key)
+            else:
+                del self._guild_queues[guild_key]
+
+            if not slot_granted.done():
+                self._running += 1
+                slot_granted.set_result(None)
+
+    def _release_ticket(self, ticket: SchedulerTicket):
+        for pending, key in ((self._pending_per_guild, ticket.guild_key), (self._pending_per_user, ticket.user_key)):
+            if pending[key] == 1:
+                del pending[key]
+            else:
+                pending[key] -= 1
+
+    #----- Scheduler Properties ------#
+
+    def running_count(self) -> int:
+        return self._running
+
+    def waiting_count(self) -> int:
+        return sum(len(guild_queue) for guild_queue in self._guild_queues.values())
@@ -1,5 +1,9 @@
-import re
-from typing import get_type_hints, List, get_args, get_origin, Any
+from collections import OrderedDict
+from enum import Enum
+from types import UnionType
+from typing import get_type_hints, List, get_args, get_origin, Any, Callable, Literal, Union
+
+from common.models.message_command_parsing.literal_parsing import parse_literal
 
 def parse_boolean(arg_expr: str)->bool:
     arg_expr = arg_expr.lower().strip()
@@ -32,46 +36,188 @@ def parse_float(arg_expr: str)->float:
 
 
 
+NONE_LITERALS = ('none', 'null')
+
+
+def parse_collection(arg_expr: str | list | dict, collection_type: type) -> list | dict:
+    """
+    Returns argument as list or dict, strings are parsed as literals (e.g. "[1, [2, 3]]" or "{a: 1}").
+    """
+
+    if isinstance(arg_expr, str):
+        arg_expr = parse_literal(arg_expr)
+
+    if not isinstance(arg_expr, collection_type):
+        if collection_type is list:
+            raise ValueError(f"Expected a list format (e.g., '[1, 2, 3]'), got: {arg_expr}")
+        raise ValueError(f"Expected a dict format (e.g., '{{a: 1, b: 2}}'), got: {arg_expr}")
+
+    return arg_expr
+
+
 class StringConverter:
-    _supported_conversions = {
+    # conversions every converter starts with, conversions added later belong only to the converter they were added to
+    _supported_conversions: dict[type, Callable[[str], Any]] = {
         int: parse_int,
         float: parse_float,
         bool: parse_boolean,
         str: parse_string,
     }
 
+    # conversion functions compiled from type annotations, ordered from the least recently used
+    _compiled_conversions: OrderedDict
+    _compiled_conversions_limit: int
+
+    def __init__(self, compiled_conversions_limit: int = 256):
+        self._supported_conversions = dict(StringConverter._supported_conversions)
+        self._compiled_conversions = OrderedDict()
+        self._compiled_conversions_limit = compiled_conversions_limit
+
     def convert_from_string(self, arg_expr: str, target_type: type) -> Any:
-        # Handle simple types directly
+        return self.compile(target_type)(arg_expr)
+
+    def compile(self, target_type: type) -> Callable[[str], Any]:
+        """
+        Turns type annotation into a function converting strings into this type.
+
+        Compiled functions are cached, so the annotation is inspected only once.
+
+        :raises TypeError: if there is no conversion for the type (or for one of its type arguments)
+        """
+
+        conversion = self._compiled_conversions.get(target_type)
+        if conversion is not None:
+            self._compiled_conversions.move_to_end(target_type)
+            return conversion
+
+        conversion = self._compile_conversion(target_type)
+
+        self._compiled_conversions[target_type] = conversion
+        if len(self._compiled_conversions) > self._compiled_conversions_limit:
+            self._compiled_conversions.popitem(last=False)
+
+        return conversion
+
+    def _compile_conversion(self, target_type: type) -> Callable[[str], Any]:
+        # Handle simple types and types added by users directly
         if target_type in self._supported_conversions:
-            return self._supported_conversions[target_type](arg_expr)
+            return self._compile_scalar_conversion(self._supported_conversions[target_type])
+
+        if target_type is Any:
+            return self._compile_scalar_conversion(parse_string)
+
+        origin = get_origin(target_type)
+        type_args = get_args(target_type)
+
+        if origin is list or target_type is list:
+            return self._compile_list_conversion(self.compile(type_args[0] if type_args else str))
 
-        # Handle list types
-        if get_origin(target_type) is list or target_type is list:
-            if not (arg_expr.startswith('[') and arg_expr.endswith(']')):
-                raise ValueError(f"Expected a list format (e.g., '[1, 2, 3]'), got: {arg_expr}")
+        if origin is tuple or target_type is tuple:
+            # tuple and tuple[T, ...] have any length, tuple[A, B] has a fixed one
+            if not type_args:
+                return self._compile_list_conversion(self.compile(str), tuple)
+            if len(type_args) == 2 and type_args[1] is Ellipsis:
+                return self._compile_list_conversion(self.compile(type_args[0]), tuple)
+            return self._compile_fixed_tuple_conversion(tuple(self.compile(type_arg) for type_arg in type_args))
 
-            # Strip brackets and whitespace
-            arg_expr = arg_expr[1:-1].strip()
+        if origin is dict or target_type is dict:
+            key_type, value_type = type_args if type_args else (str, str)
+            return self._compile_dict_conversion(self.compile(key_type), self.compile(value_type))
 
-            # Get the inner type of the list
-            inner_type_tuple = get_args(target_type)
-            inner_type: type
+        if origin is Union or origin is UnionType:
+            return self._compile_union_conversion(type_args)
 
-            if len(inner_type_tuple) == 0:
-                inner_type = type("")
-            else:
-                inner_type = inner_type_tuple[0]
+        if origin is Literal:
+            return self._compile_scalar_conversion(self._compile_literal_conversion(type_args))
 
-            # Split the list elements safely
-            str_elements = re.split(r',\s*(?![^\[\]]*])', arg_expr)
+        if isinstance(target_type, type) and issubclass(target_type, Enum):
+            return self._compile_scalar_conversion(self._compile_enum_conversion(target_type))
 
-            # Recursively convert each element
-            return [self.convert_from_string(element.strip(), inner_type) for element in str_elements]
+        raise TypeError(f"Cannot convert string into {target_type}")
+
+    def _compile_scalar_conversion(self, conversion: Callable[[str], Any]) -> Callable[[str], Any]:
+        # arguments may already be parsed into lists or dicts, which can't be given to string conversions
+        def convert_scalar(arg_expr: str):
+            if not isinstance(arg_expr, str):
+                raise SyntaxError(f"Expected a single value, got: {arg_expr}")
+            return conversion(arg_expr)
+
+        return convert_scalar
+
+    def _compile_list_conversion(self, element_conversion: Callable[[str], Any], collection_type: type = list) -> Callable[[str], Any]:
+        def convert_list(arg_expr: str | list):
+            elements = parse_collection(arg_expr, list)
+            return collection_type(element_conversion(element) for element in elements)
+
+        return convert_list
+
+    def _compile_fixed_tuple_conversion(self, element_conversions: tuple[Callable[[str], Any], ...]) -> Callable[[str], Any]:
+        def convert_tuple(arg_expr: str | list):
+            elements = parse_collection(arg_expr, list)
+            if len(elements) != len(element_conversions):
+                raise SyntaxError(f"Expected {len(element_conversions)} elements, got {len(elements)}: {arg_expr}")
+
+            return tuple(conversion(element) for conversion, element in zip(element_conversions, elements))
+
+        return convert_tuple
+
+    def _compile_dict_conversion(self, key_conversion: Callable[[str], Any], value_conversion: Callable[[str], Any]) -> Callable[[str], Any]:
+        def convert_dict(arg_expr: str | dict):
+            elements = parse_collection(arg_expr, dict)
+            return {key_conversion(key): value_conversion(value) for key, value in elements.items()}
+
+        return convert_dict
+
+    def _compile_union_conversion(self, type_args: tuple) -> Callable[[str], Any]:
+        is_optional = type(None) in type_args
+        conversions = [self.compile(type_arg) for type_arg in type_args if type_arg is not type(None)]
+
+        def convert_union(arg_expr: str | list | dict):
+            # arguments joined with commas arrive already grouped into a list, which is never none
+            if is_optional and isinstance(arg_expr, str) and arg_expr.strip().lower() in NONE_LITERALS:
+                return None
+
+            # first conversion which accepts the argument wins, so order of union members matters
+            for conversion in conversions[:-1]:
+                try:
+                    return conversion(arg_expr)
+                except (SyntaxError, ValueError):
+                    pass
+            return conversions[-1](arg_expr)
+
+        return convert_union
+
+    def _compile_literal_conversion(self, literal_values: tuple) -> Callable[[str], Any]:
+        values_by_name = {str(value): value for value in literal_values}
+
+        def convert_literal(arg_expr: str):
+            name = parse_string(arg_expr)
+            if name not in values_by_name:
+                raise SyntaxError(f"\"{name}\" is not one of: {', '.join(values_by_name)}")
+            return values_by_name[name]
+
+        return convert_literal
+
+    def _compile_enum_conversion(self, enum_type: type[Enum]) -> Callable[[str], Any]:
+        # members can be given either by their name or by their value, letter case of names is ignored
+        members_by_name = {str(member.value): member for member in enum_type}
+        members_by_name.update({member.name.lower(): member for member in enum_type})
+
+        def convert_enum(arg_expr: str):
+            name = parse_string(arg_expr)
+            member = members_by_name.get(name.lower(), members_by_name.get(name))
+            if member is None:
+                raise SyntaxError(f"\"{name}\" is not one of: {', '.join(member.name.lower() for member in enum_type)}")
+            return member
+
+        return convert_enum
 
     def add_new_conversion(self, from_type: type, conversion_func):
         if from_type not in self._supported_conversions:
             self._supported_conversions[from_type] = conversion_func
 
+            # compiled conversions of generic types may need the new conversion
+            self._compiled_conversions.clear()
+
     def has_conversion(self, from_type):
         return from_type in self._supported_conversions
-
@@ -0,0 +1,322 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Collection, Hashable, Protocol
+
+import hikari
+
+logger = logging.getLogger(__name__)
+
+# discord rejects messages longer than this
+MESSAGE_LENGTH_LIMIT = 2000
+
+# documented defaults of discord rate limits: message creation is limited per channel and all requests globally
+CHANNEL_ROUTE_RATE = (5, 5.0)
+GLOBAL_RATE = (50, 1.0)
+
+
+class OutboundRateLimitedError(Exception):
+    retry_after: float
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limited, retry after {retry_after:.2f}s")
+        self.retry_after = retry_after
+
+
+class OutboundChannelUnavailableError(Exception):
+    def __init__(self, channel_id: Hashable):
+        super().__init__(f"Messages can't be sent to channel {channel_id}")
+
+
+class OutboundTransport(Protocol):
+    async def send(self, channel_id: Hashable, content: str):
+        """
+        :raises OutboundRateLimitedError: if the request was rejected because of a rate limit
+        :raises OutboundChannelUnavailableError: if the channel doesn't exist or the bot can't send messages to it
+        """
+        ...
+
+
+class HikariTransport:
+    """
+    Sends messages through REST client of the bot.
+    """
+
+    _rest: Any
+
+    def __init__(self, rest):
+        self._rest = rest
+
+    async def send(self, channel_id: Hashable, content: str):
+        try:
+            await self._rest.create_message(channel_id, content)
+        except hikari.RateLimitTooLongError as e:
+            raise OutboundRateLimitedError(e.retry_after) from e
+        except (hikari.ForbiddenError, hikari.NotFoundError) as e:
+            raise OutboundChannelUnavailableError(channel_id) from e
+
+
+class FakeTransport:
+    """
+    Records sent messages instead of sending them, can emulate rate limits of discord (requests over the limit
+    are rejected with OutboundRateLimitedError the same way as discord responds with 429) and channels the bot
+    can't send messages to (rejected with OutboundChannelUnavailableError as discord responds with 403 or 404).
+    """
+
+    # (time of sending, channel, content) of every accepted message
+    sent: list[tuple[float, Hashable, str]]
+    rejected_count: int
+
+    _latency: float
+    _rate: tuple[int, float] | None
+    _buckets: dict[Hashable, "RouteBucket"]
+    _unavailable_channels: set[Hashable]
+
+    def __init__(self, latency: float = 0.0, rate: tuple[int, float] | None = None, unavailable_channels: Collection[Hashable] = ()):
+        self.sent = []
+        self.rejected_count = 0
+        self._latency = latency
+        self._rate = rate
+        self._buckets = {}
+        self._unavailable_channels = set(unavailable_channels)
+
+    async def send(self, channel_id: Hashable, content: str):
+        if self._latency:
+            await asyncio.sleep(self._latency)
+
+        if channel_id in self._unavailable_channels:
+            self.rejected_count += 1
+            raise OutboundChannelUnavailableError(channel_id)
+
+        if self._rate is not None:
+            bucket = self._buckets.get(channel_id)
+            if bucket is None:
+                bucket = RouteBucket(*self._rate)
+                self._buckets[channel_id] = bucket
+            if (retry_after := bucket.delay()) > 0:
+                self.rejected_count += 1
+                raise OutboundRateLimitedError(retry_after)
+            bucket.take()
+
+        self.sent.append((time.monotonic(), channel_id, content))
+
+
+class RouteBucket:
+    """
+    Local model of a rate limit bucket, requests are held back until the bucket has a token.
+    """
+
+    __slots__ = ("_capacity", "_per", "_tokens", "_updated_at", "_blocked_until")
+
+    _capacity: int
+    _per: float
+    _tokens: float
+    _updated_at: float
+
+    # set when the remote side rejects a request despite the model (e.g. the bucket is shared with another process)
+    _blocked_until: float
+
+    def __init__(self, capacity: int, per: float):
+        self._capacity = capacity
+        self._per = per
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+
+    def delay(self) -> float:
+        """
+        :return: 0 if a request can be made now, otherwise time in seconds after which it can be made
+        """
+
+        now = time.monotonic()
+        self._tokens = min(float(self._capacity), self._tokens + (now - self._updated_at) * self._capacity / self._per)
+        self._updated_at = now
+
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._tokens < 1:
+            return (1 - self._tokens) * self._per / self._capacity
+        return 0
+
+    def take(self):
+        self._tokens -= 1
+
+    def is_full(self) -> bool:
+        return self.delay() == 0 and self._tokens >= self._capacity
+
+    def block_for(self, retry_after: float):
+        self._tokens = 0.0
+        self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+
+
+class OutboundMessenger:
+    """
+    Queues outgoing messages per channel and sends them without hitting rate limits.
+
+    Replies landing in a channel within the coalescing window (or while the channel waits for its rate limit)
+    are joined into as few messages as the length limit allows. Every channel has its own queue served by
+    a worker task which exists only while the queue isn't empty.
+    """
+
+    _transport: OutboundTransport
+    _coalesce_window: float
+    _max_pending_per_channel: int
+    _channel_rate: tuple[int, float]
+
+    _queues: dict[Hashable, deque[str]]
+    _workers: dict[Hashable, asyncio.Task]
+    _channel_buckets: dict[Hashable, RouteBucket]
+    _channel_buckets_limit: int = 10000
+    _global_bucket: RouteBucket
+
+    _sent_count: int
+    _coalesced_count: int
+    _dropped_count: int
+    _failed_count: int
+
+    def __init__(self, transport: OutboundTransport, coalesce_window: float = 0.05, max_pending_per_channel: int = 50, channel_rate: tuple[int, float] = CHANNEL_ROUTE_RATE, global_rate: tuple[int, float] = GLOBAL_RATE):
+        self._transport = transport
+        self._coalesce_window = coalesce_window
+        self._max_pending_per_channel = max_pending_per_channel
+        self._channel_rate = channel_rate
+
+        self._queues = {}
+        self._workers = {}
+        self._channel_buckets = {}
+        self._global_bucket = RouteBucket(*global_rate)
+
+        self._sent_count = 0
+        self._coalesced_count = 0
+        self._dropped_count = 0
+        self._failed_count = 0
+
+    def send(self, channel_id: Hashable, content: Any):
+        """
+        Queues the message and returns immediately, it is sent by the worker of the channel.
+
+        Messages exceeding the limit of pending messages of the channel are dropped, as are messages queued for
+        a channel which turns out to be unavailable (missing or without permissions to send messages).
+        """
+
+        content = str(content)
+        if not content:
+            return
+
+        queue = self._queues.get(channel_id)
+        if queue is None:
+            queue = deque()
+            self._queues[channel_id] = queue
+
+        if len(queue) >= self._max_pending_per_channel:
+            self._dropped_count += 1
+            return
+        queue.append(content)
+
+        if channel_id not in self._workers:
+            self._workers[channel_id] = asyncio.get_running_loop().create_task(self._run_channel(channel_id, queue))
+
+    async def _run_channel(self, channel_id: Hashable, queue: deque[str]):
+        bucket = self._channel_buckets.get(channel_id)
+        if bucket is None:
+            if len(self._channel_buckets) >= self._channel_buckets_limit:
+                self._prune_channel_buckets()
+            bucket = RouteBucket(*self._channel_rate)
+            self._channel_buckets[channel_id] = bucket
+
+        try:
+            while queue:
+                # replies of the same burst usually land within a few milliseconds
+                if self._coalesce_window:
+                    await asyncio.sleep(self._coalesce_window)
+
+                await self._wait_for_buckets(bucket)
+                content = self._take_batch(queue)
+
+                while True:
+                    try:
+                        await self._transport.send(channel_id, content)
+                        self._sent_count += 1
+                    except OutboundRateLimitedError as e:
+                        bucket.block_for(e.retry_after)
+                        await self._wait_for_buckets(bucket)
+                        continue
+                    except OutboundChannelUnavailableError:
+                        # the rest of the queue would be rejected the same way, one message at a time
+                        self._failed_count += 1
+                        self._dropped_count += len(queue)
+                        logger.warning("Channel %s is unavailable, %d queued messages were dropped", channel_id, len(queue))
+                        queue.clear()
+                    except Exception:
+                        self._failed_count += 1
+                        logger.exception("Sending a message to channel %s failed", channel_id)
+                    break
+        finally:
+            del self._workers[channel_id]
+            if not queue:
+                del self._queues[channel_id]
+
+    def _prune_channel_buckets(self):
+        # bucket which was refilled behaves the same as a new one, so it doesn't have to be kept
+        for channel_id in [channel_id for channel_id, bucket in self._channel_buckets.items() if channel_id not in self._workers and bucket.is_full()]:
+            del self._channel_buckets[channel_id]
+
+    async def _wait_for_buckets(self, bucket: RouteBucket):
+        # both buckets have to be checked again after sleeping, other channels take global tokens meanwhile
+        while (delay := max(bucket.delay(), self._global_bucket.delay())) > 0:
+            await asyncio.sleep(delay)
+        bucket.take()
+        self._global_bucket.take()
+
+    def _take_batch(self, queue: deque[str]) -> str:
+        """
+        Pops as many queued messages as fit into a single message, a message over the limit is split.
+        """
+
+        content = queue.popleft()
+        if len(content) > MESSAGE_LENGTH_LIMIT:
+            split_at = content.rfind("\n", 0, MESSAGE_LENGTH_LIMIT)
+            if split_at <= 0:
+                split_at = MESSAGE_LENGTH_LIMIT
+            queue.appendleft(content[split_at:].lstrip("\n"))
+            return content[:split_at]
+
+        parts = [content]
+        length = len(content)
+        while queue and length + 1 + len(queue[0]) <= MESSAGE_LENGTH_LIMIT:
+            next_content = queue.popleft()
+            parts.append(next_content)
+            length += 1 + len(next_content)
+
+        self._coalesced_count += len(parts) - 1
+        return "\n".join(parts)
+
+    async def close(self, timeout: float | None = None):
+        """
+        Waits (at most timeout seconds) until queued messages are sent, workers still running afterwards are cancelled.
+        """
+
+        workers = list(self._workers.values())
+        if not workers:
+            return
+
+        _, pending = await asyncio.wait(workers, timeout=timeout)
+        for worker in pending:
+            worker.cancel()
+
+    #----- Messenger Properties ------#
+
+    def pending_count(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def sent_count(self) -> int:
+        return self._sent_count
+
+    def coalesced_count(self) -> int:
+        return self._coalesced_count
+
+    def dropped_count(self) -> int:
+        return self._dropped_count
+
+    def failed_count(self) -> int:
+        return self._failed_count
@@ -0,0 +1,223 @@
+import asyncio
+import multiprocessing
+import multiprocessing.context
+import queue
+import time
+from typing import Callable
+
+from common.models.message_command_parsing.metrics import ParseMetrics
+
+
+def shard_slices(shard_count: int, worker_count: int) -> list[list[int]]:
+    """
+    Splits shard ids into contiguous slices of (almost) the same size, one slice per worker.
+    """
+
+    if worker_count <= 0 or shard_count < worker_count:
+        raise ValueError("Every worker needs at least one shard")
+
+    slice_size, bigger_slices = divmod(shard_count, worker_count)
+    slices = []
+    shard_id = 0
+    for worker_id in range(worker_count):
+        size = slice_size + (1 if worker_id < bigger_slices else 0)
+        slices.append(list(range(shard_id, shard_id + size)))
+        shard_id += size
+    return slices
+
+
+async def fetch_recommended_shard_count(token: str) -> int:
+    """
+    :return: amount of shards discord recommends for the bot (the gateway bot endpoint)
+    """
+
+    import hikari
+    rest_app = hikari.RESTApp()
+    await rest_app.start()
+    try:
+        async with rest_app.acquire(token, hikari.TokenType.BOT) as rest:
+            return (await rest.fetch_gateway_bot_info()).shard_count
+    finally:
+        await rest_app.close()
+
+
+def shard_of_guild(guild_id: int, shard_count: int) -> int:
+    # the same formula as discord uses to route events of guilds
+    return (guild_id >> 22) % shard_count
+
+
+class WorkerContext:
+    """
+    Everything a worker process gets from the supervisor, it is sent to the worker process so it has to be picklable.
+    """
+
+    worker_id: int
+    shard_ids: list[int]
+    shard_count: int
+
+    # how many times the worker was restarted before this process was started
+    incarnation: int
+
+    _metrics_queue: multiprocessing.Queue
+    _report_interval: float
+
+    def __init__(self, worker_id: int, shard_ids: list[int], shard_count: int, incarnation: int, metrics_queue: multiprocessing.Queue, report_interval: float):
+        self.worker_id = worker_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.incarnation = incarnation
+        self._metrics_queue = metrics_queue
+        self._report_interval = report_interval
+
+    def report_metrics(self, metrics: ParseMetrics):
+        # the supervisor keeps only the last report of every process, so a lost report doesn't matter
+        try:
+            self._metrics_queue.put_nowait((self.worker_id, self.incarnation, metrics))
+        except queue.Full:
+            pass
+
+    async def report_metrics_periodically(self, metrics: ParseMetrics):
+        while True:
+            await asyncio.sleep(self._report_interval)
+            self.report_metrics(metrics)
+
+
+def _run_worker(worker_entry: Callable[[WorkerContext], None], worker: WorkerContext):
+    worker_entry(worker)
+
+
+class ShardSupervisor:
+    """
+    Runs shards of the bot in several worker processes, so guilds don't share a single core and event loop.
+
+    Every worker gets a contiguous slice of shard ids and runs worker_entry (a picklable top level function)
+    with them. Crashed workers are restarted, unless they crash more than max_restarts times within restart_window
+    seconds. Metrics reported by workers are collected, the last report of every worker process is kept.
+    """
+
+    _worker_entry: Callable[[WorkerContext], None]
+    _shard_count: int
+    _shard_slices: list[list[int]]
+    _report_interval: float
+    _max_restarts: int
+    _restart_window: float
+
+    _mp_context: multiprocessing.context.SpawnContext
+    _metrics_queue: multiprocessing.Queue
+    _processes: dict[int, multiprocessing.Process]
+
+    # worker id -> times of its restarts within the restart window and count of all its restarts
+    _restarts: dict[int, list[float]]
+    _restart_counts: dict[int, int]
+
+    # workers which finished successfully or crashed too often, they aren't restarted
+    _finished_workers: set[int]
+
+    # (worker id, incarnation) -> the last metrics reported by the worker process
+    _worker_metrics: dict[tuple[int, int], ParseMetrics]
+
+    def __init__(self, worker_entry: Callable[[WorkerContext], None], shard_count: int, worker_count: int, report_interval: float = 10.0, max_restarts: int = 5, restart_window: float = 60.0):
+        self._worker_entry = worker_entry
+        self._shard_count = shard_count
+        self._shard_slices = shard_slices(shard_count, worker_count)
+        self._report_interval = report_interval
+        self._max_restarts = max_restarts
+        self._restart_window = restart_window
+
+        # workers are started fresh instead of forked, so they don't inherit sockets or the event loop of the supervisor
+        self._mp_context = multiprocessing.get_context("spawn")
+        self._metrics_queue = self._mp_context.Queue(maxsize=1000)
+
+        self._processes = {}
+        self._restarts = {}
+        self._restart_counts = {}
+        self._finished_workers = set()
+        self._worker_metrics = {}
+
+    def run(self, duration: float | None = None, poll_interval: float = 0.5):
+        """
+        Starts all workers and supervises them until all of them finish, the duration elapses or the supervisor
+        is interrupted, remaining workers are terminated afterwards.
+        """
+
+        for worker_id in range(len(self._shard_slices)):
+            self._start_worker(worker_id)
+
+        deadline = None if duration is None else time.monotonic() + duration
+        try:
+            while len(self._finished_workers) < len(self._shard_slices):
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                self._collect_metrics(poll_interval)
+                self._check_workers()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self, timeout: float = 10.0):
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self._processes.values():
+            process.join(timeout)
+        self._collect_metrics(0)
+
+    def _start_worker(self, worker_id: int):
+        worker = WorkerContext(worker_id, self._shard_slices[worker_id], self._shard_count, self._restart_counts.get(worker_id, 0), self._metrics_queue, self._report_interval)
+        process = self._mp_context.Process(target=_run_worker, args=(self._worker_entry, worker), name=f"gateway-worker-{worker_id}", daemon=True)
+        process.start()
+        self._processes[worker_id] = process
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for worker_id, process in list(self._processes.items()):
+            if process.is_alive() or worker_id in self._finished_workers:
+                continue
+
+            if process.exitcode == 0:
+                self._finished_workers.add(worker_id)
+                continue
+
+            recent_restarts = [restart for restart in self._restarts.get(worker_id, []) if now - restart < self._restart_window]
+            if len(recent_restarts) >= self._max_restarts:
+                self._finished_workers.add(worker_id)
+                continue
+
+            recent_restarts.append(now)
+            self._restarts[worker_id] = recent_restarts
+            self._restart_counts[worker_id] = self._restart_counts.get(worker_id, 0) + 1
+            self._start_worker(worker_id)
+
+    def _collect_metrics(self, timeout: float):
+        try:
+            worker_id, incarnation, metrics = self._metrics_queue.get(timeout=timeout) if timeout > 0 else self._metrics_queue.get_nowait()
+            while True:
+                self._worker_metrics[(worker_id, incarnation)] = metrics
+                worker_id, incarnation, metrics = self._metrics_queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    #----- Supervisor Properties ------#
+
+    def worker_metrics(self) -> dict[int, ParseMetrics]:
+        """
+        :return: metrics of every worker, metrics of its crashed processes included
+        """
+
+        worker_metrics: dict[int, ParseMetrics] = {}
+        for (worker_id, _), metrics in sorted(self._worker_metrics.items()):
+            worker_metrics.setdefault(worker_id, ParseMetrics()).merge(metrics)
+        return worker_metrics
+
+    def merged_metrics(self) -> ParseMetrics:
+        merged = ParseMetrics()
+        for metrics in self._worker_metrics.values():
+            merged.merge(metrics)
+        return merged
+
+    def restart_counts(self) -> dict[int, int]:
+        return dict(self._restart_counts)
+
+    def shard_slices(self) -> list[list[int]]:
+        return self._shard_slices
@@ -0,0 +1,227 @@
+import re
+from typing import Any, Callable
+
+import arc
+import hikari
+from arc.command.option import BoolOption, FloatOption, IntOption, StrOption
+
+from common.models.message_command_parsing import CommandParser, ParseOutcomeKind
+from common.models.message_command_parsing.binding_plan import ParameterDescription, ParameterKind
+
+# limits of discord application commands
+SLASH_NAME_MAX_LENGTH = 32
+SLASH_DESCRIPTION_MAX_LENGTH = 100
+SLASH_CHILDREN_LIMIT = 25
+SLASH_OPTIONS_LIMIT = 25
+SLASH_CHOICES_LIMIT = 25
+
+_SLASH_NAME_FORBIDDEN_CHARACTERS = re.compile(r"[^a-z0-9_-]")
+
+
+class InteractionContext:
+    """
+    Execution context of a command invoked by a slash command. It has the attributes commands, cooldowns and
+    the scheduler read from message events, so the same command serves both kinds of invocations.
+    """
+
+    guild_id: hikari.Snowflake | None
+    channel_id: hikari.Snowflake
+    author_id: hikari.Snowflake
+    author: hikari.User
+    member: hikari.InteractionMember | None
+
+    _context: arc.GatewayContext
+
+    # interaction has to be answered, a command which returned nothing is answered by the adapter
+    _responded: bool
+
+    def __init__(self, context: arc.GatewayContext):
+        self._context = context
+        self._responded = False
+
+        self.guild_id = context.guild_id
+        self.channel_id = context.channel_id
+        self.author_id = context.author.id
+        self.author = context.author
+        self.member = context.member
+
+    async def respond(self, content: Any, ephemeral: bool = False):
+        await self._context.respond(str(content), flags=hikari.MessageFlag.EPHEMERAL if ephemeral else hikari.MessageFlag.NONE)
+        self._responded = True
+
+    #----- Context Properties ------#
+
+    def arc_context(self) -> arc.GatewayContext:
+        return self._context
+
+    def responded(self) -> bool:
+        return self._responded
+
+
+async def respond_to_interaction(execution_context: InteractionContext, content):
+    await execution_context.respond(content)
+
+
+class SlashCommandGenerator:
+    """
+    Generates arc slash commands from commands registered in the parser.
+
+    Every prefix becomes a slash group (e.g. "!rpg" -> /rpg), a command with a single word name becomes its
+    subcommand, the first word of a longer name becomes a subgroup and the rest of the name its subcommand
+    ("guild bank deposit" -> /rpg guild bank-deposit). Options are derived from descriptions of parameters of the
+    commands, values of options are given to binding plans as raw arguments, so they are converted and validated
+    the same way as arguments of message commands.
+
+    Commands of a manifest are described by the manifest, so their modules are still imported only when one of their
+    commands is invoked for the first time.
+
+    Discord gets the commands when the bot starts, so commands added later (e.g. by hot reload) are invoked
+    through slash commands only if they already existed with the same parameters.
+    """
+
+    _parser: CommandParser
+
+    def __init__(self, parser: CommandParser):
+        self._parser = parser
+
+    def include_in(self, client: arc.GatewayClient) -> list[arc.SlashGroup]:
+        """
+        Generates slash groups and adds them to the client.
+
+        :return: added groups
+        :raises ValueError: if commands can't be expressed as slash commands (see generate_groups)
+        """
+
+        slash_groups = self.generate_groups()
+        for slash_group in slash_groups:
+            client.include(slash_group)
+        return slash_groups
+
+    def generate_groups(self) -> list[arc.SlashGroup]:
+        """
+        Lazy commands aren't resolved, their options are derived from the manifest.
+
+        :raises ValueError: if two commands have the same slash name, or a group or a command exceeds discord limits
+        """
+
+        slash_groups: dict[str, arc.SlashGroup] = {}
+        for command in self._parser.registered_commands():
+            prefix = command.prefix()
+
+            slash_group = slash_groups.get(prefix)
+            if slash_group is None:
+                slash_group = arc.SlashGroup(name=_slash_name(prefix), description=_slash_description(f"Commands of {prefix}"))
+                slash_groups[prefix] = slash_group
+
+            name_words = command.name().split()
+            parent = slash_group
+            if len(name_words) > 1:
+                subgroup_name = _slash_name(name_words[0])
+                parent = slash_group.children.get(subgroup_name)
+                if parent is None:
+                    parent = slash_group.include_subgroup(subgroup_name, _slash_description(f"Commands of {prefix} {name_words[0]}"))
+                elif not isinstance(parent, arc.SlashSubGroup):
+                    raise ValueError(f"Command \"{command.name()}\" would be under /{slash_group.name} {subgroup_name}, which is a command itself")
+                name_words = name_words[1:]
+
+            subcommand_name = _slash_name("-".join(name_words))
+            if subcommand_name in parent.children:
+                raise ValueError(f"Command \"{command.name()}\" has the same slash name as another command: {subcommand_name}")
+            parent.include(self._create_subcommand(prefix, command.name(), self._parser.parameter_descriptions(command), subcommand_name))
+
+        for slash_group in slash_groups.values():
+            for parent in [slash_group, *(child for child in slash_group.children.values() if isinstance(child, arc.SlashSubGroup))]:
+                if len(parent.children) > SLASH_CHILDREN_LIMIT:
+                    raise ValueError(f"Slash group \"{parent.name}\" has {len(parent.children)} commands, discord allows at most {SLASH_CHILDREN_LIMIT}")
+
+        return list(slash_groups.values())
+
+    def _create_subcommand(self, prefix: str, command_name: str, parameters: list[ParameterDescription], subcommand_name: str) -> arc.SlashSubCommand:
+        if len(parameters) > SLASH_OPTIONS_LIMIT:
+            raise ValueError(f"Command \"{command_name}\" has {len(parameters)} parameters, slash commands can have at most {SLASH_OPTIONS_LIMIT}")
+
+        options = {}
+        formatters: dict[str, Callable[[Any], str]] = {}
+        for parameter in parameters:
+            option, formatter = _create_option(parameter)
+            options[option.name] = option
+            formatters[parameter.name] = formatter
+
+        parser = self._parser
+
+        async def invoke(ctx: arc.GatewayContext, **option_values) -> None:
+            execution_context = InteractionContext(ctx)
+            keyword_arguments = [(param_name, formatters[param_name](value)) for param_name, value in option_values.items()]
+
+            # the command is looked up by its name (and resolved if it is lazy), so a reloaded command replaces the old
+            # one here as well
+            outcome = await parser.invoke_outcome(prefix, command_name, keyword_arguments, execution_context, respond_to_interaction)
+
+            if outcome.kind is not ParseOutcomeKind.SUCCESS:
+                await execution_context.respond(outcome.message(), ephemeral=True)
+            elif not execution_context.responded():
+                await execution_context.respond("Done", ephemeral=True)
+
+        return arc.SlashSubCommand(name=subcommand_name, description=_slash_description(f"Same as \"{prefix} {command_name}\""), callback=invoke, options=options)
+
+
+def _create_option(parameter: ParameterDescription) -> tuple[Any, Callable[[Any], str]]:
+    """
+    :return: option of the parameter and function formatting values of the option into raw arguments
+    """
+
+    option_args = {"name": _slash_name(parameter.name), "arg_name": parameter.name, "is_required": parameter.required}
+    kind = parameter.kind
+
+    if kind is ParameterKind.BOOLEAN:
+        return BoolOption(description="true or false", **option_args), _format_boolean
+    if kind is ParameterKind.INTEGER:
+        return IntOption(description="whole number", **option_args), str
+    if kind is ParameterKind.NUMBER:
+        return FloatOption(description="number", **option_args), repr
+
+    if kind is ParameterKind.CHOICE:
+        choices = parameter.choices if len(parameter.choices) <= SLASH_CHOICES_LIMIT else None
+        if all(type(value) is int for value in parameter.choices):
+            return IntOption(description="one of the choices", choices=choices, **option_args), str
+        return StrOption(description="one of the choices", choices=None if choices is None else [str(value) for value in choices], **option_args), _format_string
+
+    if kind is ParameterKind.LIST:
+        return StrOption(description="list, e.g. 1, 2, 3", **option_args), lambda value: _format_collection(value, "[", "]")
+    if kind is ParameterKind.MAPPING:
+        return StrOption(description="mapping, e.g. gold: 10, xp: 5", **option_args), lambda value: _format_collection(value, "{", "}")
+    if kind is ParameterKind.TEXT:
+        return StrOption(description="text", **option_args), _format_string
+
+    return StrOption(description=_slash_description(parameter.type_name), **option_args), str
+
+
+def _format_boolean(value: bool) -> str:
+    return "true" if value else "false"
+
+
+def _format_string(value: str) -> str:
+    # quotes are stripped by the string conversion, so the text stays as it was typed even if it is quoted itself
+    return f"\"{value}\""
+
+
+def _format_collection(value: str, opening: str, closing: str) -> str:
+    value = value.strip()
+    if value.startswith(opening):
+        return value
+    return f"{opening}{value}{closing}"
+
+
+def _slash_name(name: str) -> str:
+    """
+    :raises ValueError: if nothing is left of the name
+    """
+
+    slash_name = _SLASH_NAME_FORBIDDEN_CHARACTERS.sub("", name.lower())[:SLASH_NAME_MAX_LENGTH]
+    if not slash_name:
+        raise ValueError(f"\"{name}\" can't be used as a slash command name")
+    return slash_name
+
+
+def _slash_description(description: str) -> str:
+    return description[:SLASH_DESCRIPTION_MAX_LENGTH]
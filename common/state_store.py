@@ -0,0 +1,624 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class PlayerState:
+    """
+    Character of a member in a guild. Characters are separate in every guild, so all states of a guild are owned
+    by the single process running the shard of the guild.
+    """
+
+    __slots__ = ("guild_id", "player_id", "level", "experience", "gold", "inventory")
+
+    TABLE = "players"
+    KEY_COLUMNS = ("guild_id", "player_id")
+    COLUMNS = (("guild_id", "INTEGER NOT NULL"), ("player_id", "INTEGER NOT NULL"), ("level", "INTEGER NOT NULL"),
+               ("experience", "INTEGER NOT NULL"), ("gold", "INTEGER NOT NULL"), ("inventory", "TEXT NOT NULL"))
+
+    guild_id: int
+    player_id: int
+    level: int
+    experience: int
+    gold: int
+
+    # item name -> count of the items
+    inventory: dict[str, int]
+
+    def __init__(self, guild_id: int, player_id: int, level: int = 1, experience: int = 0, gold: int = 0, inventory: dict[str, int] | None = None):
+        self.guild_id = guild_id
+        self.player_id = player_id
+        self.level = level
+        self.experience = experience
+        self.gold = gold
+        self.inventory = inventory if inventory is not None else {}
+
+    def add_item(self, item: str, count: int = 1):
+        self.inventory[item] = self.inventory.get(item, 0) + count
+
+    def remove_item(self, item: str, count: int = 1) -> bool:
+        """
+        :return: False if the player doesn't have enough of the items, nothing is removed then
+        """
+
+        owned = self.inventory.get(item, 0)
+        if owned < count:
+            return False
+        if owned == count:
+            del self.inventory[item]
+        else:
+            self.inventory[item] = owned - count
+        return True
+
+    def gain_experience(self, experience: int) -> bool:
+        """
+        :return: True if the player reached the next level
+        """
+
+        self.experience += experience
+        leveled_up = False
+        while self.experience >= self.level * 100:
+            self.experience -= self.level * 100
+            self.level += 1
+            leveled_up = True
+        return leveled_up
+
+    def tags(self) -> tuple[str, ...]:
+        """
+        :return: cache tags of values computed from this state (see TTL), invalidated when the state changes
+        """
+
+        return f"player:{self.guild_id}:{self.player_id}", f"players:{self.guild_id}"
+
+    def to_row(self) -> tuple:
+        return self.guild_id, self.player_id, self.level, self.experience, self.gold, json.dumps(self.inventory, sort_keys=True)
+
+    @staticmethod
+    def from_row(row: tuple) -> "PlayerState":
+        guild_id, player_id, level, experience, gold, inventory = row
+        return PlayerState(guild_id, player_id, level, experience, gold, json.loads(inventory))
+
+
+class WorldState:
+    """
+    Shared world of a guild, e.g. the boss all its players fight.
+    """
+
+    __slots__ = ("guild_id", "day", "boss_name", "boss_health")
+
+    TABLE = "worlds"
+    KEY_COLUMNS = ("guild_id",)
+    COLUMNS = (("guild_id", "INTEGER NOT NULL"), ("day", "INTEGER NOT NULL"), ("boss_name", "TEXT NOT NULL"), ("boss_health", "INTEGER NOT NULL"))
+
+    BOSSES = ("Goblin King", "Ancient Dragon", "Lich Lord")
+
+    guild_id: int
+    day: int
+    boss_name: str
+    boss_health: int
+
+    def __init__(self, guild_id: int, day: int = 1, boss_name: str = BOSSES[0], boss_health: int = 1000):
+        self.guild_id = guild_id
+        self.day = day
+        self.boss_name = boss_name
+        self.boss_health = boss_health
+
+    def next_boss(self):
+        self.day += 1
+        self.boss_name = self.BOSSES[self.day % len(self.BOSSES)]
+        self.boss_health = 1000 * self.day
+
+    def tags(self) -> tuple[str, ...]:
+        return f"world:{self.guild_id}",
+
+    def to_row(self) -> tuple:
+        return self.guild_id, self.day, self.boss_name, self.boss_health
+
+    @staticmethod
+    def from_row(row: tuple) -> "WorldState":
+        return WorldState(*row)
+
+
+class GuildSettings:
+    """
+    Prefixes and aliases a guild configured for the commands of the bot (see GuildOverlays).
+    """
+
+    __slots__ = ("guild_id", "prefixes", "aliases")
+
+    TABLE = "guild_settings"
+    KEY_COLUMNS = ("guild_id",)
+    COLUMNS = (("guild_id", "INTEGER NOT NULL"), ("prefixes", "TEXT NOT NULL"), ("aliases", "TEXT NOT NULL"))
+
+    guild_id: int
+
+    # custom prefix -> registered prefix it stands for
+    prefixes: dict[str, str]
+
+    # registered prefix -> alias -> words the alias stands for
+    aliases: dict[str, dict[str, str]]
+
+    def __init__(self, guild_id: int, prefixes: dict[str, str] | None = None, aliases: dict[str, dict[str, str]] | None = None):
+        self.guild_id = guild_id
+        self.prefixes = prefixes if prefixes is not None else {}
+        self.aliases = aliases if aliases is not None else {}
+
+    def aliases_count(self) -> int:
+        return sum(len(prefix_aliases) for prefix_aliases in self.aliases.values())
+
+    def tags(self) -> tuple[str, ...]:
+        return f"guild_settings:{self.guild_id}",
+
+    def to_row(self) -> tuple:
+        return self.guild_id, json.dumps(self.prefixes, sort_keys=True), json.dumps(self.aliases, sort_keys=True)
+
+    @staticmethod
+    def from_row(row: tuple) -> "GuildSettings":
+        guild_id, prefixes, aliases = row
+        return GuildSettings(guild_id, json.loads(prefixes), json.loads(aliases))
+
+
+STATE_TYPES = (PlayerState, WorldState, GuildSettings)
+
+
+class _StateEntry:
+    __slots__ = ("state", "lock", "users")
+
+    state: Any
+
+    # held by the command changing the state, so concurrent commands of the same player don't overwrite each other
+    lock: asyncio.Lock
+
+    # commands holding or waiting for the lock, the entry isn't evicted while it is used
+    users: int
+
+    def __init__(self, state):
+        self.state = state
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class StateStore:
+    """
+    Working set of RPG states kept in memory and written behind into SQLite.
+
+    Commands change states in memory while holding the lock of the state:
+
+        async with state.player(ctx.guild_id, ctx.author_id) as player:
+            player.gold += 10
+
+    Changed (dirty) states are written by a background task in batches, one transaction per batch, either every
+    flush_interval seconds or as soon as flush_batch_size states are dirty. Changes of the last flush interval are
+    lost if the process crashes, close() writes everything. States which aren't dirty nor used are evicted from
+    the working set when it exceeds working_set_size, the least recently used first.
+
+    With write_behind disabled, every changed state is written and committed by the command which changed it.
+
+    SQLite is blocking, so all database work runs in a single dedicated thread.
+    """
+
+    _path: str
+    _working_set_size: int
+    _flush_interval: float
+    _flush_batch_size: int
+    _write_behind: bool
+
+    # snapshots are copies of the whole database made every snapshot_interval seconds, None disables them
+    _snapshot_interval: float | None
+    _snapshot_dir: str | None
+    _snapshots_kept: int
+
+    # (state type, key) -> entry, ordered from the least recently used
+    _entries: OrderedDict[tuple[type, tuple], _StateEntry]
+
+    # entries changed since they were written, dict is used as an ordered set
+    _dirty: dict[tuple[type, tuple], None]
+
+    # entries whose rows are being written, they can't be evicted before the write finishes
+    _writing: set[tuple[type, tuple]]
+
+    # entries being read from the database, concurrent commands of the same player wait for the same read
+    _loading: dict[tuple[type, tuple], asyncio.Task]
+
+    _db_executor: ThreadPoolExecutor | None
+    _connection: sqlite3.Connection | None
+    _flush_lock: asyncio.Lock | None
+    _flush_requested: asyncio.Event | None
+    _tasks: list[asyncio.Task]
+
+    # called with every state changed by a command, e.g. to invalidate values cached from it
+    _change_listeners: list[Callable[[Any], None]]
+
+    _loaded_count: int
+    _evicted_count: int
+    _written_count: int
+    _flushes_count: int
+
+    def __init__(self, path: str, working_set_size: int = 10000, flush_interval: float = 1.0, flush_batch_size: int = 500, write_behind: bool = True, snapshot_interval: float | None = None, snapshot_dir: str | None = None, snapshots_kept: int = 3):
+        self._path = path
+        self._working_set_size = working_set_size
+        self._flush_interval = flush_interval
+        self._flush_batch_size = flush_batch_size
+        self._write_behind = write_behind
+        self._snapshot_interval = snapshot_interval
+        self._snapshot_dir = snapshot_dir
+        self._snapshots_kept = snapshots_kept
+
+        self._entries = OrderedDict()
+        self._dirty = {}
+        self._writing = set()
+        self._loading = {}
+
+        self._db_executor = None
+        self._connection = None
+        self._flush_lock = None
+        self._flush_requested = None
+        self._tasks = []
+        self._change_listeners = []
+
+        self._loaded_count = 0
+        self._evicted_count = 0
+        self._written_count = 0
+        self._flushes_count = 0
+
+    async def open(self):
+        """
+        Opens the database, creates missing tables and starts background flushing and snapshots.
+        """
+
+        if self._connection is not None:
+            return
+
+        self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state-store")
+        self._connection = await self._run_in_db(self._connect)
+        self._flush_lock = asyncio.Lock()
+        self._flush_requested = asyncio.Event()
+
+        loop = asyncio.get_running_loop()
+        if self._write_behind:
+            self._tasks.append(loop.create_task(self._run_flusher()))
+        if self._snapshot_interval is not None:
+            self._tasks.append(loop.create_task(self._run_snapshots()))
+
+    async def close(self):
+        """
+        Stops background tasks, writes all dirty states and closes the database.
+        """
+
+        if self._connection is None:
+            return
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        # commands should have finished by now, so states are written even if a lock is held
+        await self.flush(include_locked=True)
+
+        await self._run_in_db(self._connection.close)
+        self._connection = None
+        self._db_executor.shutdown()
+        self._db_executor = None
+
+    def add_change_listener(self, listener: Callable[[Any], None]):
+        """
+        The listener is called with every state changed by a command when the command stops using the state.
+        """
+
+        self._change_listeners.append(listener)
+
+    def disable_snapshots(self):
+        """
+        Stops taking periodical snapshots, e.g. in all but one of the processes sharing the database (every snapshot
+        copies the whole database and deletes old snapshots, including ones taken by other processes). Has effect
+        only if it is called before the store is opened.
+        """
+
+        self._snapshot_interval = None
+
+    def player(self, guild_id: int, player_id: int):
+        """
+        Async context manager giving the state of the player locked for the duration of the block.
+
+        :raises RuntimeError: if the store isn't open
+        """
+
+        return self._use(PlayerState, (guild_id, player_id))
+
+    def world(self, guild_id: int):
+        """
+        Async context manager giving the state of the world of the guild locked for the duration of the block.
+
+        :raises RuntimeError: if the store isn't open
+        """
+
+        return self._use(WorldState, (guild_id,))
+
+    def guild_settings(self, guild_id: int):
+        """
+        Async context manager giving the settings of the guild locked for the duration of the block.
+
+        :raises RuntimeError: if the store isn't open
+        """
+
+        return self._use(GuildSettings, (guild_id,))
+
+    @asynccontextmanager
+    async def _use(self, state_type: type, key: tuple) -> AsyncIterator[Any]:
+        entry = await self._get_entry(state_type, key)
+
+        entry.users += 1
+        try:
+            async with entry.lock:
+                row = entry.state.to_row()
+                try:
+                    yield entry.state
+                finally:
+                    # changes are kept even if the command failed, other commands see the same state in memory anyway
+                    if entry.state.to_row() != row:
+                        for listener in self._change_listeners:
+                            listener(entry.state)
+                        await self._mark_dirty(state_type, key, entry)
+        finally:
+            entry.users -= 1
+            self._evict()
+
+    async def _mark_dirty(self, state_type: type, key: tuple, entry: _StateEntry):
+        if not self._write_behind:
+            await self._run_in_db(self._write_rows, {state_type: [entry.state.to_row()]})
+            self._written_count += 1
+            self._flushes_count += 1
+            return
+
+        self._dirty[(state_type, key)] = None
+        if len(self._dirty) >= self._flush_batch_size:
+            self._flush_requested.set()
+
+    async def _get_entry(self, state_type: type, key: tuple) -> _StateEntry:
+        if self._connection is None:
+            raise RuntimeError("State store isn't open")
+
+        entry_key = (state_type, key)
+        entry = self._entries.get(entry_key)
+        if entry is not None:
+            self._entries.move_to_end(entry_key)
+            return entry
+
+        loading = self._loading.get(entry_key)
+        if loading is None:
+            loading = asyncio.get_running_loop().create_task(self._load_entry(state_type, key))
+            self._loading[entry_key] = loading
+
+        # a cancelled command doesn't cancel the read other commands may wait for
+        return await asyncio.shield(loading)
+
+    async def _load_entry(self, state_type: type, key: tuple) -> _StateEntry:
+        entry_key = (state_type, key)
+        try:
+            row = await self._run_in_db(self._read_row, state_type, key)
+        finally:
+            del self._loading[entry_key]
+
+        entry = _StateEntry(state_type(*key) if row is None else state_type.from_row(row))
+        self._entries[entry_key] = entry
+        self._loaded_count += 1
+        # the working set isn't trimmed before the command gets the entry, if other entries were dirty or used, the new
+        # entry would be evicted and its changes lost, it is trimmed when the command stops using the entry
+        return entry
+
+    def _evict(self):
+        overflow = len(self._entries) - self._working_set_size
+        if overflow <= 0:
+            return
+
+        evicted = []
+        for entry_key, entry in self._entries.items():
+            if entry.users == 0 and entry_key not in self._dirty and entry_key not in self._writing:
+                evicted.append(entry_key)
+                if len(evicted) == overflow:
+                    break
+
+        for entry_key in evicted:
+            del self._entries[entry_key]
+        self._evicted_count += len(evicted)
+
+        # the rest of the working set is dirty, it can be evicted after it is written
+        if len(evicted) < overflow and self._flush_requested is not None:
+            self._flush_requested.set()
+
+    async def flush(self, include_locked: bool = False) -> int:
+        """
+        Writes dirty states in a single transaction. States locked by running commands are written by the next flush,
+        because they may be changed half way.
+
+        :return: count of written states
+        :raises sqlite3.Error: if the write failed, the states stay dirty then
+        """
+
+        if self._connection is None:
+            return 0
+
+        async with self._flush_lock:
+            rows: dict[type, list[tuple]] = {}
+            written_keys = []
+            for entry_key in self._dirty:
+                entry = self._entries[entry_key]
+                if entry.lock.locked() and not include_locked:
+                    continue
+                rows.setdefault(entry_key[0], []).append(entry.state.to_row())
+                written_keys.append(entry_key)
+
+            if not written_keys:
+                return 0
+
+            for entry_key in written_keys:
+                del self._dirty[entry_key]
+            self._writing.update(written_keys)
+
+            try:
+                await self._run_in_db(self._write_rows, rows)
+            except BaseException:
+                for entry_key in written_keys:
+                    self._dirty[entry_key] = None
+                raise
+            finally:
+                self._writing.difference_update(written_keys)
+
+            self._written_count += len(written_keys)
+            self._flushes_count += 1
+            self._evict()
+            return len(written_keys)
+
+    async def top_players(self, guild_id: int, limit: int = 10) -> list[PlayerState]:
+        """
+        Players of the guild with the highest level and experience. Dirty states are written first, states locked
+        by running commands may be read as they were before the commands.
+
+        :raises RuntimeError: if the store isn't open
+        :raises sqlite3.Error: if writing dirty states or reading failed
+        """
+
+        if self._connection is None:
+            raise RuntimeError("State store isn't open")
+
+        await self.flush()
+        rows = await self._run_in_db(self._read_top_rows, PlayerState, guild_id, limit)
+        return [PlayerState.from_row(row) for row in rows]
+
+    async def configured_guild_ids(self) -> list[int]:
+        """
+        Guilds whose settings have at least one prefix or alias, dirty states are written first.
+
+        :raises RuntimeError: if the store isn't open
+        :raises sqlite3.Error: if writing dirty states or reading failed
+        """
+
+        if self._connection is None:
+            raise RuntimeError("State store isn't open")
+
+        await self.flush()
+        return await self._run_in_db(self._read_configured_guild_ids)
+
+    async def snapshot(self) -> str:
+        """
+        Writes dirty states and copies the whole database into the snapshot directory, old snapshots are deleted.
+
+        :return: path of the snapshot
+        :raises RuntimeError: if the store has no snapshot directory or isn't open
+        """
+
+        if self._snapshot_dir is None or self._connection is None:
+            raise RuntimeError("State store has no snapshot directory or isn't open")
+
+        await self.flush()
+        return await self._run_in_db(self._write_snapshot)
+
+    async def _run_flusher(self):
+        while True:
+            # asyncio.wait instead of wait_for, which (before python 3.12) swallows cancellation of the flusher
+            # when the event is set or the timeout expires at the same time, close() would wait for it forever
+            requested = asyncio.get_running_loop().create_task(self._flush_requested.wait())
+            try:
+                await asyncio.wait((requested,), timeout=self._flush_interval)
+            finally:
+                requested.cancel()
+            self._flush_requested.clear()
+
+            try:
+                await self.flush()
+            except sqlite3.Error:
+                logger.exception("Writing %d dirty states failed, they are retried with the next flush", len(self._dirty))
+
+    async def _run_snapshots(self):
+        while True:
+            await asyncio.sleep(self._snapshot_interval)
+            try:
+                await self.snapshot()
+            except (sqlite3.Error, OSError):
+                logger.exception("Snapshot of the state store failed")
+
+    #----- Database Thread ------#
+
+    def _run_in_db(self, func: Callable, *args) -> asyncio.Future:
+        return asyncio.get_running_loop().run_in_executor(self._db_executor, func, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self._path)
+        # readers don't block the writer and commits don't wait for the disk on every transaction
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        # several shard worker processes may share the database
+        connection.execute("PRAGMA busy_timeout=5000")
+
+        with connection:
+            for state_type in STATE_TYPES:
+                columns = ", ".join(f"{name} {column_type}" for name, column_type in state_type.COLUMNS)
+                connection.execute(f"CREATE TABLE IF NOT EXISTS {state_type.TABLE} ({columns}, PRIMARY KEY ({', '.join(state_type.KEY_COLUMNS)}))")
+        return connection
+
+    def _read_row(self, state_type: type, key: tuple) -> tuple | None:
+        condition = " AND ".join(f"{name} = ?" for name in state_type.KEY_COLUMNS)
+        columns = ", ".join(name for name, _ in state_type.COLUMNS)
+        return self._connection.execute(f"SELECT {columns} FROM {state_type.TABLE} WHERE {condition}", key).fetchone()
+
+    def _read_top_rows(self, state_type: type, guild_id: int, limit: int) -> list[tuple]:
+        columns = ", ".join(name for name, _ in state_type.COLUMNS)
+        return self._connection.execute(
+            f"SELECT {columns} FROM {state_type.TABLE} WHERE guild_id = ? ORDER BY level DESC, experience DESC LIMIT ?", (guild_id, limit)
+        ).fetchall()
+
+    def _read_configured_guild_ids(self) -> list[int]:
+        rows = self._connection.execute(f"SELECT guild_id FROM {GuildSettings.TABLE} WHERE prefixes != '{{}}' OR aliases != '{{}}'").fetchall()
+        return [guild_id for guild_id, in rows]
+
+    def _write_rows(self, rows: dict[type, list[tuple]]):
+        with self._connection:
+            for state_type, state_rows in rows.items():
+                columns = ", ".join(name for name, _ in state_type.COLUMNS)
+                placeholders = ", ".join("?" for _ in state_type.COLUMNS)
+                self._connection.executemany(f"INSERT OR REPLACE INTO {state_type.TABLE} ({columns}) VALUES ({placeholders})", state_rows)
+
+    def _write_snapshot(self) -> str:
+        os.makedirs(self._snapshot_dir, exist_ok=True)
+        snapshot_path = os.path.join(self._snapshot_dir, f"state-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.sqlite3")
+
+        snapshot = sqlite3.connect(snapshot_path)
+        try:
+            self._connection.backup(snapshot)
+        finally:
+            snapshot.close()
+
+        snapshots = sorted(file_name for file_name in os.listdir(self._snapshot_dir) if file_name.startswith("state-") and file_name.endswith(".sqlite3"))
+        for file_name in snapshots[:-self._snapshots_kept]:
+            os.remove(os.path.join(self._snapshot_dir, file_name))
+        return snapshot_path
+
+    #----- Store Properties ------#
+
+    def working_set_count(self) -> int:
+        return len(self._entries)
+
+    def dirty_count(self) -> int:
+        return len(self._dirty)
+
+    def loaded_count(self) -> int:
+        return self._loaded_count
+
+    def evicted_count(self) -> int:
+        return self._evicted_count
+
+    def written_count(self) -> int:
+        return self._written_count
+
+    def flushes_count(self) -> int:
+        return self._flushes_count
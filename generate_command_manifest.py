@@ -0,0 +1,25 @@
+"""
+Generates manifest of commands, so the bot can start without importing command modules.
+
+Run from the repository root after commands were changed (e.g. as a deploy step):
+    python generate_command_manifest.py
+    python generate_command_manifest.py --package commands --output commands/manifest.json
+"""
+import argparse
+
+from common.models.message_command_parsing.command_manifest import CommandManifest
+
+
+def main(argv: list[str] | None = None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--package", default="commands", help="package whose modules declare commands")
+    arg_parser.add_argument("--output", default="commands/manifest.json", help="path of the generated manifest")
+    args = arg_parser.parse_args(argv)
+
+    manifest = CommandManifest.generate(args.package)
+    manifest.save(args.output)
+    print(f"{len(manifest.entries())} commands written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
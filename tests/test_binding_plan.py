@@ -0,0 +1,89 @@
+import asyncio
+import inspect
+
+import pytest
+
+from common.models.message_command_parsing import BindingPlan, Command, CommandParserBuilder, DuplicateArgumentError, MissingArgumentError, \
+    ParseOutcomeKind, RedundantArgumentError, StringConverter, UnknownArgumentError
+
+
+async def trade(ctx, gold: int, item: str = "potion", note: str | None = None, count: int = 0):
+    ...
+
+
+@pytest.fixture
+def plan() -> BindingPlan:
+    return BindingPlan.from_signature(inspect.signature(trade), "ctx").with_converters(StringConverter())
+
+
+def test_context_parameter_has_no_slot(plan):
+    assert [slot.name for slot in plan.slots()] == ["gold", "item", "note", "count"]
+    assert plan.required_count() == 1
+
+
+def test_positional_arguments_fill_slots_in_order(plan):
+    assert plan.bind(["10", "sword"], []) == {"gold": 10, "item": "sword", "note": None, "count": 0}
+
+
+def test_keyword_arguments_fill_slots_after_positional_ones(plan):
+    assert plan.bind(["10"], [("count", "3"), ("item", "shield")]) == {"gold": 10, "item": "shield", "note": None, "count": 3}
+
+
+def test_keyword_argument_can_fill_required_slot(plan):
+    assert plan.bind([], [("gold", "5")])["gold"] == 5
+
+
+def test_defaults_fill_missing_slots(plan):
+    # None and 0 are legitimate defaults, missing slots are told apart from them by the sentinel
+    command_args = plan.bind(["1"], [])
+
+    assert command_args["note"] is None
+    assert command_args["count"] == 0
+
+
+def test_given_argument_replaces_none_default(plan):
+    assert plan.bind(["1", "potion", "thanks"], [])["note"] == "thanks"
+
+
+@pytest.mark.parametrize("positional_arguments, keyword_arguments, error_type, kind", [
+    (["1", "a", "b", "2", "extra"], [], RedundantArgumentError, ParseOutcomeKind.REDUNDANT_ARGUMENT),
+    (["1"], [("colour", "red")], UnknownArgumentError, ParseOutcomeKind.INVALID_ARGUMENT),
+    (["1"], [("gold", "2")], DuplicateArgumentError, ParseOutcomeKind.INVALID_ARGUMENT),
+    (["1"], [("count", "1"), ("count", "2")], DuplicateArgumentError, ParseOutcomeKind.INVALID_ARGUMENT),
+    ([], [("item", "sword")], MissingArgumentError, ParseOutcomeKind.MISSING_ARGUMENT),
+])
+def test_binding_failures(plan, positional_arguments, keyword_arguments, error_type, kind):
+    with pytest.raises(error_type):
+        plan.bind(positional_arguments, keyword_arguments)
+
+    command_args, failure = plan.try_bind(positional_arguments, keyword_arguments)
+    assert command_args is None
+    assert failure.kind is kind
+    assert isinstance(failure.error(), error_type)
+
+
+def test_conversion_failure_is_returned(plan):
+    command_args, failure = plan.try_bind(["lots"], [])
+
+    assert command_args is None
+    assert failure.kind is ParseOutcomeKind.SYNTAX_ERROR
+
+
+def test_without_parameters_renumbers_slots(plan):
+    plan = plan.without_parameters(["item"])
+
+    assert [(slot.name, slot.index) for slot in plan.slots()] == [("gold", 0), ("note", 1), ("count", 2)]
+    assert plan.bind(["1", "hi"], []) == {"gold": 1, "note": "hi", "count": 0}
+
+
+@pytest.mark.parametrize("command_string, kind", [
+    ("!t trade 1 count: 2", ParseOutcomeKind.SUCCESS),
+    ("!t trade 1 count:", ParseOutcomeKind.SYNTAX_ERROR),
+    ("!t trade 1 colour: red", ParseOutcomeKind.INVALID_ARGUMENT),
+    ("!t trade 1 gold: 2", ParseOutcomeKind.INVALID_ARGUMENT),
+    ("!t trade item: sword", ParseOutcomeKind.MISSING_ARGUMENT),
+])
+def test_keyword_arguments_in_messages(command_string, kind):
+    parser = CommandParserBuilder().with_commands([Command("!t", "trade")(trade)]).build()
+
+    assert asyncio.run(parser.parse_outcome(command_string, None)).kind is kind
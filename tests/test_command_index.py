@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from common.models.message_command_parsing import AmbiguousCommandError, Command, CommandParserBuilder, CommandTrie, ParseOutcomeKind
+
+
+def make_command(prefix: str, name: str) -> Command:
+    async def command():
+        return name
+
+    return Command(prefix, name)(command)
+
+
+def parse(commands: list[Command], command_string: str, case_sensitive: bool = False):
+    replies = []
+
+    async def collect_reply(execution_context, content):
+        replies.append(content)
+
+    parser = CommandParserBuilder().with_commands(commands).with_case_sensitivity(case_sensitive).with_responder(collect_reply).build()
+    outcome = asyncio.run(parser.parse_outcome(command_string, None))
+    return outcome, replies
+
+
+def test_multi_word_names_are_found_by_their_words():
+    trie = CommandTrie(case_sensitive=False)
+    inventory_show = make_command("!rpg", "inventory show")
+    shop_buy = make_command("!rpg", "shop buy")
+    trie.insert(inventory_show)
+    trie.insert(shop_buy)
+
+    assert trie.find(["inventory", "show", "all"]) == (inventory_show, 2)
+    assert trie.find(["shop", "buy"]) == (shop_buy, 2)
+    assert trie.find(["inventory"]) == (None, 0)
+    assert trie.get("inventory show") is inventory_show
+    assert len(trie) == 2
+
+
+def test_longest_name_wins():
+    trie = CommandTrie(case_sensitive=False)
+    shop = make_command("!rpg", "shop")
+    shop_buy = make_command("!rpg", "shop buy")
+    trie.insert(shop_buy)
+    trie.insert(shop)
+
+    assert trie.find(["shop", "buy", "potion"]) == (shop_buy, 2)
+    assert trie.find(["shop", "sell"]) == (shop, 1)
+
+
+def test_names_are_case_folded_unless_case_sensitive():
+    folded = CommandTrie(case_sensitive=False)
+    folded.insert(make_command("!rpg", "Shop Buy"))
+    exact = CommandTrie(case_sensitive=True)
+    exact.insert(make_command("!rpg", "Shop Buy"))
+
+    assert folded.find(["SHOP", "buy"])[1] == 2
+    assert exact.find(["SHOP", "buy"]) == (None, 0)
+    assert exact.find(["Shop", "Buy"])[1] == 2
+
+
+def test_removed_command_keeps_longer_names():
+    trie = CommandTrie(case_sensitive=False)
+    shop = make_command("!rpg", "shop")
+    shop_buy = make_command("!rpg", "shop buy")
+    trie.insert(shop)
+    trie.insert(shop_buy)
+
+    assert trie.remove(shop)
+    assert not trie.remove(shop)
+    assert trie.find(["shop", "sell"]) == (None, 0)
+    assert trie.find(["shop", "buy"]) == (shop_buy, 2)
+
+
+@pytest.mark.parametrize("first_name, second_name, case_sensitive", [
+    ("shop buy", "shop buy", False),
+    ("shop buy", "SHOP  Buy", False),
+    ("ping", "ping", True),
+])
+def test_duplicate_names_are_ambiguous(first_name, second_name, case_sensitive):
+    builder = CommandParserBuilder().with_case_sensitivity(case_sensitive).with_commands([make_command("!rpg", first_name), make_command("!rpg", second_name)])
+
+    with pytest.raises(AmbiguousCommandError):
+        builder.build()
+
+
+def test_same_names_with_different_case_or_prefix_are_not_ambiguous():
+    CommandParserBuilder().with_case_sensitivity(True).with_commands([make_command("!rpg", "ping"), make_command("!rpg", "Ping")]).build()
+    CommandParserBuilder().with_commands([make_command("!rpg", "ping"), make_command("!other", "ping")]).build()
+
+
+def test_parser_dispatches_to_the_longest_name():
+    commands = [make_command("!rpg", "shop"), make_command("!rpg", "shop buy"), make_command("!rpg", "inventory show")]
+
+    assert parse(commands, "!rpg shop buy")[1] == ["shop buy"]
+    assert parse(commands, "!rpg SHOP")[1] == ["shop"]
+    assert parse(commands, "!rpg inventory   show")[1] == ["inventory show"]
+    assert parse(commands, "!rpg inventory")[0].kind is ParseOutcomeKind.NOT_FOUND
+    assert parse(commands, "!other shop")[0].kind is ParseOutcomeKind.NOT_A_COMMAND
+    assert parse(commands, "!rpg SHOP", case_sensitive=True)[0].kind is ParseOutcomeKind.NOT_FOUND
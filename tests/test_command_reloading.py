@@ -0,0 +1,185 @@
+import asyncio
+import importlib
+import itertools
+import logging
+import os
+import sys
+
+import pytest
+
+from common.models.message_command_parsing import AmbiguousCommandError, Command, CommandModuleWatcher, CommandParserBuilder, ParseOutcomeKind
+from common.models.message_command_parsing.command import CREATED_COMMANDS
+
+PING_MODULE = """
+from common.models.message_command_parsing import Command
+
+
+@Command("!h", "ping")
+async def ping():
+    return "{reply}"
+"""
+
+STATS_MODULE = """
+from common.models.message_command_parsing import Command
+
+
+@Command("!h", "stats")
+async def stats(level: int):
+    return level * 2
+"""
+
+# modification times given to written modules, every write has a newer one even within a single clock tick
+_MODIFICATION_TIMES = itertools.count(1_000_000_000_000_000_000, 1_000_000_000)
+
+
+class CommandPackage:
+    def __init__(self, directory, name: str):
+        self.directory = directory / name
+        self.name = name
+        self.replies = []
+        self.directory.mkdir()
+        (self.directory / "__init__.py").write_text("")
+        self.write("ping", PING_MODULE.format(reply="pong"))
+
+        self.parser = CommandParserBuilder().with_commands(list(self.module_commands("ping"))).with_responder(self.collect_reply).build()
+        self.watcher = CommandModuleWatcher(self.parser, name, interval=0.01)
+
+    def write(self, module: str, source: str):
+        module_path = self.directory / f"{module}.py"
+        module_path.write_text(source)
+        modification_time = next(_MODIFICATION_TIMES)
+        os.utime(module_path, ns=(modification_time, modification_time))
+
+    def remove(self, module: str):
+        (self.directory / f"{module}.py").unlink()
+
+    def module_commands(self, module: str):
+        module = importlib.import_module(f"{self.name}.{module}")
+        return (value for value in vars(module).values() if isinstance(value, Command))
+
+    async def collect_reply(self, execution_context, content):
+        self.replies.append(content)
+
+    def parse(self, command_string: str) -> ParseOutcomeKind:
+        return asyncio.run(self.parser.parse_outcome(command_string, None)).kind
+
+
+@pytest.fixture
+def package(tmp_path, monkeypatch, request):
+    # reloaded sources are compared with cached bytecode by modification time in seconds only
+    monkeypatch.setattr(sys, "dont_write_bytecode", True)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    created_commands = list(CREATED_COMMANDS)
+
+    name = f"hot_commands_{request.node.name.replace('[', '_').replace(']', '')}"
+    yield CommandPackage(tmp_path, name)
+
+    for module_name in [module_name for module_name in sys.modules if module_name == name or module_name.startswith(name + ".")]:
+        del sys.modules[module_name]
+    CREATED_COMMANDS[:] = created_commands
+
+
+def test_swap_replaces_commands_at_once(package):
+    [old_ping] = package.parser.registered_commands()
+
+    @Command("!h", "ping")
+    async def new_ping():
+        return "new pong"
+
+    @Command("!h", "pong")
+    async def pong():
+        return "ping"
+
+    package.parser.swap_commands([old_ping], [new_ping, pong])
+
+    assert package.parse("!h ping") is ParseOutcomeKind.SUCCESS
+    assert package.parse("!h pong") is ParseOutcomeKind.SUCCESS
+    assert package.replies == ["new pong", "ping"]
+    assert package.parser.registered_commands() == [new_ping, pong]
+
+
+def test_failed_swap_leaves_parser_untouched(package):
+    [ping] = package.parser.registered_commands()
+
+    @Command("!h", "PING")
+    async def other_ping():
+        ...
+
+    @Command("!h", "other")
+    async def other():
+        ...
+
+    with pytest.raises(AmbiguousCommandError):
+        package.parser.swap_commands([], [other, other_ping])
+    with pytest.raises(ValueError):
+        package.parser.swap_commands([other], [])
+
+    assert package.parser.registered_commands() == [ping]
+    assert package.parse("!h other") is ParseOutcomeKind.NOT_FOUND
+
+
+def test_added_module_is_loaded(package):
+    package.write("stats", STATS_MODULE)
+
+    assert package.watcher.poll() == [f"{package.name}.stats"]
+    assert package.parse("!h stats 4") is ParseOutcomeKind.SUCCESS
+    assert package.replies == [8]
+
+
+def test_changed_module_replaces_its_commands(package):
+    package.write("ping", PING_MODULE.format(reply="pong again"))
+
+    assert package.watcher.poll() == [f"{package.name}.ping"]
+    assert package.watcher.poll() == []
+    assert package.parse("!h ping") is ParseOutcomeKind.SUCCESS
+    assert package.replies == ["pong again"]
+    assert len(package.parser.registered_commands()) == 1
+
+
+def test_renamed_command_is_not_found_by_old_name(package):
+    package.write("ping", PING_MODULE.format(reply="pong").replace("\"ping\"", "\"pong\""))
+    package.watcher.poll()
+
+    assert package.parse("!h ping") is ParseOutcomeKind.NOT_FOUND
+    assert package.parse("!h pong") is ParseOutcomeKind.SUCCESS
+
+
+def test_deleted_module_removes_its_commands(package):
+    package.write("stats", STATS_MODULE)
+    package.watcher.poll()
+    package.remove("stats")
+
+    assert package.watcher.poll() == [f"{package.name}.stats"]
+    assert package.parse("!h stats 4") is ParseOutcomeKind.NOT_FOUND
+    assert package.parse("!h ping") is ParseOutcomeKind.SUCCESS
+
+
+def test_module_with_syntax_error_keeps_previous_commands(package, caplog):
+    package.write("ping", PING_MODULE.format(reply="pong") + "\ndef broken(:\n")
+
+    with caplog.at_level(logging.ERROR):
+        assert package.watcher.poll() == []
+    assert "its previous commands stay registered" in caplog.text
+    assert package.parse("!h ping") is ParseOutcomeKind.SUCCESS
+
+    # it isn't retried until it changes again
+    assert package.watcher.poll() == []
+    package.write("ping", PING_MODULE.format(reply="fixed"))
+    assert package.watcher.poll() == [f"{package.name}.ping"]
+    package.parse("!h ping")
+
+    assert package.replies == ["pong", "fixed"]
+
+
+def test_watcher_polls_in_background(package):
+    async def scenario():
+        package.watcher.start()
+        package.write("stats", STATS_MODULE)
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if len(package.parser.registered_commands()) == 2:
+                break
+        package.watcher.stop()
+        return await package.parser.parse_outcome("!h stats 1", None)
+
+    assert asyncio.run(scenario()).kind is ParseOutcomeKind.SUCCESS
@@ -0,0 +1,48 @@
+from common.models.message_command_parsing import Command, CommandSuggestionIndex
+
+
+def make_command(name: str) -> Command:
+    async def command():
+        ...
+
+    return Command("!rpg", name)(command)
+
+
+def test_most_similar_name_is_suggested():
+    index = CommandSuggestionIndex(case_sensitive=False)
+    for name in ["inventory", "invite", "profile", "shop buy"]:
+        index.add(make_command(name))
+
+    assert index.find_most_similar("inventroy").name() == "inventory"
+    assert index.find_most_similar("SHOP BYU").name() == "shop buy"
+    assert index.find_most_similar("quest") is None
+
+
+def test_removed_command_is_not_suggested():
+    index = CommandSuggestionIndex(case_sensitive=False)
+    inventory = make_command("inventory")
+    index.add(inventory)
+    index.add(make_command("invent"))
+
+    index.remove(inventory)
+    index.remove(inventory)
+
+    assert index.find_most_similar("inventory").name() == "invent"
+    assert len(index) == 1
+
+
+def test_placeholders_of_removed_commands_are_compacted():
+    index = CommandSuggestionIndex(case_sensitive=False)
+    profile = make_command("profile")
+    index.add(profile)
+
+    # the same commands are removed and added again by every reload of their module
+    for _ in range(100):
+        shop = make_command("shop")
+        index.add(shop)
+        index.remove(shop)
+
+    assert len(index) == 1
+    assert len(index._commands) <= 2
+    assert set(index._trigrams) == index._get_trigrams("profile")
+    assert index.find_most_similar("profle") is profile
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from common.fake_gateway import FakeGuildMessageEvent
+from common.models.message_command_parsing import Command, CommandParserBuilder, GuildConfiguration, ParseOutcomeKind
+
+
+@Command("!t", "a")
+async def command_a(x: int, y: int = 0, z: list[int] | None = None):
+    return x
+
+
+@pytest.fixture
+def parser():
+    return CommandParserBuilder().with_commands([command_a]).with_pipelines(";").build()
+
+
+# (command string, kind of the failure, text the position points at)
+FAILURES = [
+    ("!t a 1 2 [3] 4", ParseOutcomeKind.REDUNDANT_ARGUMENT, "4"),
+    ("!t a 1 2 3, 4 5", ParseOutcomeKind.REDUNDANT_ARGUMENT, "5"),
+    ("!t  zz", ParseOutcomeKind.NOT_FOUND, "zz"),
+    ("!t a 1; zz", ParseOutcomeKind.NOT_FOUND, "zz"),
+    ("!t a 1; a q", ParseOutcomeKind.SYNTAX_ERROR, "q"),
+    ("!t a 1 q", ParseOutcomeKind.SYNTAX_ERROR, "q"),
+    ("!t a 1 z: 2 y: q", ParseOutcomeKind.SYNTAX_ERROR, "q"),
+    ("!t a 1 y: 2 z: 3, q", ParseOutcomeKind.SYNTAX_ERROR, "3, q"),
+]
+
+
+@pytest.mark.parametrize("command_string, kind, failed_text", FAILURES)
+def test_failure_position_is_offset_in_message(parser, command_string, kind, failed_text):
+    outcome = asyncio.run(parser.parse_outcome(command_string, None))
+
+    assert outcome.kind is kind
+    assert command_string[outcome.position:] == failed_text
+
+
+def test_missing_command_name_is_expected_after_prefix(parser):
+    assert asyncio.run(parser.parse_outcome("!t", None)).position == 2
+
+
+def test_arguments_of_alias_point_at_alias():
+    async def load_configuration(guild_id):
+        return GuildConfiguration({}, {"!t": {"bad": "a q"}})
+
+    parser = CommandParserBuilder().with_commands([command_a]).with_guild_overlays(load_configuration).build()
+    command_string = "!t bad 2"
+    outcome = asyncio.run(parser.parse_outcome(command_string, FakeGuildMessageEvent(1, 1, 1, command_string)))
+
+    assert outcome.kind is ParseOutcomeKind.SYNTAX_ERROR
+    assert command_string[outcome.position:].startswith("bad")
+
+
+def test_structured_arguments_have_no_position(parser):
+    outcome = asyncio.run(parser.invoke_outcome("!t", "a", [("x", "q")], None))
+
+    assert outcome.kind is ParseOutcomeKind.SYNTAX_ERROR
+    assert outcome.position == -1
@@ -0,0 +1,150 @@
+import asyncio
+
+from common.fake_gateway import FakeGuildMessageEvent
+from common.models.message_command_parsing import Command, CommandParserBuilder, GuildConfiguration, ParseOutcomeKind
+from common.state_store import StateStore
+
+CONFIGURED_GUILD = 1
+OTHER_GUILD = 2
+
+
+@Command("!rpg", "buy")
+async def buy(item: str = "nothing", count: int = 1):
+    return f"{count} {item}"
+
+
+@Command("!rpg", "profile")
+async def profile():
+    return "profile"
+
+
+class Guilds:
+    def __init__(self):
+        self.configurations = {CONFIGURED_GUILD: GuildConfiguration({"?": "!rpg"}, {"!rpg": {"hp": "buy potion", "inv": "profile"}})}
+        self.loads = []
+        self.replies = []
+
+    async def load(self, guild_id):
+        self.loads.append(guild_id)
+        return self.configurations.get(guild_id)
+
+    async def collect_reply(self, execution_context, content):
+        self.replies.append(content)
+
+    def parser(self):
+        return CommandParserBuilder().with_commands([buy, profile]).with_responder(self.collect_reply).with_guild_overlays(self.load, max_overlays=10).build()
+
+
+def message(guild_id: int, content: str) -> FakeGuildMessageEvent:
+    return FakeGuildMessageEvent(guild_id, 1, 1, content)
+
+
+def test_custom_prefixes_and_aliases_resolve_in_their_guild():
+    guilds = Guilds()
+    parser = guilds.parser()
+
+    async def scenario():
+        return [(await parser.parse_outcome(content, message(guild_id, content))).kind for guild_id, content in [
+            (CONFIGURED_GUILD, "? profile"),
+            (CONFIGURED_GUILD, "!rpg HP 3"),
+            (CONFIGURED_GUILD, "? inv"),
+            (OTHER_GUILD, "? profile"),
+            (OTHER_GUILD, "!rpg hp"),
+        ]]
+
+    assert asyncio.run(scenario()) == [ParseOutcomeKind.SUCCESS] * 3 + [ParseOutcomeKind.NOT_A_COMMAND, ParseOutcomeKind.NOT_FOUND]
+    # the alias is followed by the rest of the message
+    assert guilds.replies == ["profile", "3 potion", "profile"]
+
+
+def test_could_match_knows_custom_prefixes_of_loaded_guilds():
+    guilds = Guilds()
+    parser = guilds.parser()
+
+    # not loaded yet, the message has to be parsed
+    assert parser.could_match("? inv", CONFIGURED_GUILD)
+    asyncio.run(parser.parse_outcome("? inv", message(CONFIGURED_GUILD, "? inv")))
+
+    assert parser.could_match("? inv", CONFIGURED_GUILD)
+    assert not parser.could_match("?? inv", CONFIGURED_GUILD)
+    assert not parser.could_match("? inv", None)
+
+
+def test_invalidated_guild_is_loaded_again():
+    guilds = Guilds()
+    parser = guilds.parser()
+    guild_overlays = parser.guild_overlays()
+
+    async def scenario():
+        kinds = [(await parser.parse_outcome("? inv", message(CONFIGURED_GUILD, "? inv"))).kind]
+        guilds.configurations[CONFIGURED_GUILD] = GuildConfiguration({"$": "!rpg"}, {})
+        # still the cached overlay
+        kinds.append((await parser.parse_outcome("? inv", message(CONFIGURED_GUILD, "? inv"))).kind)
+
+        guild_overlays.invalidate(CONFIGURED_GUILD)
+        kinds.append((await parser.parse_outcome("? inv", message(CONFIGURED_GUILD, "? inv"))).kind)
+        kinds.append((await parser.parse_outcome("$ profile", message(CONFIGURED_GUILD, "$ profile"))).kind)
+        return kinds
+
+    assert asyncio.run(scenario()) == [ParseOutcomeKind.SUCCESS, ParseOutcomeKind.SUCCESS, ParseOutcomeKind.NOT_A_COMMAND, ParseOutcomeKind.SUCCESS]
+    assert guilds.loads == [CONFIGURED_GUILD, CONFIGURED_GUILD]
+    assert guild_overlays.invalidated_count() == 1
+
+
+def test_guilds_without_configuration_are_not_loaded():
+    guilds = Guilds()
+    parser = guilds.parser()
+    guild_overlays = parser.guild_overlays()
+    guild_overlays.set_configured_guilds([CONFIGURED_GUILD])
+
+    async def scenario():
+        for guild_id in range(OTHER_GUILD, OTHER_GUILD + 100):
+            await parser.parse_outcome("!rpg profile", message(guild_id, "!rpg profile"))
+        await parser.parse_outcome("? inv", message(CONFIGURED_GUILD, "? inv"))
+
+    asyncio.run(scenario())
+
+    assert guilds.loads == [CONFIGURED_GUILD]
+    assert guild_overlays.overlays_count() == 1
+    assert not parser.could_match("? inv", OTHER_GUILD)
+
+
+def test_guild_which_configured_something_is_loaded_with_next_message():
+    guilds = Guilds()
+    parser = guilds.parser()
+    guild_overlays = parser.guild_overlays()
+    guild_overlays.set_configured_guilds([CONFIGURED_GUILD])
+
+    guilds.configurations[OTHER_GUILD] = GuildConfiguration({"?": "!rpg"}, {})
+    assert not parser.could_match("? profile", OTHER_GUILD)
+
+    guild_overlays.set_configured(OTHER_GUILD, True)
+    guild_overlays.invalidate(OTHER_GUILD)
+    assert parser.could_match("? profile", OTHER_GUILD)
+    assert asyncio.run(parser.parse_outcome("? profile", message(OTHER_GUILD, "? profile"))).kind is ParseOutcomeKind.SUCCESS
+
+    # the guild removed everything again
+    guild_overlays.set_configured(OTHER_GUILD, False)
+    guild_overlays.invalidate(OTHER_GUILD)
+    assert not parser.could_match("? profile", OTHER_GUILD)
+    assert guilds.loads == [OTHER_GUILD]
+
+
+def test_state_store_lists_guilds_with_prefixes_or_aliases(tmp_path):
+    async def scenario():
+        store = StateStore(str(tmp_path / "state.sqlite3"))
+        await store.open()
+        try:
+            async with store.guild_settings(1) as settings:
+                settings.prefixes["?"] = "!rpg"
+            async with store.guild_settings(2) as settings:
+                settings.aliases["!rpg"] = {"inv": "profile"}
+            async with store.guild_settings(3) as settings:
+                settings.prefixes["?"] = "!rpg"
+            async with store.guild_settings(3) as settings:
+                del settings.prefixes["?"]
+            return sorted(await store.configured_guild_ids())
+        finally:
+            await store.close()
+
+    assert asyncio.run(scenario()) == [1, 2]
@@ -0,0 +1,73 @@
+import asyncio
+from types import SimpleNamespace
+
+import hikari
+import pytest
+
+from commands import rpg
+
+GUILD_ID = 100
+OWNER_ID = 1
+
+
+class StubRest:
+    def __init__(self, roles):
+        self.roles = roles
+        self.fetched = []
+
+    async def fetch_roles(self, guild_id):
+        self.fetched.append("roles")
+        return self.roles
+
+    async def fetch_guild(self, guild_id):
+        self.fetched.append("guild")
+        return SimpleNamespace(owner_id=OWNER_ID)
+
+
+def role(role_id: int, permissions: hikari.Permissions):
+    return SimpleNamespace(id=role_id, permissions=permissions)
+
+
+def message_event(author_id: int, member_roles, cached_roles, rest: StubRest):
+    member = SimpleNamespace(role_ids=[member_role.id for member_role in member_roles], get_roles=lambda: cached_roles)
+    return SimpleNamespace(author_id=author_id, guild_id=GUILD_ID, member=member, app=SimpleNamespace(rest=rest), get_guild=lambda: None)
+
+
+EVERYONE = role(GUILD_ID, hikari.Permissions.SEND_MESSAGES)
+MODERATOR = role(200, hikari.Permissions.MANAGE_GUILD)
+ADMIN = role(201, hikari.Permissions.ADMINISTRATOR)
+
+
+@pytest.mark.parametrize("author_id, member_roles, allowed", [
+    (5, [EVERYONE], False),
+    (5, [EVERYONE, MODERATOR], True),
+    (5, [EVERYONE, ADMIN], True),
+    (OWNER_ID, [EVERYONE], True),
+])
+def test_guild_settings_need_manage_guild_permission(author_id, member_roles, allowed):
+    rest = StubRest([EVERYONE, MODERATOR, ADMIN])
+    ctx = message_event(author_id, member_roles, member_roles, rest)
+
+    assert asyncio.run(rpg._can_change_guild_settings(ctx)) is allowed
+    assert "roles" not in rest.fetched
+
+
+def test_roles_missing_in_cache_are_fetched():
+    rest = StubRest([EVERYONE, MODERATOR, ADMIN])
+    ctx = message_event(5, [EVERYONE, MODERATOR], [EVERYONE], rest)
+
+    assert asyncio.run(rpg._can_change_guild_settings(ctx))
+    assert rest.fetched == ["roles"]
+
+
+def test_bot_administrators_can_change_any_guild(monkeypatch):
+    monkeypatch.setattr(rpg, "BOT_ADMINS", frozenset({7}))
+    rest = StubRest([])
+    ctx = message_event(7, [], [], rest)
+
+    assert asyncio.run(rpg._can_change_guild_settings(ctx))
+    assert rest.fetched == []
+
+
+def test_authors_without_member_can_not_change_settings():
+    assert not asyncio.run(rpg._can_change_guild_settings(SimpleNamespace(author_id=5, member=None)))
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+
+from common.outbound import MESSAGE_LENGTH_LIMIT, FakeTransport, OutboundMessenger
+
+
+class FailingTransport(FakeTransport):
+    """
+    Fails the first message of every channel the way an unexpected REST error (e.g. 500) would.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._failed_channels = set()
+
+    async def send(self, channel_id, content):
+        if channel_id not in self._failed_channels:
+            self._failed_channels.add(channel_id)
+            raise RuntimeError("Internal Server Error")
+        await super().send(channel_id, content)
+
+
+def run_messenger(transport: FakeTransport, messages: list[tuple[int, str]], **messenger_args) -> OutboundMessenger:
+    async def scenario():
+        messenger = OutboundMessenger(transport, **messenger_args)
+        for channel_id, content in messages:
+            messenger.send(channel_id, content)
+        await messenger.close(timeout=5.0)
+        return messenger
+
+    return asyncio.run(scenario())
+
+
+def sent_contents(transport: FakeTransport) -> list[tuple[int, str]]:
+    return [(channel_id, content) for _, channel_id, content in transport.sent]
+
+
+def test_replies_of_a_burst_are_coalesced_per_channel():
+    transport = FakeTransport()
+    messenger = run_messenger(transport, [(1, "a"), (2, "x"), (1, "b"), (1, "c")])
+
+    assert sorted(sent_contents(transport)) == [(1, "a\nb\nc"), (2, "x")]
+    assert messenger.sent_count() == 2
+    assert messenger.coalesced_count() == 2
+    assert messenger.pending_count() == 0
+
+
+def test_long_replies_are_split_at_the_length_limit():
+    transport = FakeTransport()
+    lines = [f"line {i}" * 20 for i in range(30)]
+    run_messenger(transport, [(1, "\n".join(lines))])
+
+    contents = [content for _, content in sent_contents(transport)]
+    assert len(contents) > 1
+    assert all(len(content) <= MESSAGE_LENGTH_LIMIT for content in contents)
+    assert "\n".join(contents).split("\n") == lines
+
+
+def test_rate_limited_messages_are_retried():
+    # the messenger expects a higher rate than the transport allows, so some requests are rejected
+    transport = FakeTransport(rate=(2, 0.2))
+    messages = [(1, "m" * (MESSAGE_LENGTH_LIMIT - 10)) for _ in range(4)]
+    messenger = run_messenger(transport, messages, coalesce_window=0, channel_rate=(10, 0.2))
+
+    assert transport.rejected_count > 0
+    assert len(transport.sent) == 4
+    assert messenger.sent_count() == 4
+    assert messenger.failed_count() == 0
+
+
+def test_messages_over_the_pending_limit_are_dropped():
+    transport = FakeTransport()
+    messenger = run_messenger(transport, [(1, str(i)) for i in range(5)], max_pending_per_channel=3)
+
+    assert sent_contents(transport) == [(1, "0\n1\n2")]
+    assert messenger.dropped_count() == 2
+
+
+def test_queue_of_unavailable_channel_is_dropped(caplog):
+    transport = FakeTransport(unavailable_channels=[1])
+    big = "m" * MESSAGE_LENGTH_LIMIT
+    with caplog.at_level(logging.WARNING, logger="common.outbound"):
+        messenger = run_messenger(transport, [(1, big), (1, big), (1, big), (2, "x")])
+
+    # only the first message of the unavailable channel was tried
+    assert transport.rejected_count == 1
+    assert sent_contents(transport) == [(2, "x")]
+    assert messenger.failed_count() == 1
+    assert messenger.dropped_count() == 2
+    assert messenger.pending_count() == 0
+    assert "Channel 1 is unavailable" in caplog.text
+
+
+def test_failed_messages_are_logged_and_the_queue_continues(caplog):
+    transport = FailingTransport()
+    big = "m" * MESSAGE_LENGTH_LIMIT
+    with caplog.at_level(logging.ERROR, logger="common.outbound"):
+        messenger = run_messenger(transport, [(1, big), (1, "after")])
+
+    assert sent_contents(transport) == [(1, "after")]
+    assert messenger.failed_count() == 1
+    assert "Sending a message to channel 1 failed" in caplog.text
+    assert "Internal Server Error" in caplog.text
@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+from common.fake_gateway import FakeGuildMessageEvent
+from common.models.message_command_parsing import Command, CommandParserBuilder, ParseOutcomeKind, PipelineTooLongError
+
+
+class Pipeline:
+    def __init__(self, max_length: int = 10):
+        self.replies = []
+        # (name, phase) of every step, in the order the steps happened
+        self.log = []
+
+        @Command("!t", "echo")
+        async def echo(text: str):
+            return text
+
+        @Command("!t", "step")
+        async def step(name: str, delay: int = 0):
+            self.log.append((name, "start"))
+            await asyncio.sleep(delay / 1000)
+            self.log.append((name, "end"))
+
+        @Command("!t", "heal", target="player")
+        async def heal(player: str, delay: int = 0):
+            self.log.append((player, "start"))
+            await asyncio.sleep(delay / 1000)
+            self.log.append((player, "end"))
+
+        @Command("!t", "fail")
+        async def fail():
+            raise RuntimeError("fail")
+
+        @Command("!o", "echo")
+        async def other_echo(text: str):
+            return f"other {text}"
+
+        self.parser = (CommandParserBuilder()
+            .with_commands([echo, step, heal, fail, other_echo])
+            .with_pipelines(";", max_length)
+            .with_responder(self.collect_reply)
+            .build())
+
+    async def collect_reply(self, execution_context, content):
+        self.replies.append(content)
+
+    def parse(self, command_string: str):
+        return asyncio.run(self.parser.parse_outcome(command_string, FakeGuildMessageEvent(1, 1, 1, command_string)))
+
+
+@pytest.mark.parametrize("command_string, reply", [
+    ("!t echo \"a; b\"", "a; b"),
+    ("!t echo [a;b]", "[a;b]"),
+    ("!t echo {a: \";\"}", "{a: \";\"}"),
+])
+def test_separator_inside_packing_does_not_split(command_string, reply):
+    pipeline = Pipeline()
+
+    assert pipeline.parser._split_pipeline(command_string, pipeline.parser._scan_token_spans(command_string)[0]) is None
+    assert pipeline.parse(command_string).kind is ParseOutcomeKind.SUCCESS
+    assert pipeline.replies == [reply]
+
+
+@pytest.mark.parametrize("command_string", [
+    "!t echo a;; echo b",
+    "!t echo a ; echo b;",
+    "!t echo a;echo b ; ;",
+])
+def test_empty_commands_are_ignored(command_string):
+    pipeline = Pipeline()
+
+    assert pipeline.parse(command_string).kind is ParseOutcomeKind.SUCCESS
+    assert pipeline.replies == ["a\nb"]
+
+
+def test_prefix_of_previous_command_is_used_when_omitted():
+    pipeline = Pipeline()
+
+    assert pipeline.parse("!t echo a; !o echo b; echo c; !t echo d").kind is ParseOutcomeKind.SUCCESS
+    assert pipeline.replies == ["a\nother b\nother c\nd"]
+
+
+def test_too_long_pipeline_runs_nothing():
+    pipeline = Pipeline(max_length=3)
+
+    assert pipeline.parse("!t step a; step b; step c").kind is ParseOutcomeKind.SUCCESS
+    outcome = pipeline.parse("!t step d; step e; step f; step g")
+
+    assert outcome.kind is ParseOutcomeKind.SYNTAX_ERROR
+    assert isinstance(outcome.error(), PipelineTooLongError)
+    assert [name for name, phase in pipeline.log if phase == "start"] == ["a", "b", "c"]
+
+
+def test_commands_of_the_same_player_run_in_written_order():
+    pipeline = Pipeline()
+
+    # later commands are faster, they would finish first if they ran concurrently
+    assert pipeline.parse("!t step a 30; step b 10; step c").kind is ParseOutcomeKind.SUCCESS
+    assert pipeline.log == [("a", "start"), ("a", "end"), ("b", "start"), ("b", "end"), ("c", "start"), ("c", "end")]
+
+
+def test_commands_of_different_targets_run_concurrently():
+    pipeline = Pipeline()
+
+    assert pipeline.parse("!t heal anna 30; heal bob 10; heal anna").kind is ParseOutcomeKind.SUCCESS
+    assert pipeline.log == [("anna", "start"), ("bob", "start"), ("bob", "end"), ("anna", "end"), ("anna", "start"), ("anna", "end")]
+
+
+def test_failed_command_stops_later_commands_of_its_target():
+    pipeline = Pipeline()
+
+    outcome = pipeline.parse("!t echo a; step b; fail; step c; heal anna")
+
+    assert outcome.kind is ParseOutcomeKind.COMMAND_ERROR
+    assert isinstance(outcome.error(), RuntimeError)
+    # heal has another target, so it isn't stopped
+    assert sorted(pipeline.log) == [("anna", "end"), ("anna", "start"), ("b", "end"), ("b", "start")]
+    assert pipeline.replies == ["a"]
+
+
+def test_failure_found_before_running_runs_nothing():
+    pipeline = Pipeline()
+
+    assert pipeline.parse("!t step a; step b; missing").kind is ParseOutcomeKind.NOT_FOUND
+    assert pipeline.parse("!t step a; step b lots").kind is ParseOutcomeKind.SYNTAX_ERROR
+    assert pipeline.log == []
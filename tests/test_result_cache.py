@@ -0,0 +1,154 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from common.fake_gateway import FakeGuildMessageEvent
+from common.models.message_command_parsing import CacheScope, Command, CommandParserBuilder, ResultCache, TTL
+from common.models.message_command_parsing import result_cache as result_cache_module
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    # only the cache sees the fake clock, asyncio keeps the real one
+    monkeypatch.setattr(result_cache_module, "time", SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+class CachedCommands:
+    def __init__(self, result_cache: ResultCache):
+        # name of the command -> count of its invocations
+        self.invocations = {}
+
+        @Command("!t", "global", cache=TTL(60))
+        async def global_value(item: str):
+            return self.invoked("global", item)
+
+        @Command("!t", "member", cache=TTL(60, scope=CacheScope.MEMBER, tags=("player:{guild_id}:{author_id}",)))
+        async def member_value():
+            return self.invoked("member")
+
+        @Command("!t", "items", cache=TTL(60, tags=("items:{guild_id}",)))
+        async def items_value(items: list[str]):
+            return self.invoked("items", *items)
+
+        self.parser = CommandParserBuilder().with_commands([global_value, member_value, items_value]).with_result_cache(result_cache).with_responder(self.discard_reply).build()
+
+    def invoked(self, name: str, *arguments: str) -> str:
+        self.invocations[name] = self.invocations.get(name, 0) + 1
+        return " ".join((name, *arguments))
+
+    async def discard_reply(self, execution_context, content):
+        pass
+
+    def run(self, *messages: tuple[str, int, int]):
+        async def scenario():
+            for command_string, guild_id, author_id in messages:
+                await self.parser.parse_outcome(command_string, FakeGuildMessageEvent(guild_id, 1, author_id, command_string))
+
+        asyncio.run(scenario())
+
+
+def test_entry_expires_after_its_ttl(clock):
+    cache = ResultCache()
+    cache.put("key", "value", 10)
+
+    clock.now += 9.9
+    assert cache.get("key") == "value"
+    clock.now += 0.1
+    assert cache.get("key") is None
+
+    assert cache.entries_count() == 0
+    assert cache.expired_count() == 1
+    assert (cache.hits_count(), cache.misses_count()) == (1, 1)
+
+
+def test_counters_of_commands(clock):
+    cache = ResultCache()
+    commands = CachedCommands(cache)
+
+    commands.run(("!t global sword", 1, 1), ("!t global sword", 2, 2), ("!t global shield", 1, 1))
+    clock.now += 60
+    commands.run(("!t global sword", 1, 1))
+
+    assert commands.invocations == {"global": 3}
+    assert (cache.hits_count(), cache.misses_count(), cache.expired_count()) == (1, 3, 1)
+
+
+def test_scope_decides_who_shares_entries(clock):
+    commands = CachedCommands(ResultCache())
+
+    commands.run(("!t member", 1, 1), ("!t member", 1, 1), ("!t member", 1, 2), ("!t member", 2, 1))
+    commands.run(("!t global sword", 1, 1), ("!t global sword", 2, 2))
+
+    assert commands.invocations == {"member": 3, "global": 1}
+
+
+def test_converted_lists_are_part_of_key(clock):
+    commands = CachedCommands(ResultCache())
+
+    commands.run(("!t items a, b", 1, 1), ("!t items a,b", 1, 1), ("!t items b, a", 1, 1))
+
+    assert commands.invocations == {"items": 2}
+
+
+def test_invalidated_tag_evicts_only_its_entries(clock):
+    cache = ResultCache()
+    commands = CachedCommands(cache)
+    commands.run(("!t member", 1, 1), ("!t member", 1, 2), ("!t items a, b", 1, 1))
+
+    assert cache.invalidate("player:1:1", "unknown") == 1
+    commands.run(("!t member", 1, 1), ("!t member", 1, 2), ("!t items a, b", 1, 1))
+
+    assert commands.invocations == {"member": 3, "items": 1}
+    assert cache.invalidated_count() == 1
+    assert cache.invalidate("items:1") == 1
+
+
+def test_value_computed_during_invalidation_is_not_stored(clock):
+    cache = ResultCache()
+    invalidations = cache.invalidations_count()
+
+    # the state was changed while the value was computed from it
+    cache.invalidate("player:1:1")
+    cache.put("stale", "value", 10, ("player:1:1",), invalidations)
+    cache.put("other", "value", 10, ("player:1:2",), invalidations)
+
+    assert cache.get("stale") is None
+    assert cache.get("other") == "value"
+
+
+def test_forgotten_invalidations_refuse_older_values(clock):
+    cache = ResultCache(invalidated_tags_limit=1)
+    invalidations = cache.invalidations_count()
+
+    cache.invalidate("a")
+    cache.invalidate("b")
+    cache.put("key", "value", 10, ("a",), invalidations)
+
+    # the invalidation of "a" isn't kept anymore, so the value can't be told apart from a stale one
+    assert cache.get("key") is None
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = ResultCache(max_entries=2)
+    cache.put("a", 1, 10, ("tag",))
+    cache.put("b", 2, 10)
+    cache.get("a")
+    cache.put("c", 3, 10)
+
+    assert [cache.get(key) for key in "abc"] == [1, None, 3]
+    assert cache.evicted_count() == 1
+
+    cache.clear()
+    assert cache.entries_count() == 0
+    assert cache.invalidate("tag") == 0
@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+
+from common.fake_gateway import FakeGuildMessageEvent
+from common.models.message_command_parsing import Command, CommandBusyError, CommandParserBuilder, CommandScheduler, Cooldown, ParseOutcomeKind
+
+
+def event(guild_id: int = 1, author_id: int = 1) -> FakeGuildMessageEvent:
+    return FakeGuildMessageEvent(guild_id, 1, author_id, "")
+
+
+async def discard_reply(execution_context, content):
+    pass
+
+
+def test_running_commands_are_capped():
+    async def scenario():
+        scheduler = CommandScheduler(max_concurrency=2)
+        release = asyncio.Event()
+
+        tasks = [asyncio.create_task(scheduler.execute(scheduler.reserve(event(author_id=i)), release.wait)) for i in range(5)]
+        await asyncio.sleep(0)
+        counts = scheduler.running_count(), scheduler.waiting_count()
+
+        release.set()
+        await asyncio.gather(*tasks)
+        return counts, (scheduler.running_count(), scheduler.waiting_count())
+
+    assert asyncio.run(scenario()) == ((2, 3), (0, 0))
+
+
+@pytest.mark.parametrize("max_pending_per_guild, max_pending_per_user, contexts", [
+    (2, 10, [event(author_id=1), event(author_id=2), event(author_id=3)]),
+    (10, 2, [event(guild_id=1), event(guild_id=2), event(guild_id=3)]),
+])
+def test_pending_limits_refuse_commands_as_busy(max_pending_per_guild, max_pending_per_user, contexts):
+    release = asyncio.Event()
+
+    @Command("!t", "wait")
+    async def wait_command():
+        await release.wait()
+
+    async def scenario():
+        scheduler = CommandScheduler(max_concurrency=1, max_pending_per_guild=max_pending_per_guild, max_pending_per_user=max_pending_per_user)
+        parser = CommandParserBuilder().with_commands([wait_command]).with_scheduler(scheduler).with_responder(discard_reply).build()
+
+        accepted = [asyncio.create_task(parser.parse_outcome("!t wait", context)) for context in contexts[:-1]]
+        await asyncio.sleep(0)
+        refused = await parser.parse_outcome("!t wait", contexts[-1])
+
+        release.set()
+        accepted_outcomes = await asyncio.gather(*accepted)
+        # places are given back when commands finish
+        again = await parser.parse_outcome("!t wait", contexts[-1])
+        return refused, accepted_outcomes, again
+
+    refused, accepted_outcomes, again = asyncio.run(scenario())
+
+    assert refused.kind is ParseOutcomeKind.BUSY
+    assert isinstance(refused.error(), CommandBusyError)
+    assert all(outcome.kind is ParseOutcomeKind.SUCCESS for outcome in accepted_outcomes)
+    assert again.kind is ParseOutcomeKind.SUCCESS
+
+
+def test_busy_commands_are_refused_before_conversion():
+    release = asyncio.Event()
+
+    @Command("!t", "wait")
+    async def wait_command(amount: int = 0):
+        await release.wait()
+
+    async def scenario():
+        scheduler = CommandScheduler(max_concurrency=1, max_pending_per_user=1)
+        parser = CommandParserBuilder().with_commands([wait_command]).with_scheduler(scheduler).with_responder(discard_reply).build()
+
+        running = asyncio.create_task(parser.parse_outcome("!t wait", event()))
+        await asyncio.sleep(0)
+        # the argument isn't an integer, but the command is refused before it is converted
+        refused = await parser.parse_outcome("!t wait lots", event())
+        release.set()
+        await running
+        return refused
+
+    assert asyncio.run(scenario()).kind is ParseOutcomeKind.BUSY
+
+
+def test_guilds_waiting_for_slots_are_served_in_round_robin():
+    async def scenario():
+        scheduler = CommandScheduler(max_concurrency=1, max_pending_per_guild=10, max_pending_per_user=10)
+        release = asyncio.Event()
+        served = []
+
+        def invocation(name: str):
+            async def invoke():
+                served.append(name)
+            return invoke
+
+        blocker = asyncio.create_task(scheduler.execute(scheduler.reserve(event(guild_id=0)), release.wait))
+        await asyncio.sleep(0)
+
+        waiting = []
+        for guild_id, name in [(1, "a1"), (1, "a2"), (1, "a3"), (2, "b1"), (3, "c1"), (2, "b2")]:
+            waiting.append(asyncio.create_task(scheduler.execute(scheduler.reserve(event(guild_id=guild_id)), invocation(name))))
+            await asyncio.sleep(0)
+
+        release.set()
+        await asyncio.gather(blocker, *waiting)
+        return served
+
+    assert asyncio.run(scenario()) == ["a1", "b1", "c1", "a2", "b2", "a3"]
+
+
+def test_cooldown_tokens_are_taken_all_or_none():
+    cooldown = Cooldown(rate=2, per=100.0)
+
+    assert cooldown.try_acquire(event(), count=3) > 0
+    assert cooldown.try_acquire(event(), count=2) == 0
+    assert cooldown.try_acquire(event()) > 0
+    # other users have buckets of their own
+    assert cooldown.try_acquire(event(author_id=2)) == 0
+
+    cooldown.refund(event(), count=5)
+    assert cooldown.try_acquire(event(), count=2) == 0
+    assert cooldown.try_acquire(event()) > 0
+
+
+def test_refused_pipeline_spends_no_cooldown_tokens():
+    @Command("!t", "hit", cooldown=Cooldown(rate=2, per=100.0))
+    async def hit():
+        return "hit"
+
+    @Command("!t", "wait")
+    async def wait_command():
+        ...
+
+    async def scenario():
+        scheduler = CommandScheduler(max_concurrency=1, max_pending_per_user=0)
+        busy_parser = CommandParserBuilder().with_commands([hit, wait_command]).with_pipelines(";").with_scheduler(scheduler).with_responder(discard_reply).build()
+        parser = CommandParserBuilder().with_commands([hit, wait_command]).with_pipelines(";").with_responder(discard_reply).build()
+
+        outcomes = [
+            # more uses than tokens, nothing is taken
+            await parser.parse_outcome("!t hit; hit; hit", event()),
+            # refused by the scheduler after the tokens were taken, they are given back
+            await busy_parser.parse_outcome("!t hit; wait", event()),
+            await parser.parse_outcome("!t hit; hit", event()),
+            await parser.parse_outcome("!t hit", event()),
+        ]
+        return [outcome.kind for outcome in outcomes]
+
+    # parsers of the same commands share cooldowns, which are declared on the commands
+    assert asyncio.run(scenario()) == [ParseOutcomeKind.ON_COOLDOWN, ParseOutcomeKind.BUSY, ParseOutcomeKind.SUCCESS, ParseOutcomeKind.ON_COOLDOWN]
@@ -0,0 +1,18 @@
+from common.command_registry import COMMAND_MANIFEST_PATH, COMMANDS_PACKAGE
+from common.models.message_command_parsing import CommandManifest, CommandParserBuilder, StringConverter
+from common.slash_commands import SlashCommandGenerator
+
+
+def test_slash_commands_are_generated_without_importing_command_modules():
+    manifest = CommandManifest.load_if_up_to_date(COMMAND_MANIFEST_PATH, COMMANDS_PACKAGE)
+    assert manifest is not None, "commands/manifest.json is outdated, run generate_command_manifest.py"
+
+    parser = CommandParserBuilder().with_string_converter(StringConverter()).with_dependency("state", None).with_manifest(manifest).build()
+    slash_groups = SlashCommandGenerator(parser).generate_groups()
+
+    assert [slash_group.name for slash_group in slash_groups] == ["rpg"]
+    assert not any(command.is_resolved() for command in parser.registered_commands())
+
+    buy = slash_groups[0].children["buy"]
+    assert list(buy.options) == ["item", "count"]
+    assert buy.options["item"].choices == ["potion", "sword", "shield", "bow"]
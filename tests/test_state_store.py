@@ -0,0 +1,166 @@
+import asyncio
+import os
+
+import pytest
+
+from common.state_store import StateStore
+
+
+async def wait_until(condition, timeout: float = 2.0):
+    for _ in range(int(timeout / 0.005)):
+        if condition():
+            return
+        await asyncio.sleep(0.005)
+    raise AssertionError("Condition wasn't met in time")
+
+
+async def give_gold(store: StateStore, player_id: int, gold: int = 10):
+    async with store.player(1, player_id) as player:
+        player.gold += gold
+
+
+@pytest.fixture
+def path(tmp_path) -> str:
+    return str(tmp_path / "state.sqlite3")
+
+
+def test_dirty_states_are_flushed_in_batches(path):
+    async def scenario():
+        store = StateStore(path, flush_interval=100.0, flush_batch_size=3)
+        await store.open()
+        try:
+            await give_gold(store, 1)
+            await give_gold(store, 2)
+            # the batch isn't full and the interval didn't pass yet
+            await asyncio.sleep(0.05)
+            before = store.written_count(), store.dirty_count()
+
+            await give_gold(store, 3)
+            await wait_until(lambda: store.dirty_count() == 0)
+            return before, (store.written_count(), store.flushes_count())
+        finally:
+            await store.close()
+
+    assert asyncio.run(scenario()) == ((0, 2), (3, 1))
+
+
+def test_dirty_states_are_flushed_every_interval(path):
+    async def scenario():
+        store = StateStore(path, flush_interval=0.01, flush_batch_size=100)
+        await store.open()
+        try:
+            await give_gold(store, 1)
+            await wait_until(lambda: store.written_count() == 1)
+            # states which didn't change aren't written again
+            async with store.player(1, 1):
+                pass
+            await asyncio.sleep(0.05)
+            return store.written_count()
+        finally:
+            await store.close()
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_dirty_states_are_evicted_only_after_they_are_written(path):
+    async def scenario():
+        store = StateStore(path, working_set_size=2, flush_interval=100.0, flush_batch_size=100)
+        await store.open()
+        try:
+            for player_id in range(1, 5):
+                await give_gold(store, player_id)
+            # the working set is over its size, but nothing could be evicted without losing changes
+            kept = store.working_set_count(), store.evicted_count()
+
+            # the overflow requests a flush, the written states are evicted then
+            await wait_until(lambda: store.working_set_count() == 2)
+            return kept, store.dirty_count(), store.written_count()
+        finally:
+            await store.close()
+
+    assert asyncio.run(scenario()) == ((4, 0), 0, 4)
+
+
+def test_locked_states_are_written_by_later_flush(path):
+    async def scenario():
+        store = StateStore(path, flush_interval=100.0)
+        await store.open()
+        try:
+            await give_gold(store, 1)
+            async with store.player(1, 1) as player:
+                written_while_locked = await store.flush()
+                player.gold += 1
+            return written_while_locked, await store.flush()
+        finally:
+            await store.close()
+
+    assert asyncio.run(scenario()) == (0, 1)
+
+
+def test_close_writes_everything(path):
+    async def scenario():
+        store = StateStore(path, flush_interval=100.0, flush_batch_size=100)
+        await store.open()
+        for player_id in range(1, 4):
+            await give_gold(store, player_id, player_id)
+        async with store.world(1) as world:
+            world.next_boss()
+        await store.close()
+
+        reopened = StateStore(path)
+        await reopened.open()
+        try:
+            players = await reopened.top_players(1)
+            async with reopened.world(1) as world:
+                day = world.day
+            return sorted(player.gold for player in players), day
+        finally:
+            await reopened.close()
+
+    assert asyncio.run(scenario()) == ([1, 2, 3], 2)
+
+
+def test_closed_store_refuses_states(path):
+    async def scenario():
+        store = StateStore(path)
+        async with store.player(1, 1):
+            pass
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(scenario())
+
+
+def test_snapshots_keep_only_latest(tmp_path, path):
+    snapshot_dir = tmp_path / "snapshots"
+
+    async def scenario():
+        store = StateStore(path, snapshot_dir=str(snapshot_dir), snapshots_kept=2)
+        await store.open()
+        try:
+            await give_gold(store, 1)
+            snapshots = [await store.snapshot() for _ in range(3)]
+            return snapshots
+        finally:
+            await store.close()
+
+    snapshots = asyncio.run(scenario())
+
+    assert sorted(os.listdir(snapshot_dir)) == sorted(os.path.basename(snapshot) for snapshot in snapshots[1:])
+
+
+def test_disabled_snapshots_are_not_taken(tmp_path, path):
+    snapshot_dir = tmp_path / "snapshots"
+
+    async def scenario():
+        store = StateStore(path, snapshot_interval=0.01, snapshot_dir=str(snapshot_dir))
+        store.disable_snapshots()
+        await store.open()
+        try:
+            await give_gold(store, 1)
+            await asyncio.sleep(0.05)
+        finally:
+            await store.close()
+
+    asyncio.run(scenario())
+
+    assert not snapshot_dir.exists()
@@ -0,0 +1,73 @@
+import asyncio
+from typing import Optional
+
+from common.models.message_command_parsing import Command, CommandParserBuilder, ParseOutcomeKind, StringConverter
+
+
+def test_optional_list_accepts_arguments_joined_with_commas():
+    conversion = StringConverter().compile(Optional[list[int]])
+
+    assert conversion(["1", "2"]) == [1, 2]
+    assert conversion("[1, 2]") == [1, 2]
+    assert conversion("none") is None
+
+
+def test_optional_dict_accepts_parsed_dict():
+    conversion = StringConverter().compile(dict[str, int] | None)
+
+    assert conversion({"gold": "10"}) == {"gold": 10}
+    assert conversion("{gold: 10}") == {"gold": 10}
+    assert conversion("None") is None
+
+
+def test_optional_list_parameter_of_command():
+    @Command("!test", "sum")
+    async def sum_numbers(numbers: Optional[list[int]] = None):
+        return sum(numbers or [])
+
+    replies = []
+
+    async def collect_reply(execution_context, content):
+        replies.append(content)
+
+    parser = CommandParserBuilder().with_string_converter(StringConverter()).with_commands([sum_numbers]).with_responder(collect_reply).build()
+    outcome = asyncio.run(parser.parse_outcome("!test sum 1, 2, 3", None))
+
+    assert outcome.kind is ParseOutcomeKind.SUCCESS
+    assert replies == [6]
+
+
+def test_literal_error_position_is_offset_in_message():
+    @Command("!test", "total")
+    async def total(gold: int, items: dict[str, int]):
+        return gold + sum(items.values())
+
+    parser = CommandParserBuilder().with_string_converter(StringConverter()).with_commands([total]).build()
+    command_string = "!test total 10 {a: 1,a: 2}"
+    outcome = asyncio.run(parser.parse_outcome(command_string, None))
+
+    assert outcome.kind is ParseOutcomeKind.SYNTAX_ERROR
+    assert command_string[outcome.position:].startswith("a: 2}")
+
+
+class Coordinates:
+    def __init__(self, x: int, y: int):
+        self.x = x
+        self.y = y
+
+
+def parse_coordinates(arg_expr: str) -> Coordinates:
+    x, y = arg_expr.split("x")
+    return Coordinates(int(x), int(y))
+
+
+def test_added_conversion_belongs_to_its_converter():
+    converter = StringConverter()
+    other_converter = StringConverter()
+
+    converter.add_new_conversion(Coordinates, parse_coordinates)
+
+    assert converter.has_conversion(Coordinates)
+    assert [(coordinates.x, coordinates.y) for coordinates in converter.compile(list[Coordinates])(["1x2", "3x4"])] == [(1, 2), (3, 4)]
+    assert not other_converter.has_conversion(Coordinates)
+    assert not StringConverter().has_conversion(Coordinates)
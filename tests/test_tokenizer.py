@@ -0,0 +1,66 @@
+import asyncio
+import re
+
+import pytest
+
+from common.models.message_command_parsing import Command, CommandParserBuilder, ParseOutcomeKind
+
+# expected values were produced by the character by character tokenizer the span scanner replaced (f7457d9),
+# tokens are listed without the prefix and the command name
+BASELINE_TOKENS = [
+    ("!t a", []),
+    ("!t  a   b ", ["b"]),
+    ("!t a x:1 y: 2", ["x", ":", "1", "y", ":", "2"]),
+    ("!t a 1, 2,3", ["1", ",", "2", ",", "3"]),
+    ("!t a [1, 2] {k: v}", ["[1, 2]", "{k: v}"]),
+    ("!t a [[1, [2]], 3]", ["[[1, [2]], 3]"]),
+    ("!t a \"quoted, text\" b", ["\"quoted, text\"", "b"]),
+    ("!t a \"[\" ]", ["\"[\"", "]"]),
+    ("!t a [12\" sword]", ["[12\" sword]"]),
+    ("!t a [\" ,]", ["[\" ,]"]),
+    ("!t a (b}]]:)", ["(b}]]:)"]),
+    ("!t a ] ) }", ["]", ")", "}"]),
+    ("!t a b]c", ["b]c"]),
+    ("!t a {a: [1}", ["{a: [1}"]),
+]
+
+BASELINE_SYNTAX_ERRORS = [
+    ("!t a [\"]\"]", "Expected \"\"\" but it wasn't found", 9),
+    ("!t a b[c]", "Unexpected token \"]\"", 6),
+    ("!t a [1, 2", "Expected \"]\" but it wasn't found", 9),
+    ("!t a \"open", "Expected \"\"\" but it wasn't found", 9),
+    ("!t a [[]", "Expected \"]\" but it wasn't found", 7),
+    ("!t a x\"y\"", "Unexpected token \"\"\"", 6),
+]
+
+
+@Command("!t", "a")
+async def command_a(ctx):
+    ...
+
+
+@pytest.fixture
+def parser():
+    return CommandParserBuilder().with_commands([command_a]).build()
+
+
+@pytest.mark.parametrize("command_string, argument_tokens", BASELINE_TOKENS)
+def test_tokens_match_baseline(parser, command_string, argument_tokens):
+    assert parser.get_command_tokens(command_string) == ["!t", "a", *argument_tokens]
+
+
+@pytest.mark.parametrize("command_string, message, position", BASELINE_SYNTAX_ERRORS)
+def test_syntax_errors_match_baseline(parser, command_string, message, position):
+    with pytest.raises(SyntaxError, match="^" + re.escape(message)):
+        parser.get_command_tokens(command_string)
+
+    outcome = asyncio.run(parser.parse_outcome(command_string, None))
+    assert outcome.kind is ParseOutcomeKind.SYNTAX_ERROR
+    assert outcome.position == position
+    assert outcome.message().startswith(f"{message}: {command_string}")
+
+
+def test_deeply_nested_packing_is_single_token(parser):
+    argument = "[" * 1000 + "]" * 1000
+
+    assert parser.get_command_tokens(f"!t a {argument} b") == ["!t", "a", argument, "b"]